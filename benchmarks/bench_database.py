@@ -0,0 +1,328 @@
+"""Benchmark every database.py function on a generated dataset.
+
+--scale 1 is a campaign-sized dataset: 1M users, 100 surveys (10 candidates
+each), 500k votes (40% on one hot survey), 200 channels. The default scale is
+small enough for a quick local run. Results go to stdout and, with --json, to
+a file; pass --compare with an earlier JSON file to print the change.
+
+    python -m benchmarks.bench_database --scale 0.05
+    python -m benchmarks.bench_database --scale 1 --db /tmp/bench.db --json after.json --compare before.json
+
+--db keeps the generated dataset so repeated runs skip generation.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+
+NOT_QUERIES = {"init_db", "close_db", "create_tables", "get_db", "get_writer"}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=50, help="calls per function (reports: --repeat // 10)")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--db", help="dataset path to create or reuse (default: temporary)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare against")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+def dataset_size(scale):
+    return {
+        "users": max(100, int(1_000_000 * scale)),
+        "surveys": max(5, int(100 * min(scale * 10, 1))),
+        "candidates_per_survey": 10,
+        "votes": max(50, int(500_000 * scale)),
+        "channels": max(5, int(200 * min(scale * 10, 1))),
+        "posted_per_survey": 20,
+    }
+
+def chunks(iterable, size=50_000):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+async def generate(size, seed):
+    import database
+
+    rng = random.Random(seed)
+    surveys = size["surveys"]
+    async with database.get_writer() as db:
+        for batch in chunks(
+            (user_id, f"+99890{user_id:07d}", f"user{user_id}", f"User {user_id}")
+            for user_id in range(1, size["users"] + 1)
+        ):
+            await db.executemany(
+                "INSERT INTO users (user_id, phone_number, username, full_name) VALUES (?, ?, ?, ?)", batch
+            )
+
+        await db.executemany(
+            "INSERT INTO surveys (id, title, description, image_file_id, is_closed) VALUES (?, ?, ?, NULL, ?)",
+            [(s, f"So'rovnoma {s}", "Eng yaxshi nomzodni tanlang", int(s % 5 == 0)) for s in range(1, surveys + 1)],
+        )
+        per = size["candidates_per_survey"]
+        await db.executemany(
+            "INSERT INTO candidates (id, survey_id, full_name) VALUES (?, ?, ?)",
+            [((s - 1) * per + i + 1, s, f"Nomzod {s}-{i}") for s in range(1, surveys + 1) for i in range(per)],
+        )
+
+        # 40% of the votes land on survey 1, the rest spread over the others
+        hot = min(size["users"], int(size["votes"] * 0.4))
+        rest = size["votes"] - hot
+        plan = [(1, hot)] + [(s, rest // (surveys - 1)) for s in range(2, surveys + 1)]
+        counts = {}
+        hourly = {}
+        # Votes arrive over the last three days, from the channels' posts or private chats
+        started = int(time.time()) - 72 * 3600
+
+        def votes():
+            for survey_id, n in plan:
+                for user_id in rng.sample(range(1, size["users"] + 1), min(n, size["users"])):
+                    candidate_id = (survey_id - 1) * per + 1 + min(int(rng.expovariate(0.5)), per - 1)
+                    created_at = started + rng.randrange(72 * 3600)
+                    chat_id = -1_000_000_000_000 - rng.randint(1, size["channels"]) if rng.random() < 0.7 else user_id
+                    counts[candidate_id] = counts.get(candidate_id, 0) + 1
+                    key = (survey_id, created_at // 3600, candidate_id)
+                    hourly[key] = hourly.get(key, 0) + 1
+                    yield user_id, survey_id, candidate_id, chat_id, created_at
+
+        for batch in chunks(votes()):
+            await db.executemany("INSERT INTO votes (user_id, survey_id, candidate_id) VALUES (?, ?, ?)",
+                                 [vote[:3] for vote in batch])
+            await db.executemany(
+                "INSERT INTO vote_events (user_id, survey_id, candidate_id, chat_id, created_at) VALUES (?, ?, ?, ?, ?)", batch
+            )
+        await db.executemany("UPDATE candidates SET votes_count = ? WHERE id = ?", [(n, c) for c, n in counts.items()])
+        await db.executemany(
+            "INSERT INTO vote_hourly (survey_id, hour, candidate_id, votes) VALUES (?, ?, ?, ?)",
+            [(*key, n) for key, n in hourly.items()],
+        )
+
+        await db.executemany(
+            "INSERT INTO channels (id, channel_id, name, url) VALUES (?, ?, ?, ?)",
+            [(c, str(-1_000_000_000_000 - c), f"Kanal {c}", f"https://t.me/kanal{c}") for c in range(1, size["channels"] + 1)],
+        )
+        await db.executemany(
+            "INSERT INTO survey_channels (survey_id, channel_id) VALUES (?, ?)",
+            [(s, c) for s in range(1, surveys + 1) for c in rng.sample(range(1, size["channels"] + 1), 3)],
+        )
+        await db.executemany(
+            "INSERT INTO posted_messages (survey_id, chat_id, message_id, kind) VALUES (?, ?, ?, 'survey')",
+            [(s, -1_000_000_000_000 - (m % size["channels"]) - 1, m) for s in range(1, surveys + 1)
+             for m in range(s * 1000, s * 1000 + size["posted_per_survey"])],
+        )
+        await db.commit()
+        await db.execute("ANALYZE")
+
+def stats(latencies):
+    latencies = sorted(latencies)
+    n = len(latencies)
+    pick = lambda q: latencies[min(n - 1, int(q * n))] * 1000
+    return {
+        "calls": n,
+        "mean_ms": sum(latencies) / n * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "max_ms": latencies[-1] * 1000,
+    }
+
+async def timed(call, repeat):
+    latencies = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        result = call(i)
+        if inspect.isasyncgen(result):
+            async for _ in result:
+                pass
+        else:
+            await result
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def function_cases(size, fresh_user):
+    import database
+
+    users, surveys, per = size["users"], size["surveys"], size["candidates_per_survey"]
+    spare = surveys + 1  # created below, safe to close/delete repeatedly
+    candidate = lambda s, i: (s - 1) * per + 1 + i % per
+    survey = lambda i: 1 + i % surveys
+    heavy = {"get_survey_participants_report", "iter_survey_participants_report", "get_vote_counts", "get_tally_rows",
+             "iter_user_ids", "verify_vote_aggregates", "repair_vote_counts"}
+
+    cases = {
+        "get_user_by_id": lambda i: database.get_user_by_id(1 + (i * 7919) % users),
+        "add_or_update_user": lambda i: database.add_or_update_user(fresh_user(), "+998", "u", "Bench"),
+        "iter_user_ids": lambda i: database.iter_user_ids(),
+        "get_active_surveys": lambda i: database.get_active_surveys(),
+        "get_survey_details": lambda i: database.get_survey_details(survey(i)),
+        "get_survey_candidates": lambda i: database.get_survey_candidates(survey(i)),
+        "has_user_voted": lambda i: database.has_user_voted(1 + (i * 7919) % users, 1),
+        "register_vote": lambda i: database.register_vote(fresh_user(), 1, candidate(1, i)),
+        "register_votes": lambda i: database.register_votes([(fresh_user(), 1, candidate(1, j)) for j in range(50)]),
+        "get_tally_rows": lambda i: database.get_tally_rows(),
+        "get_vote_counts": lambda i: database.get_vote_counts(),
+        "repair_vote_counts": lambda i: database.repair_vote_counts(),
+        "get_vote_timeline": lambda i: database.get_vote_timeline(1, since=int(time.time()) - 24 * 3600),
+        "verify_vote_aggregates": lambda i: database.verify_vote_aggregates(),
+        "get_linked_channels": lambda i: database.get_linked_channels(survey(i)),
+        "delete_survey": lambda i: database.delete_survey(spare),
+        "get_all_channels": lambda i: database.get_all_channels(),
+        "add_channel": lambda i: database.add_channel(str(-2_000_000_000_000 - i), "Bench", "https://t.me/bench"),
+        "channel_exists": lambda i: database.channel_exists(str(-1_000_000_000_000 - 1 - i % size["channels"])),
+        "delete_channel": lambda i: database.delete_channel(10_000_000 + i),
+        "close_survey": lambda i: database.close_survey(spare),
+        "create_survey": lambda i: database.create_survey(f"Bench {i}", "", None),
+        "set_survey_deadline": lambda i: database.set_survey_deadline(spare, "2030-01-01 12:00"),
+        "get_survey_deadlines": lambda i: database.get_survey_deadlines(),
+        "add_candidate": lambda i: database.add_candidate(spare, f"Bench {i}"),
+        "toggle_survey_channel": lambda i: database.toggle_survey_channel(spare, 1),
+        "get_survey_linked_channel_ids": lambda i: database.get_survey_linked_channel_ids(survey(i)),
+        "add_posted_message": lambda i: database.add_posted_message(spare, -1, 1_000_000 + i, "survey"),
+        "get_posted_messages": lambda i: database.get_posted_messages(survey(i)),
+        "delete_posted_message": lambda i: database.delete_posted_message(-1, 1_000_000 + i),
+        "get_survey_participants_report": lambda i: database.get_survey_participants_report(1),
+        "iter_survey_participants_report": lambda i: database.iter_survey_participants_report(1, 2000),
+    }
+
+    known = {
+        name for name, fn in inspect.getmembers(database)
+        if (inspect.iscoroutinefunction(fn) or inspect.isasyncgenfunction(fn))
+        and fn.__module__ == database.__name__
+        and not name.startswith("_") and name not in NOT_QUERIES
+    }
+    missing = known - set(cases)
+    if missing:
+        raise SystemExit(f"No benchmark case for: {', '.join(sorted(missing))}")
+    return cases, heavy
+
+async def concurrency_scenarios(size, fresh_user, concurrency):
+    import database
+    from services.vote_writer import VoteWriter
+
+    users = size["users"]
+    scenarios = {}
+
+    async def burst(name, make_call):
+        latencies = []
+
+        async def one(i):
+            started = time.perf_counter()
+            await make_call(i)
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        scenarios[name] = {**stats(latencies), "wall_ms": elapsed * 1000, "ops_per_sec": concurrency / elapsed}
+
+    await burst(f"register_vote x{concurrency} concurrent",
+                lambda i: database.register_vote(fresh_user(), 1, 1 + i % size["candidates_per_survey"]))
+
+    writer = VoteWriter(window_ms=5, max_batch=256, apply_batch=database.register_votes)
+    await writer.start()
+    try:
+        await burst(f"VoteWriter.submit x{concurrency} concurrent",
+                    lambda i: writer.submit(fresh_user(), 1, 1 + i % size["candidates_per_survey"]))
+    finally:
+        await writer.stop()
+
+    await burst(f"has_user_voted x{concurrency} concurrent",
+                lambda i: database.has_user_voted(1 + (i * 7919) % users, 1))
+    await burst(f"get_active_surveys x{concurrency} concurrent", lambda i: database.get_active_surveys())
+
+    # Menu reads while a full export is running: readers must not queue behind it
+    report = asyncio.create_task(database.get_survey_participants_report(1))
+    await burst(f"get_survey_details x{concurrency} during full report",
+                lambda i: database.get_survey_details(1 + i % size["surveys"]))
+    started = time.perf_counter()
+    rows = await report
+    scenarios["full report (concurrent with reads)"] = {"rows": len(rows), "remaining_ms": (time.perf_counter() - started) * 1000}
+    return scenarios
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return None
+
+def compare(previous, current):
+    print(f"\nvs {previous['meta'].get('commit')} (scale {previous['meta'].get('scale')}):")
+    for section, metric in (("functions", "p50_ms"), ("scenarios", "p95_ms")):
+        for name, now in current[section].items():
+            before = previous.get(section, {}).get(name)
+            if not before or metric not in now or not before.get(metric):
+                continue
+            change = (now[metric] - before[metric]) / before[metric] * 100
+            print(f"  {name:50} {metric} {before[metric]:9.3f} -> {now[metric]:9.3f}  ({change:+.0f}%)")
+
+async def main():
+    args = parse_args()
+    import database
+
+    size = dataset_size(args.scale)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "bench.db")
+        reuse = os.path.exists(path)
+        await database.init_db(path)
+        try:
+            await database.create_tables()
+            generation = 0.0
+            if not reuse:
+                print(f"Generating dataset: {size}")
+                started = time.perf_counter()
+                await generate(size, args.seed)
+                generation = time.perf_counter() - started
+            await database.create_survey("Spare", "", None)
+
+            next_user = iter(range(100_000_000 + int(time.time()) * 1000, 1 << 62))
+            fresh_user = lambda: next(next_user)
+
+            cases, heavy = function_cases(size, fresh_user)
+            functions = {}
+            for name, call in cases.items():
+                repeat = max(1, args.repeat // 10) if name in heavy else args.repeat
+                functions[name] = stats(await timed(call, repeat))
+                print(f"{name:35} p50 {functions[name]['p50_ms']:9.3f} ms   p95 {functions[name]['p95_ms']:9.3f} ms")
+
+            scenarios = await concurrency_scenarios(size, fresh_user, args.concurrency)
+            for name, result in scenarios.items():
+                detail = "  ".join(f"{k} {v:.2f}" if isinstance(v, float) else f"{k} {v}" for k, v in result.items())
+                print(f"{name:50} {detail}")
+        finally:
+            await database.close_db()
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "scale": args.scale,
+            "dataset": size,
+            "reused_dataset": reuse,
+            "generation_seconds": generation,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "functions": functions,
+        "scenarios": scenarios,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+"""Cost of building survey keyboards/texts from scratch vs a render-cache lookup.
+
+    python -m benchmarks.bench_render_cache --surveys 10 --candidates 20
+"""
+import argparse
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--surveys", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=20000)
+    return parser.parse_args()
+
+def per_call_us(fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+def main():
+    args = parse_args()
+    from services.render_cache import (
+        _render_details, _survey_buttons, candidates_markup, survey_details, survey_list_markup
+    )
+    from keyboards.inline import candidates_keyboard
+    from services.tally import SurveyTally
+
+    surveys = [{"id": i, "title": f"So'rovnoma {i}", "is_closed": i % 3 == 0} for i in range(args.surveys)]
+    survey = {"description": "Eng yaxshi o'qituvchini tanlang " * 5, "is_closed": 1}
+    tally = SurveyTally(1)
+    for i in range(args.candidates):
+        tally.add_candidate(i, f"Nomzod {i}", votes_count=i * 7)
+
+    cases = [
+        ("survey list", lambda: _survey_buttons(surveys, "survey_", None), lambda: survey_list_markup(surveys)),
+        ("candidates keyboard", lambda: candidates_keyboard(1, tally.candidates()), lambda: candidates_markup(tally)),
+        ("closed survey card", lambda: _render_details(1, survey), lambda: survey_details(1, survey)),
+    ]
+
+    print(f"surveys={args.surveys} candidates={args.candidates} iterations={args.iterations}")
+    for name, build, cached in cases:
+        built = per_call_us(build, args.iterations)
+        lookup = per_call_us(cached, args.iterations)
+        print(f"{name:20} rebuild {built:8.2f} us   cached {lookup:6.2f} us   speedup {built / lookup:6.1f}x")
+
+if __name__ == "__main__":
+    main()
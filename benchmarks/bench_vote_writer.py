@@ -0,0 +1,67 @@
+"""Votes/sec with one commit per vote (register_vote) vs the group-commit VoteWriter.
+
+    python -m benchmarks.bench_vote_writer --votes 5000 --synchronous FULL
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--votes", type=int, default=5000)
+    parser.add_argument("--candidates", type=int, default=5)
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous for the run (FULL fsyncs every commit)")
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=256)
+    return parser.parse_args()
+
+async def run_mode(name, path, args, vote):
+    import database
+    from storage.base import VoteResult
+
+    await database.init_db(path)
+    try:
+        await database.create_tables()
+        survey_id = await database.create_survey(f"bench {name}", "", None)
+        for i in range(args.candidates):
+            await database.add_candidate(survey_id, f"Candidate {i}")
+        candidates = [c['id'] for c in await database.get_survey_candidates(survey_id)]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            vote(user_id, survey_id, candidates[user_id % len(candidates)])
+            for user_id in range(args.votes)
+        ))
+        elapsed = time.perf_counter() - started
+
+        counted = sum(c['votes_count'] for c in await database.get_survey_candidates(survey_id))
+        assert all(r is VoteResult.ACCEPTED for r in results) and counted == args.votes, f"{name}: expected {args.votes} votes, counted {counted}"
+        return args.votes / elapsed
+    finally:
+        await database.close_db()
+
+async def main():
+    args = parse_args()
+    os.environ["DB_SYNCHRONOUS"] = args.synchronous
+    import database
+    from services.vote_writer import VoteWriter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = await run_mode("register_vote", os.path.join(tmp, "baseline.db"), args, database.register_vote)
+
+        writer = VoteWriter(window_ms=args.window_ms, max_batch=args.max_batch)
+        await writer.start()
+        try:
+            batched = await run_mode("vote_writer", os.path.join(tmp, "batched.db"), args, writer.submit)
+        finally:
+            await writer.stop()
+
+    print(f"votes={args.votes} synchronous={args.synchronous} window={args.window_ms}ms max_batch={args.max_batch}")
+    print(f"register_vote (commit per vote): {baseline:10.0f} votes/sec")
+    print(f"VoteWriter (group commit):       {batched:10.0f} votes/sec")
+    print(f"speedup: {batched / baseline:.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""Drive the real Dispatcher (user + admin routers and their middlewares) with synthetic updates.
+
+Every simulated user goes through start -> contact -> menu -> survey_ -> vote_
+-> results_. Each phase is fired for all users at once (bounded by
+--concurrency) against a fake Telegram session with --latency seconds per API
+call, and throughput plus p50/p95/p99 latency are reported per update kind.
+
+    python -m benchmarks.load_test --users 2000 --latency 0.02
+    python -m benchmarks.load_test --backend sqlite --json load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+PHASES = ["start", "contact", "menu", "survey", "vote", "results"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per fake Bot API call")
+    parser.add_argument("--concurrency", type=int, default=500, help="updates in flight at once")
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--no-cache", action="store_true", help="run without the metadata cache")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+class Updates:
+    """Builds raw Bot API update payloads for one simulated user."""
+
+    def __init__(self):
+        self._update_ids = iter(range(1, 1 << 62))
+
+    def _message(self, user_id, **fields):
+        update_id = next(self._update_ids)
+        user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id, "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"}, "from": user, **fields,
+            },
+        }
+
+    def _callback(self, user_id, data):
+        update_id = next(self._update_ids)
+        user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": str(user_id), "data": data,
+                "message": {
+                    "message_id": update_id, "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"}, "text": "...",
+                },
+            },
+        }
+
+    def build(self, phase, user_id, survey_id, candidate_ids):
+        if phase == "start":
+            return self._message(user_id, text="/start")
+        if phase == "contact":
+            contact = {"phone_number": f"+99890{user_id:07d}", "first_name": "User", "user_id": user_id}
+            return self._message(user_id, contact=contact)
+        if phase == "menu":
+            return self._message(user_id, text="🗳 Ovoz berish")
+        if phase == "survey":
+            return self._callback(user_id, f"survey_{survey_id}")
+        if phase == "vote":
+            return self._callback(user_id, f"vote_{survey_id}_{candidate_ids[user_id % len(candidate_ids)]}")
+        return self._callback(user_id, f"results_{survey_id}")
+
+async def open_storage(args, tmp):
+    from storage.cached import CachedStorage
+    from storage.memory import MemoryStorage
+    from storage.sqlite import SqliteStorage
+
+    storage = MemoryStorage() if args.backend == "memory" else SqliteStorage(os.path.join(tmp, "load.db"))
+    if not args.no_cache:
+        storage = CachedStorage(storage)
+    await storage.open()
+    return storage
+
+async def run_phase(dp, bot, payloads, concurrency):
+    from aiogram.types import Update
+
+    updates = [Update.model_validate(p, context={"bot": bot}) for p in payloads]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def feed(update):
+        async with semaphore:
+            started = time.perf_counter()
+            await dp.feed_update(bot, update)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(u) for u in updates))
+    return time.perf_counter() - started, sorted(latencies)
+
+async def main():
+    args = parse_args()
+    from fake_telegram import FakeSession
+    from main import build_bot, build_dispatcher
+    from services.live_updates import live_updater
+    from services.tally import tallies
+    from services.vote_writer import vote_writer
+    from storage import set_storage
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = await open_storage(args, tmp)
+        set_storage(storage)
+        try:
+            survey_id = await storage.create_survey("Load test", "Eng yaxshi nomzodni tanlang", None)
+            candidate_ids = [await storage.add_candidate(survey_id, f"Nomzod {i}") for i in range(args.candidates)]
+            await tallies.load()
+            await vote_writer.start()
+
+            session = FakeSession(latency=args.latency)
+            bot = build_bot("42:LOAD", session)
+            dp = build_dispatcher(storage)
+            payloads = Updates()
+            user_ids = range(1_000_000, 1_000_000 + args.users)
+
+            results = {}
+            for phase in PHASES:
+                calls_before = len(session.calls)
+                batch = [payloads.build(phase, u, survey_id, candidate_ids) for u in user_ids]
+                elapsed, latencies = await run_phase(dp, bot, batch, args.concurrency)
+                results[phase] = {
+                    "updates": len(batch),
+                    "seconds": elapsed,
+                    "updates_per_sec": len(batch) / elapsed,
+                    "p50_ms": percentile(latencies, 0.50) * 1000,
+                    "p95_ms": percentile(latencies, 0.95) * 1000,
+                    "p99_ms": percentile(latencies, 0.99) * 1000,
+                    "api_calls": len(session.calls) - calls_before,
+                }
+
+            counted = (await tallies.get(survey_id)).total
+        finally:
+            await live_updater.stop()
+            await vote_writer.stop()
+            await storage.close()
+
+    print(f"users={args.users} backend={args.backend} cache={not args.no_cache} "
+          f"latency={args.latency * 1000:.0f}ms concurrency={args.concurrency}")
+    print(f"{'kind':10} {'updates/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'api calls':>10}")
+    for phase, r in results.items():
+        print(f"{phase:10} {r['updates_per_sec']:10.0f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['p99_ms']:8.2f} {r['api_calls']:10}")
+    print(f"votes counted: {counted}/{args.users}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "votes_counted": counted, "phases": results}, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,10 @@
+class Checks:
+    """[PASS]/[FAIL] lines for the script-style tests; `ok` turns False at the first failure."""
+
+    def __init__(self):
+        self.ok = True
+
+    def __call__(self, name, condition):
+        print(f"[{'PASS' if condition else 'FAIL'}] {name}")
+        self.ok = self.ok and bool(condition)
+        return condition
@@ -6,3 +6,86 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
 DB_NAME = os.getenv("DB_NAME", "bot_database.db")
+
+# SQLite connection pool
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-16000"))  # negative = KiB
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(128 * 1024 * 1024)))
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))  # ms
+
+# Channel subscription check cache
+SUB_CACHE_SIZE = int(os.getenv("SUB_CACHE_SIZE", "50000"))
+SUB_CACHE_TTL_POSITIVE = float(os.getenv("SUB_CACHE_TTL_POSITIVE", "300"))  # seconds
+SUB_CACHE_TTL_NEGATIVE = float(os.getenv("SUB_CACHE_TTL_NEGATIVE", "3"))  # seconds
+
+# Vote group commit
+VOTE_BATCH_WINDOW_MS = float(os.getenv("VOTE_BATCH_WINDOW_MS", "5"))
+VOTE_BATCH_MAX = int(os.getenv("VOTE_BATCH_MAX", "256"))
+
+# Live updates of posted surveys/results: changed surveys are re-rendered every REFRESH_INTERVAL seconds
+# and their posts edited within a global budget, each chat at most REFRESH_CHAT_RATE edits per second
+REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", "3"))  # seconds
+REFRESH_MAX_TRACKED = int(os.getenv("REFRESH_MAX_TRACKED", "10000"))  # voters' cards waiting for their one edit
+REFRESH_EDIT_RATE = float(os.getenv("REFRESH_EDIT_RATE", "5"))  # edits per second, all chats
+REFRESH_CHAT_RATE = float(os.getenv("REFRESH_CHAT_RATE", str(20 / 60)))
+
+# Rendered keyboards/texts kept per survey (see services/render_cache.py)
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "1024"))
+
+# Survey posting fan-out (Telegram allows ~30 msg/s overall, ~20 msg/min per group)
+POST_GLOBAL_RATE = float(os.getenv("POST_GLOBAL_RATE", "25"))  # messages per second
+POST_CHAT_RATE = float(os.getenv("POST_CHAT_RATE", str(20 / 60)))  # messages per second per chat
+POST_CHAT_BURST = float(os.getenv("POST_CHAT_BURST", "3"))
+POST_MAX_RETRIES = max(1, int(os.getenv("POST_MAX_RETRIES", "5")))  # at least one attempt
+POST_PROGRESS_INTERVAL = float(os.getenv("POST_PROGRESS_INTERVAL", "3"))  # seconds
+
+# Participant export
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))  # rows fetched per step
+EXPORT_SPOOL_SIZE = int(os.getenv("EXPORT_SPOOL_SIZE", str(8 * 1024 * 1024)))  # bytes kept in memory before spilling to disk
+
+# Update delivery: "polling" or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")  # public https://host Telegram can reach
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # random per start when empty
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+
+# Storage backend: "sqlite" (default) or "memory" (benchmarks/tests, nothing persisted)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+
+# Survey metadata cache (active surveys, details, linked channels, candidates)
+METADATA_CACHE = os.getenv("METADATA_CACHE", "1") == "1"
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "600"))  # seconds; writes invalidate immediately
+
+# Prometheus metrics endpoint (http://METRICS_HOST:METRICS_PORT/metrics); port 0 disables it
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))
+
+# Update tracing: updates slower than TRACE_SLOW_MS are logged with their spans and kept for /slow_traces
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "50"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200"))
+
+# Callback throttling per user: sustained taps/second, burst size, and the window for identical repeated taps
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "2"))
+THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", "5"))
+THROTTLE_DEDUPE_WINDOW = float(os.getenv("THROTTLE_DEDUPE_WINDOW", "1.5"))  # seconds
+THROTTLE_MAX_USERS = int(os.getenv("THROTTLE_MAX_USERS", "100000"))
+
+# Logging: written from a background thread. LOG_FORMAT "text" or "json" (one object per line with update/user context).
+# Files rotate at LOG_MAX_BYTES, or on a schedule when LOG_ROTATE_WHEN is set ("midnight", "H", ...)
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Identical warnings/errors beyond LOG_REPEAT_BURST per LOG_REPEAT_WINDOW seconds are dropped and counted
+LOG_REPEAT_WINDOW = float(os.getenv("LOG_REPEAT_WINDOW", "60"))
+LOG_REPEAT_BURST = int(os.getenv("LOG_REPEAT_BURST", "5"))
+
+# Survey deadlines are entered and stored in local time (UTC+5, no DST); when one passes the survey is closed
+DEADLINE_UTC_OFFSET = float(os.getenv("DEADLINE_UTC_OFFSET", "5"))  # hours
+DEADLINE_POST_RESULTS = os.getenv("DEADLINE_POST_RESULTS", "0") == "1"  # also post results to the survey's linked channels
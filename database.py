@@ -1,107 +1,162 @@
+import asyncio
 import aiosqlite
 import logging
-from config import DB_NAME
+import time
+from config import (
+    DB_NAME, DB_READERS, DB_SYNCHRONOUS, DB_CACHE_SIZE,
+    DB_MMAP_SIZE, DB_BUSY_TIMEOUT
+)
 
 from contextlib import asynccontextmanager
+from migrations import apply_migrations
+from services.metrics import instrument_query
+from storage.base import Vote, VoteBatch, VoteResult
 
 logger = logging.getLogger(__name__)
 
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    f"PRAGMA synchronous={DB_SYNCHRONOUS}",
+    f"PRAGMA cache_size={DB_CACHE_SIZE}",
+    f"PRAGMA mmap_size={DB_MMAP_SIZE}",
+    f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}",
+)
+
+async def _connect(path: str):
+    db = await aiosqlite.connect(path)
+    db.row_factory = aiosqlite.Row
+    for pragma in PRAGMAS:
+        await db.execute(pragma)
+    return db
+
+class ConnectionPool:
+    """One writer connection plus a fixed set of reader connections.
+
+    SQLite allows a single writer at a time, so writes are serialized on one
+    connection behind a lock; WAL lets the readers run alongside it.
+    """
+
+    def __init__(self, path: str, readers: int = DB_READERS):
+        self.path = path
+        self.size = max(1, readers)
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._readers = asyncio.Queue()
+        self._connections = []
+
+    async def open(self):
+        self._writer = await _connect(self.path)
+        self._connections.append(self._writer)
+        for _ in range(self.size):
+            db = await _connect(self.path)
+            self._connections.append(db)
+            self._readers.put_nowait(db)
+        logger.info(f"Database pool opened: 1 writer, {self.size} readers ({self.path})")
+
+    async def close(self):
+        for db in self._connections:
+            try:
+                await db.close()
+            except Exception as e:
+                logger.warning(f"Error closing database connection: {e}")
+        self._connections.clear()
+        self._writer = None
+        self._readers = asyncio.Queue()
+
+    @asynccontextmanager
+    async def reader(self):
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self):
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                # Never hand a half-finished transaction to the next writer
+                await self._writer.rollback()
+                raise
+
+_pool = None
+
+async def init_db(path: str = DB_NAME, readers: int = DB_READERS):
+    global _pool
+    if _pool is not None:
+        return _pool
+    pool = ConnectionPool(path, readers)
+    await pool.open()
+    _pool = pool
+    return pool
+
+async def close_db():
+    global _pool
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    await pool.close()
+
 @asynccontextmanager
-async def get_db():
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("PRAGMA journal_mode=WAL")
-        db.row_factory = aiosqlite.Row
+async def _transient_db():
+    # Used by one-off scripts (seed_db.py, deploy_check.py) that never open the pool
+    db = await _connect(DB_NAME)
+    try:
         yield db
+    finally:
+        await db.close()
+
+def get_db():
+    if _pool is None:
+        return _transient_db()
+    return _pool.reader()
+
+def get_writer():
+    if _pool is None:
+        return _transient_db()
+    return _pool.writer()
 
 async def create_tables():
-    async with get_db() as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS surveys (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT,
-                description TEXT,
-                image_file_id TEXT,
-                is_active BOOLEAN DEFAULT 1,
-                is_closed BOOLEAN DEFAULT 0,
-                deadline TEXT
-            )
-        """)
-        
-        # Migration for existing tables
-        try:
-            await db.execute("ALTER TABLE surveys ADD COLUMN is_closed BOOLEAN DEFAULT 0")
-        except Exception:
-            pass
-            
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS candidates (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                survey_id INTEGER,
-                full_name TEXT,
-                votes_count INTEGER DEFAULT 0,
-                FOREIGN KEY(survey_id) REFERENCES surveys(id)
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS votes (
-                user_id INTEGER,
-                survey_id INTEGER,
-                candidate_id INTEGER,
-                PRIMARY KEY (user_id, survey_id),
-                FOREIGN KEY(survey_id) REFERENCES surveys(id),
-                FOREIGN KEY(candidate_id) REFERENCES candidates(id)
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS channels (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                channel_id TEXT NOT NULL,
-                name TEXT,
-                url TEXT
-            )
-        """)
-        
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS survey_channels (
-                survey_id INTEGER,
-                channel_id INTEGER,
-                PRIMARY KEY (survey_id, channel_id),
-                FOREIGN KEY(survey_id) REFERENCES surveys(id),
-                FOREIGN KEY(channel_id) REFERENCES channels(id)
-            )
-        """)
-        
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                phone_number TEXT,
-                username TEXT,
-                full_name TEXT,
-                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        await db.commit()
+    async with get_writer() as db:
+        await apply_migrations(db)
 
 # --- User Queries ---
 
+@instrument_query
 async def get_user_by_id(user_id: int):
     async with get_db() as db:
         async with db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cursor:
             return await cursor.fetchone()
 
+@instrument_query
 async def add_or_update_user(user_id: int, phone: str, username: str, full_name: str):
-    async with get_db() as db:
+    async with get_writer() as db:
         await db.execute(
             "INSERT OR REPLACE INTO users (user_id, phone_number, username, full_name) VALUES (?, ?, ?, ?)",
             (user_id, phone, username, full_name)
         )
         await db.commit()
 
+@instrument_query
+async def iter_user_ids(chunk_size: int = 50000):
+    # Primary-key order, so services.user_index can append without sorting
+    async with get_db() as db:
+        async with db.execute("SELECT user_id FROM users ORDER BY user_id") as cursor:
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [row[0] for row in rows]
+
+@instrument_query
 async def get_active_surveys():
     async with get_db() as db:
         async with db.execute("SELECT id, title, is_closed FROM surveys WHERE is_active = 1") as cursor:
             return await cursor.fetchall()
 
+@instrument_query
 async def get_survey_details(survey_id: int):
     async with get_db() as db:
         async with db.execute(
@@ -110,6 +165,7 @@ async def get_survey_details(survey_id: int):
         ) as cursor:
             return await cursor.fetchone()
 
+@instrument_query
 async def get_survey_candidates(survey_id: int):
     async with get_db() as db:
         async with db.execute(
@@ -118,6 +174,7 @@ async def get_survey_candidates(survey_id: int):
         ) as cursor:
             return await cursor.fetchall()
 
+@instrument_query
 async def has_user_voted(user_id: int, survey_id: int):
     async with get_db() as db:
         async with db.execute(
@@ -126,24 +183,174 @@ async def has_user_voted(user_id: int, survey_id: int):
         ) as cursor:
             return await cursor.fetchone() is not None
 
-async def register_vote(user_id: int, survey_id: int, candidate_id: int):
-    async with get_db() as db:
-        try:
-            await db.execute(
-                "INSERT INTO votes (user_id, survey_id, candidate_id) VALUES (?, ?, ?)", 
-                (user_id, survey_id, candidate_id)
-            )
-            await db.execute(
-                "UPDATE candidates SET votes_count = votes_count + 1 WHERE id = ?", 
-                (candidate_id,)
+VOTE_INSERT_QUERY = """
+    INSERT OR IGNORE INTO votes (user_id, survey_id, candidate_id)
+    SELECT ?, c.survey_id, c.id
+    FROM candidates c
+    JOIN surveys s ON s.id = c.survey_id
+    WHERE c.id = ? AND c.survey_id = ? AND s.is_active = 1 AND s.is_closed = 0
+"""
+
+VOTE_REJECTION_QUERY = """
+    SELECT
+        EXISTS (SELECT 1 FROM votes WHERE user_id = ? AND survey_id = ?) AS voted,
+        (SELECT s.is_active = 1 AND s.is_closed = 0
+         FROM candidates c JOIN surveys s ON s.id = c.survey_id
+         WHERE c.id = ? AND c.survey_id = ?) AS open
+"""
+
+VOTE_HOURLY_UPSERT = """
+    INSERT INTO vote_hourly (survey_id, hour, candidate_id, votes) VALUES (?, ?, ?, ?)
+    ON CONFLICT (survey_id, hour, candidate_id) DO UPDATE SET votes = votes + excluded.votes
+"""
+
+async def _register_votes(db, votes):
+    # Everything happens in one transaction on the writer connection: the open
+    # survey / candidate checks ride along with the idempotent insert, accepted
+    # votes are appended to vote_events with their aggregates bumped alongside,
+    # and the new counts are read back before commit.
+    now = int(time.time())
+    results = []
+    increments = {}
+    events = []
+    for user_id, survey_id, candidate_id, chat_id in (Vote(*vote) for vote in votes):
+        cursor = await db.execute(VOTE_INSERT_QUERY, (user_id, candidate_id, survey_id))
+        if cursor.rowcount == 1:
+            increments[(survey_id, candidate_id)] = increments.get((survey_id, candidate_id), 0) + 1
+            events.append((user_id, survey_id, candidate_id, chat_id, now))
+            results.append(VoteResult.ACCEPTED)
+            continue
+
+        # Rejected: work out why (rare apart from duplicates)
+        async with db.execute(VOTE_REJECTION_QUERY, (user_id, survey_id, candidate_id, survey_id)) as cursor:
+            voted, is_open = await cursor.fetchone()
+        if voted:
+            results.append(VoteResult.DUPLICATE)
+        elif is_open is None:
+            results.append(VoteResult.INVALID)
+        else:
+            results.append(VoteResult.CLOSED)
+
+    counts = {}
+    if increments:
+        await db.executemany(
+            "INSERT INTO vote_events (user_id, survey_id, candidate_id, chat_id, created_at) VALUES (?, ?, ?, ?, ?)",
+            events
+        )
+        await db.executemany(
+            VOTE_HOURLY_UPSERT,
+            [(survey_id, now // 3600, candidate_id, count) for (survey_id, candidate_id), count in increments.items()]
+        )
+        await db.executemany(
+            "UPDATE candidates SET votes_count = votes_count + ? WHERE id = ?",
+            [(count, candidate_id) for (_, candidate_id), count in increments.items()]
+        )
+        ids = [candidate_id for _, candidate_id in increments]
+        async with db.execute(
+            f"SELECT survey_id, id, votes_count FROM candidates WHERE id IN ({','.join('?' * len(ids))})", ids
+        ) as cursor:
+            counts = {(row['survey_id'], row['id']): row['votes_count'] for row in await cursor.fetchall()}
+    await db.commit()
+    return VoteBatch(results, counts)
+
+@instrument_query
+async def register_vote(user_id: int, survey_id: int, candidate_id: int, chat_id: int = None):
+    # One vote, one commit (the VoteWriter batches through register_votes instead)
+    async with get_writer() as db:
+        batch = await _register_votes(db, [Vote(user_id, survey_id, candidate_id, chat_id)])
+    return batch.results[0]
+
+@instrument_query
+async def register_votes(votes):
+    # Group commit: many (user_id, survey_id, candidate_id) votes in one transaction
+    async with get_writer() as db:
+        return await _register_votes(db, votes)
+
+# Tally snapshots are read on the writer connection: no vote batch can commit
+# between the snapshot and the moment services.tally installs it.
+@instrument_query
+async def get_tally_rows(survey_id: int = None):
+    query = "SELECT id, survey_id, full_name, votes_count FROM candidates"
+    params = ()
+    if survey_id is not None:
+        query += " WHERE survey_id = ?"
+        params = (survey_id,)
+    async with get_writer() as db:
+        async with db.execute(query, params) as cursor:
+            return await cursor.fetchall()
+
+@instrument_query
+async def get_vote_counts():
+    async with get_writer() as db:
+        async with db.execute(
+            "SELECT survey_id, candidate_id, COUNT(*) AS votes FROM votes GROUP BY survey_id, candidate_id"
+        ) as cursor:
+            return await cursor.fetchall()
+
+VOTE_COUNT_DRIFT_QUERY = """
+    SELECT c.survey_id, c.id AS candidate_id, c.votes_count,
+           (SELECT COUNT(*) FROM votes v WHERE v.survey_id = c.survey_id AND v.candidate_id = c.id) AS votes
+    FROM candidates c
+    WHERE c.votes_count != (SELECT COUNT(*) FROM votes v WHERE v.survey_id = c.survey_id AND v.candidate_id = c.id)
+"""
+
+@instrument_query
+async def repair_vote_counts():
+    # One writer transaction: no vote batch can land between the check and the fix
+    async with get_writer() as db:
+        async with db.execute(VOTE_COUNT_DRIFT_QUERY) as cursor:
+            drifted = await cursor.fetchall()
+        if drifted:
+            await db.executemany(
+                "UPDATE candidates SET votes_count = ? WHERE id = ?",
+                [(row['votes'], row['candidate_id']) for row in drifted]
             )
             await db.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Error registering vote: {e}")
-            await db.rollback()
-            return False
+        return drifted
+
+@instrument_query
+async def get_vote_timeline(survey_id: int, since: int = None):
+    # Reads the hourly aggregate, never vote_events
+    async with get_db() as db:
+        async with db.execute(
+            "SELECT hour, candidate_id, votes FROM vote_hourly WHERE survey_id = ? AND hour >= ? ORDER BY hour",
+            (survey_id, (since or 0) // 3600)
+        ) as cursor:
+            return await cursor.fetchall()
 
+VOTE_AGGREGATES_DIFF_QUERY = """
+    WITH per_candidate AS (
+        SELECT candidate_id, COUNT(*) AS votes FROM vote_events GROUP BY candidate_id
+    ),
+    per_hour AS (
+        SELECT survey_id, created_at / 3600 AS hour, candidate_id, COUNT(*) AS votes
+        FROM vote_events WHERE created_at IS NOT NULL
+        GROUP BY survey_id, hour, candidate_id
+    )
+    SELECT 'candidate' AS kind, c.survey_id, NULL AS hour, c.id AS candidate_id,
+           c.votes_count AS live, COALESCE(p.votes, 0) AS rebuilt
+    FROM candidates c LEFT JOIN per_candidate p ON p.candidate_id = c.id
+    WHERE c.votes_count != COALESCE(p.votes, 0)
+    UNION ALL
+    SELECT 'hourly', r.survey_id, r.hour, r.candidate_id, COALESCE(h.votes, 0), r.votes
+    FROM per_hour r
+    LEFT JOIN vote_hourly h ON h.survey_id = r.survey_id AND h.hour = r.hour AND h.candidate_id = r.candidate_id
+    WHERE h.votes IS NOT r.votes
+    UNION ALL
+    SELECT 'hourly', h.survey_id, h.hour, h.candidate_id, h.votes, 0
+    FROM vote_hourly h
+    LEFT JOIN per_hour r ON r.survey_id = h.survey_id AND r.hour = h.hour AND r.candidate_id = h.candidate_id
+    WHERE r.votes IS NULL
+"""
+
+@instrument_query
+async def verify_vote_aggregates():
+    # On the writer connection, like get_vote_counts: no batch lands mid-comparison
+    async with get_writer() as db:
+        async with db.execute(VOTE_AGGREGATES_DIFF_QUERY) as cursor:
+            return await cursor.fetchall()
+
+@instrument_query
 async def get_linked_channels(survey_id: int):
     async with get_db() as db:
         async with db.execute("""
@@ -156,41 +363,48 @@ async def get_linked_channels(survey_id: int):
 
 # --- Admin Queries ---
 
+@instrument_query
 async def delete_survey(survey_id: int):
-    async with get_db() as db:
+    async with get_writer() as db:
         await db.execute("UPDATE surveys SET is_active = 0 WHERE id = ?", (survey_id,))
         await db.commit()
 
+@instrument_query
 async def get_all_channels():
     async with get_db() as db:
         async with db.execute("SELECT id, name, url, channel_id FROM channels") as cursor:
             return await cursor.fetchall()
 
+@instrument_query
 async def add_channel(channel_id: str, name: str, url: str):
-    async with get_db() as db:
+    async with get_writer() as db:
         await db.execute(
             "INSERT INTO channels (channel_id, name, url) VALUES (?, ?, ?)", 
             (channel_id, name, url)
         )
         await db.commit()
 
+@instrument_query
 async def channel_exists(channel_id: str):
     async with get_db() as db:
         async with db.execute("SELECT 1 FROM channels WHERE channel_id = ?", (str(channel_id),)) as cursor:
             return await cursor.fetchone() is not None
 
+@instrument_query
 async def delete_channel(c_id: int):
-    async with get_db() as db:
+    async with get_writer() as db:
         await db.execute("DELETE FROM channels WHERE id = ?", (c_id,))
         await db.commit()
 
+@instrument_query
 async def close_survey(survey_id: int):
-    async with get_db() as db:
+    async with get_writer() as db:
         await db.execute("UPDATE surveys SET is_closed = 1 WHERE id = ?", (survey_id,))
         await db.commit()
 
-async def create_survey(title, description, image_file_id, deadline="2026-12-31"):
-    async with get_db() as db:
+@instrument_query
+async def create_survey(title, description, image_file_id, deadline=None):
+    async with get_writer() as db:
         cursor = await db.execute(
             "INSERT INTO surveys (title, description, image_file_id, is_active, deadline) VALUES (?, ?, ?, 1, ?)",
             (title, description, image_file_id, deadline)
@@ -199,13 +413,31 @@ async def create_survey(title, description, image_file_id, deadline="2026-12-31"
         await db.commit()
         return survey_id
 
-async def add_candidate(survey_id: int, full_name: str):
+@instrument_query
+async def set_survey_deadline(survey_id: int, deadline):
+    async with get_writer() as db:
+        await db.execute("UPDATE surveys SET deadline = ? WHERE id = ?", (deadline, survey_id))
+        await db.commit()
+
+@instrument_query
+async def get_survey_deadlines():
     async with get_db() as db:
-        await db.execute("INSERT INTO candidates (survey_id, full_name) VALUES (?, ?)", (survey_id, full_name))
+        async with db.execute(
+            "SELECT id, deadline FROM surveys WHERE is_active = 1 AND is_closed = 0 AND deadline IS NOT NULL"
+        ) as cursor:
+            return await cursor.fetchall()
+
+@instrument_query
+async def add_candidate(survey_id: int, full_name: str):
+    async with get_writer() as db:
+        cursor = await db.execute("INSERT INTO candidates (survey_id, full_name) VALUES (?, ?)", (survey_id, full_name))
+        candidate_id = cursor.lastrowid
         await db.commit()
+        return candidate_id
 
+@instrument_query
 async def toggle_survey_channel(survey_id: int, channel_id: int):
-    async with get_db() as db:
+    async with get_writer() as db:
         async with db.execute(
             "SELECT 1 FROM survey_channels WHERE survey_id = ? AND channel_id = ?", 
             (survey_id, channel_id)
@@ -227,6 +459,7 @@ async def toggle_survey_channel(survey_id: int, channel_id: int):
         await db.commit()
         return action
 
+@instrument_query
 async def get_survey_linked_channel_ids(survey_id: int):
     async with get_db() as db:
         async with db.execute(
@@ -236,20 +469,60 @@ async def get_survey_linked_channel_ids(survey_id: int):
             rows = await cursor.fetchall()
             return {row['channel_id'] for row in rows}
 
+@instrument_query
+async def add_posted_message(survey_id: int, chat_id: int, message_id: int, kind: str):
+    async with get_writer() as db:
+        await db.execute(
+            "INSERT INTO posted_messages (survey_id, chat_id, message_id, kind) VALUES (?, ?, ?, ?)",
+            (survey_id, chat_id, message_id, kind)
+        )
+        await db.commit()
+
+@instrument_query
+async def get_posted_messages(survey_id: int):
+    async with get_db() as db:
+        async with db.execute(
+            "SELECT chat_id, message_id, kind, posted_at FROM posted_messages WHERE survey_id = ?",
+            (survey_id,)
+        ) as cursor:
+            return await cursor.fetchall()
+
+@instrument_query
+async def delete_posted_message(chat_id: int, message_id: int):
+    async with get_writer() as db:
+        await db.execute(
+            "DELETE FROM posted_messages WHERE chat_id = ? AND message_id = ?",
+            (chat_id, message_id)
+        )
+        await db.commit()
+
+PARTICIPANTS_REPORT_QUERY = """
+    SELECT 
+        u.phone_number, 
+        u.full_name, 
+        c.full_name as candidate_name
+    FROM users u
+    LEFT JOIN votes v ON u.user_id = v.user_id AND v.survey_id = ?
+    LEFT JOIN candidates c ON v.candidate_id = c.id
+    ORDER BY 
+        CASE WHEN v.candidate_id IS NULL THEN 1 ELSE 0 END,
+        v.candidate_id ASC,
+        u.full_name ASC
+"""
+
+@instrument_query
 async def get_survey_participants_report(survey_id: int):
     async with get_db() as db:
-        query = """
-            SELECT 
-                u.phone_number, 
-                u.full_name, 
-                c.full_name as candidate_name
-            FROM users u
-            LEFT JOIN votes v ON u.user_id = v.user_id AND v.survey_id = ?
-            LEFT JOIN candidates c ON v.candidate_id = c.id
-            ORDER BY 
-                CASE WHEN v.candidate_id IS NULL THEN 1 ELSE 0 END,
-                v.candidate_id ASC,
-                u.full_name ASC
-        """
-        async with db.execute(query, (survey_id,)) as cursor:
+        async with db.execute(PARTICIPANTS_REPORT_QUERY, (survey_id,)) as cursor:
             return await cursor.fetchall()
+
+@instrument_query
+async def iter_survey_participants_report(survey_id: int, chunk_size: int = 1000):
+    # Yields the report in chunks so exports never hold every user in memory
+    async with get_db() as db:
+        async with db.execute(PARTICIPANTS_REPORT_QUERY, (survey_id,)) as cursor:
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
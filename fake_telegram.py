@@ -0,0 +1,61 @@
+import asyncio
+import datetime
+import itertools
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetChatMember, GetMe
+from aiogram.types import Chat, ChatMemberMember, Message, User
+
+BOT_USER = User(id=42, is_bot=True, first_name="Test bot", username="test_bot")
+
+class FakeSession(BaseSession):
+    """Bot API session that never touches the network.
+
+    Every request is recorded in `calls`; answers are synthesized from the
+    method's return type (or taken from `responses[api_method](method)`).
+    `latency` seconds are awaited per call to mimic Telegram round-trips.
+    """
+
+    def __init__(self, latency: float = 0.0, responses=None):
+        super().__init__()
+        self.latency = latency
+        self.responses = responses or {}
+        self.calls = []
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls.append(method)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        override = self.responses.get(method.__api_method__)
+        if override is not None:
+            return override(method)
+        return self._default_result(method)
+
+    def _default_result(self, method):
+        if isinstance(method, GetMe):
+            return BOT_USER
+        if isinstance(method, GetChatMember):
+            return ChatMemberMember(user=User(id=method.user_id, is_bot=False, first_name="User"))
+
+        returning = method.__returning__
+        if returning is bool or bool in getattr(returning, "__args__", ()):
+            return True
+        if returning is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            chat = Chat(id=chat_id if isinstance(chat_id, int) else -100, type="private")
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.datetime.now(),
+                chat=chat,
+                text=getattr(method, "text", None),
+            )
+        raise NotImplementedError(f"FakeSession has no answer for {method.__api_method__}")
+
+    def api_calls(self, api_method: str):
+        return [m for m in self.calls if m.__api_method__ == api_method]
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
@@ -1,59 +1,79 @@
+import datetime
 import logging
-import os
+import time
 from aiogram import Router, F
-from aiogram.types import Message, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, FSInputFile, LinkPreviewOptions
-from aiogram.filters import Command
+from aiogram.types import Message, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, LinkPreviewOptions
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config import ADMIN_ID
-from states import SurveyCreation, ChannelManagement, SurveyPosting
-from database import (
-    get_active_surveys, delete_survey, get_all_channels, 
-    add_channel, channel_exists, delete_channel, 
-    get_survey_details, get_survey_candidates, close_survey,
-    create_survey, add_candidate, toggle_survey_channel,
-    get_survey_linked_channel_ids, get_survey_participants_report
-)
+from states import SurveyCreation, SurveyDeadline, ChannelManagement, SurveyPosting
+from storage.base import Storage
+from storage.cached import CachedStorage
+from services.export import available_formats, export_participants
+from services.live_updates import live_updater
+from services.posting import start_post_job
+from services import results
+from services.deadlines import TZ, deadline_scheduler, format_deadline, parse_deadline
+from services.render_cache import survey_list_markup
+from services.results import split_text
+from services.tally import tallies
+from services.tracing import tracer
+from services.user_index import user_index
+from services.velocity import format_stats, velocity
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-# Middleware-like check for admin
+# Middleware-like check for admin (also takes a CallbackQuery)
 async def is_admin(message: Message):
     if message.from_user.id != ADMIN_ID:
         logger.warning(f"Unauthorized admin access attempt by {message.from_user.id}")
         return False
     return True
 
+DEADLINE_PROMPT = (
+    "So'rovnoma tugash muddatini kiriting (Toshkent vaqti bilan), masalan:\n"
+    "2026-12-31 21:00 yoki 31.12.2026 21:00"
+)
+
+async def read_deadline(message: Message):
+    """Parsed deadline from the admin's reply, or None after telling them what's wrong."""
+    when = parse_deadline(message.text)
+    if when is None:
+        await message.answer("Sana tushunarsiz. " + DEADLINE_PROMPT)
+        return None
+    if when.timestamp() <= time.time():
+        await message.answer("Muddat kelajakda bo'lishi kerak. Qaytadan kiriting:")
+        return None
+    return when
+
 @router.message(Command("admin"))
 async def cmd_admin(message: Message):
     if not await is_admin(message): return
-    await message.answer("Admin panelga xush kelibsiz.\n\n/create_survey - Yangi so'rovnoma\n/delete_survey - So'rovnomani o'chirish\n/channels - Kanallar va guruhlar\n/survey_channels - 🔗 So'rovnoma Kanallari\n/finish_survey - Yakunlash\n/post_survey - Kanal/Guruhga post\n/post_results - Natijani kanal/guruhga yuborish\n/phone_numbers - 📱 Telefon raqamlar ro'yxati")
+    await message.answer("Admin panelga xush kelibsiz.\n\n/create_survey - Yangi so'rovnoma\n/delete_survey - So'rovnomani o'chirish\n/channels - Kanallar va guruhlar\n/survey_channels - 🔗 So'rovnoma Kanallari\n/finish_survey - Yakunlash\n/set_deadline - ⏰ Tugash muddati\n/post_survey - Kanal/Guruhga post\n/post_results - Natijani kanal/guruhga yuborish\n/phone_numbers - 📱 Telefon raqamlar ro'yxati\n/reconcile - 🔄 Ovozlar hisobini tekshirish\n/verify_votes - 🧾 Ovozlar jurnalini tekshirish\n/stats - 📈 Ovoz berish tezligi\n/cache_stats - 📊 Kesh statistikasi\n/slow_traces - 🐢 Sekin so'rovlar")
 
 @router.message(Command("delete_survey"))
-async def cmd_delete_survey(message: Message):
+async def cmd_delete_survey(message: Message, storage: Storage):
     if not await is_admin(message): return
     try:
-        surveys = await get_active_surveys()
+        surveys = await storage.get_active_surveys()
         if not surveys:
             await message.answer("O'chirish uchun faol so'rovnomalar yo'q.")
             return
 
-        keyboard = []
-        for s in surveys:
-            keyboard.append([InlineKeyboardButton(text=f"❌ {s['title']}", callback_data=f"del_survey_{s['id']}")])
-        
-        markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        markup = survey_list_markup(surveys, "del_survey_", "❌")
         await message.answer("O'chirmoqchi bo'lgan so'rovnomangizni tanlang:", reply_markup=markup)
     except Exception as e:
         logger.error(f"Error in cmd_delete_survey: {e}")
         await message.answer("Xatolik yuz berdi.")
 
 @router.callback_query(F.data.startswith("del_survey_"))
-async def process_delete_survey(callback: CallbackQuery):
+async def process_delete_survey(callback: CallbackQuery, storage: Storage):
     try:
         survey_id = int(callback.data.split("_")[2])
-        await delete_survey(survey_id)
+        await storage.delete_survey(survey_id)
+        deadline_scheduler.discard(survey_id)
+        velocity.forget(survey_id)
         await callback.answer("So'rovnoma o'chirildi!", show_alert=True)
         await callback.message.delete()
     except Exception as e:
@@ -63,10 +83,10 @@ async def process_delete_survey(callback: CallbackQuery):
 # --- Channel Management ---
 
 @router.message(Command("channels"))
-async def cmd_channels(message: Message):
+async def cmd_channels(message: Message, storage: Storage):
     if not await is_admin(message): return
     try:
-        channels = await get_all_channels()
+        channels = await storage.get_all_channels()
         text = "📢 **Ulangan kanallar va guruhlar:**\n\n"
         keyboard = []
         
@@ -97,7 +117,7 @@ async def ask_channel(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.message(ChannelManagement.waiting_for_forward)
-async def process_channel_input(message: Message, state: FSMContext, bot):
+async def process_channel_input(message: Message, state: FSMContext, bot, storage: Storage):
     try:
         chat_id = None
         chat_title = None
@@ -137,12 +157,12 @@ async def process_channel_input(message: Message, state: FSMContext, bot):
         except Exception:
              invite_link = "Noma'lum havola"
 
-        if await channel_exists(str(chat_id)):
+        if await storage.channel_exists(str(chat_id)):
             await message.answer("Bu kanal/guruh allaqachon qo'shilgan!")
             await state.clear()
             return
 
-        await add_channel(str(chat_id), chat_title, invite_link)
+        await storage.add_channel(str(chat_id), chat_title, invite_link)
         await message.answer(f"✅ Qo'shildi:\nNom: {chat_title}\nID: {chat_id}\nHavola: {invite_link}")
         await state.clear()
     except Exception as e:
@@ -151,10 +171,10 @@ async def process_channel_input(message: Message, state: FSMContext, bot):
         await state.clear()
 
 @router.callback_query(F.data.startswith("del_channel_"))
-async def delete_channel_handler(callback: CallbackQuery):
+async def delete_channel_handler(callback: CallbackQuery, storage: Storage):
     try:
         c_id = int(callback.data.split("_")[2])
-        await delete_channel(c_id)
+        await storage.delete_channel(c_id)
         await callback.answer("O'chirildi!", show_alert=True)
         await callback.message.delete()
     except Exception as e:
@@ -164,152 +184,372 @@ async def delete_channel_handler(callback: CallbackQuery):
 # --- Post Survey ---
 
 @router.message(Command("post_survey"))
-async def cmd_post_survey(message: Message):
+async def cmd_post_survey(message: Message, storage: Storage):
     if not await is_admin(message): return
     try:
-        surveys = await get_active_surveys()
+        surveys = await storage.get_active_surveys()
         if not surveys:
             await message.answer("Yuborish uchun faol so'rovnomalar yo'q.")
             return
 
-        keyboard = []
-        for s in surveys:
-            keyboard.append([InlineKeyboardButton(text=f"📤 {s['title']}", callback_data=f"post_select_{s['id']}")])
-        
-        markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        markup = survey_list_markup(surveys, "post_select_", "📤")
         await message.answer("📢 **Qaysi so'rovnomani kanalga chiqarmoqchisiz?**", reply_markup=markup)
     except Exception as e:
         logger.error(f"Error in cmd_post_survey: {e}")
         await message.answer("Xatolik.")
 
 @router.callback_query(F.data.startswith("post_select_"))
-async def ask_target_channel(callback: CallbackQuery, state: FSMContext):
+async def ask_target_channel(callback: CallbackQuery, state: FSMContext, storage: Storage):
     survey_id = int(callback.data.split("_")[2])
-    await state.update_data(post_survey_id=survey_id)
-    await callback.message.answer(
-        "So'rovnomani qaysi kanal yoki guruhga yubormoqchisiz?\n\nUsername (@...) yoki ID kiriting.\nBot admin bo'lishi shart!"
-    )
+    await state.update_data(post_survey_id=survey_id, is_result_post=False, post_targets={})
     await state.set_state(SurveyPosting.waiting_for_channel)
+    await show_post_targets(callback.message, state, storage)
+    await callback.answer()
+
+async def show_post_targets(message: Message, state: FSMContext, storage: Storage, edit: bool = False):
+    data = await state.get_data()
+    selected = data.get('post_targets', {})
+    channels = await storage.get_all_channels()
+    what = "Natijani" if data.get('is_result_post') else "So'rovnomani"
+
+    text = (
+        f"{what} qaysi kanal va guruhlarga yubormoqchisiz?\n\n"
+        "Ro'yxatdan tanlang yoki Username (@...) / ID yozib yuboring (bir nechtasini vergul bilan).\n"
+        "Bot admin bo'lishi shart!\n\n"
+        f"Tanlangan: {len(selected)} ta"
+    )
+    known = {str(c['channel_id']) for c in channels}
+    extra = [name for chat_id, name in selected.items() if chat_id not in known]
+    if extra:
+        text += "\n" + "\n".join(f"• {name}" for name in extra)
+
+    keyboard = []
+    for c in channels:
+        status_icon = "✅" if str(c['channel_id']) in selected else "❌"
+        keyboard.append([InlineKeyboardButton(text=f"{status_icon} {c['name']}", callback_data=f"pt_toggle_{c['id']}")])
+    if channels:
+        keyboard.append([InlineKeyboardButton(text="📋 Hammasini tanlash", callback_data="pt_all")])
+    keyboard.append([
+        InlineKeyboardButton(text=f"🚀 Yuborish ({len(selected)})", callback_data="pt_send"),
+        InlineKeyboardButton(text="✖️ Bekor qilish", callback_data="pt_cancel"),
+    ])
+    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+    if edit:
+        try:
+            await message.edit_text(text, reply_markup=markup)
+            return
+        except Exception:
+            pass
+    await message.answer(text, reply_markup=markup)
+
+@router.callback_query(SurveyPosting.waiting_for_channel, F.data.startswith("pt_toggle_"))
+async def toggle_post_target(callback: CallbackQuery, state: FSMContext, storage: Storage):
+    try:
+        c_id = int(callback.data.split("_")[2])
+        channel = next((c for c in await storage.get_all_channels() if c['id'] == c_id), None)
+        if not channel:
+            await callback.answer("Kanal topilmadi.", show_alert=True)
+            return
+
+        data = await state.get_data()
+        selected = dict(data.get('post_targets', {}))
+        key = str(channel['channel_id'])
+        if key in selected:
+            del selected[key]
+        else:
+            selected[key] = channel['name']
+        await state.update_data(post_targets=selected)
+        await show_post_targets(callback.message, state, storage, edit=True)
+        await callback.answer()
+    except Exception as e:
+        logger.error(f"Error in toggle_post_target: {e}")
+        await callback.answer("Xatolik.", show_alert=True)
+
+@router.callback_query(SurveyPosting.waiting_for_channel, F.data == "pt_all")
+async def select_all_post_targets(callback: CallbackQuery, state: FSMContext, storage: Storage):
+    try:
+        data = await state.get_data()
+        selected = dict(data.get('post_targets', {}))
+        for c in await storage.get_all_channels():
+            selected[str(c['channel_id'])] = c['name']
+        await state.update_data(post_targets=selected)
+        await show_post_targets(callback.message, state, storage, edit=True)
+        await callback.answer()
+    except Exception as e:
+        logger.error(f"Error in select_all_post_targets: {e}")
+        await callback.answer("Xatolik.", show_alert=True)
+
+@router.callback_query(SurveyPosting.waiting_for_channel, F.data == "pt_cancel")
+async def cancel_post_targets(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.message.edit_text("Bekor qilindi.")
     await callback.answer()
 
 @router.message(SurveyPosting.waiting_for_channel)
-async def perform_post_survey(message: Message, state: FSMContext, bot):
+async def add_post_targets(message: Message, state: FSMContext, bot, storage: Storage):
+    try:
+        typed = [t.strip() for t in (message.text or "").replace("\n", ",").replace(" ", ",").split(",")]
+        typed = [t for t in typed if t]
+        if not typed:
+            await message.answer("Username (@...) yoki ID kiriting.")
+            return
+
+        data = await state.get_data()
+        selected = dict(data.get('post_targets', {}))
+        not_found = []
+        for target in typed:
+            # Keyed by the numeric id, so @username and the id of one chat are a single target
+            try:
+                chat = await bot.get_chat(target)
+            except Exception:
+                not_found.append(target)
+                continue
+            selected[str(chat.id)] = chat.title or chat.username or str(chat.id)
+        await state.update_data(post_targets=selected)
+        if not_found:
+            await message.answer(f"Topilmadi: {', '.join(not_found)}")
+        await show_post_targets(message, state, storage)
+    except Exception as e:
+        logger.error(f"Error in add_post_targets: {e}")
+        await message.answer("Xatolik.")
+
+@router.callback_query(SurveyPosting.waiting_for_channel, F.data == "pt_send")
+async def perform_post_survey(callback: CallbackQuery, state: FSMContext, bot):
     try:
-        channel_id = message.text.strip()
         data = await state.get_data()
         survey_id = data.get('post_survey_id')
         is_result = data.get('is_result_post', False)
-        
-        survey = await get_survey_details(survey_id)
-        candidates = await get_survey_candidates(survey_id)
+        selected = data.get('post_targets', {})
 
-        if not survey:
-            await message.answer("Xatolik: So'rovnoma topilmadi.")
-            await state.clear()
+        if not selected:
+            await callback.answer("Kamida bitta kanal yoki guruh tanlang!", show_alert=True)
             return
 
-        if is_result:
-            text = f"🏁 <b>SO'ROVNOMA NATIJALARI</b>\n\n📌 <b>{survey['title']}</b>\n\n"
-            medals = ["🥇", "🥈", "🥉"]
-            total_votes = sum(c['votes_count'] for c in candidates)
-            
-            for i, c in enumerate(candidates):
-                icon = medals[i] if i < 3 else "▪️"
-                percent = (c['votes_count'] / total_votes * 100) if total_votes > 0 else 0
-                text += f"{icon} <b>{c['votes_count']} ovoz</b> ({percent:.1f}%) — {c['full_name']}\n"
-            text += f"\n🗳 Jami ovozlar: {total_votes}"
-            
-            try:
-                if survey['image_file_id']:
-                    if len(text) > 1000:
-                        await bot.send_photo(chat_id=channel_id, photo=survey['image_file_id'])
-                        await bot.send_message(chat_id=channel_id, text=text, parse_mode="HTML")
-                    else:
-                        await bot.send_photo(chat_id=channel_id, photo=survey['image_file_id'], caption=text, parse_mode="HTML")
-                else:
-                    await bot.send_message(chat_id=channel_id, text=text, parse_mode="HTML")
-                await message.answer(f"✅ Natijalar {channel_id} ga yuborildi!")
-            except Exception as e:
-                await message.answer(f"❌ Xatolik: {e}")
-        else:
-            text = f"{survey['description']}"
-            builder = InlineKeyboardBuilder()
-            for c in candidates:
-                builder.button(text=f"{c['full_name']} ({c['votes_count']})", callback_data=f"vote_{survey_id}_{c['id']}")
-            builder.adjust(1)
-
-            try:
-                if survey['image_file_id']:
-                    await bot.send_photo(chat_id=channel_id, photo=survey['image_file_id'], caption=text, reply_markup=builder.as_markup(), parse_mode="HTML")
-                else:
-                    await bot.send_message(chat_id=channel_id, text=text, reply_markup=builder.as_markup(), parse_mode="HTML")
-                await message.answer(f"✅ So'rovnoma {channel_id} ga yuborildi!")
-            except Exception as e:
-                await message.answer(f"❌ Xatolik yuz berdi: {e}")
+        await state.clear()
+        start_post_job(bot, callback.message.chat.id, survey_id, list(selected.items()), is_result)
+        await callback.message.edit_text(f"🚀 {len(selected)} ta chatga yuborish boshlandi. Jarayon haqida xabar beriladi.")
+        await callback.answer()
     except Exception as e:
         logger.error(f"Error in perform_post_survey: {e}")
-        await message.answer("Yuborishda kutilmagan xatolik.")
-    finally:
-        await state.clear()
+        await callback.answer("Yuborishda kutilmagan xatolik.", show_alert=True)
 
 # --- Survey Management ---
 
 @router.message(Command("finish_survey"))
-async def cmd_finish_survey(message: Message):
+async def cmd_finish_survey(message: Message, storage: Storage):
     if not await is_admin(message): return
     try:
         # Get surveys that are active but not closed
-        surveys = [s for s in await get_active_surveys() if not s['is_closed']]
+        surveys = [s for s in await storage.get_active_surveys() if not s['is_closed']]
         if not surveys:
             await message.answer("Tugatish uchun faol so'rovnomalar yo'q.")
             return
 
-        keyboard = []
-        for s in surveys:
-            keyboard.append([InlineKeyboardButton(text=f"🛑 {s['title']}", callback_data=f"finish_survey_{s['id']}")])
-        
-        markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        markup = survey_list_markup(surveys, "finish_survey_", "🛑")
         await message.answer("🏁 **Qaysi so'rovnomani yakunlamoqchisiz?**", reply_markup=markup)
     except Exception as e:
         logger.error(f"Error in cmd_finish_survey: {e}")
         await message.answer("Xatolik.")
 
 @router.callback_query(F.data.startswith("finish_survey_"))
-async def process_finish_survey_handler(callback: CallbackQuery):
+async def process_finish_survey_handler(callback: CallbackQuery, storage: Storage):
     try:
         survey_id = int(callback.data.split("_")[2])
-        await close_survey(survey_id)
+        await storage.close_survey(survey_id)
+        deadline_scheduler.discard(survey_id)
+        live_updater.schedule(survey_id)
         await callback.answer("So'rovnoma yakunlandi!", show_alert=True)
         await callback.message.edit_text("✅ So'rovnoma muvaffaqiyatli yakunlandi.")
     except Exception as e:
         logger.error(f"Error in process_finish_survey: {e}")
         await callback.answer("Yakunlashda xatolik.", show_alert=True)
 
+@router.message(Command("set_deadline"))
+async def cmd_set_deadline(message: Message, storage: Storage):
+    if not await is_admin(message): return
+    try:
+        surveys = [s for s in await storage.get_active_surveys() if not s['is_closed']]
+        if not surveys:
+            await message.answer("Muddat belgilash uchun faol so'rovnomalar yo'q.")
+            return
+
+        markup = survey_list_markup(surveys, "deadline_", "⏰")
+        await message.answer("⏰ **Qaysi so'rovnoma muddatini o'zgartirmoqchisiz?**", reply_markup=markup)
+    except Exception as e:
+        logger.error(f"Error in cmd_set_deadline: {e}")
+        await message.answer("Xatolik.")
+
+@router.callback_query(F.data.startswith("deadline_"))
+async def ask_deadline(callback: CallbackQuery, state: FSMContext):
+    survey_id = int(callback.data.split("_")[1])
+    await state.update_data(deadline_survey_id=survey_id)
+    await state.set_state(SurveyDeadline.waiting_for_deadline)
+    await callback.message.answer(DEADLINE_PROMPT + "\nMuddatni olib tashlash uchun /skip deb yozing.")
+    await callback.answer()
+
+@router.message(SurveyDeadline.waiting_for_deadline, Command("skip"))
+async def clear_deadline(message: Message, state: FSMContext, storage: Storage):
+    try:
+        survey_id = (await state.get_data())['deadline_survey_id']
+        await storage.set_survey_deadline(survey_id, None)
+        deadline_scheduler.discard(survey_id)
+        await message.answer("✅ Muddat olib tashlandi.")
+    except Exception as e:
+        logger.error(f"Error in clear_deadline: {e}")
+        await message.answer("Xatolik.")
+    finally:
+        await state.clear()
+
+@router.message(SurveyDeadline.waiting_for_deadline)
+async def process_new_deadline(message: Message, state: FSMContext, storage: Storage):
+    when = await read_deadline(message)
+    if when is None:
+        return
+    try:
+        survey_id = (await state.get_data())['deadline_survey_id']
+        deadline = format_deadline(when)
+        await storage.set_survey_deadline(survey_id, deadline)
+        deadline_scheduler.schedule(survey_id, deadline)
+        await message.answer(f"✅ Yangi muddat: {deadline}")
+    except Exception as e:
+        logger.error(f"Error in process_new_deadline: {e}")
+        await message.answer("Xatolik.")
+    finally:
+        await state.clear()
+
+@router.message(Command("reconcile"))
+async def cmd_reconcile(message: Message):
+    if not await is_admin(message): return
+    try:
+        mismatches = await tallies.reconcile()
+        if not mismatches:
+            await message.answer("✅ Ovozlar hisobi bazadagi ovozlar bilan mos.")
+            return
+
+        for survey_id in {m[0] for m in mismatches}:
+            results.forget(survey_id)
+            live_updater.schedule(survey_id)
+
+        text = f"⚠️ {len(mismatches)} ta nomuvofiqlik topildi va tuzatildi:\n\n"
+        for survey_id, candidate_id, count, expected in mismatches[:50]:
+            text += f"So'rovnoma {survey_id}, nomzod {candidate_id}: {count} → {expected}\n"
+        await message.answer(text)
+    except Exception as e:
+        logger.error(f"Error in cmd_reconcile: {e}")
+        await message.answer("Xatolik.")
+
+@router.message(Command("verify_votes"))
+async def cmd_verify_votes(message: Message, storage: Storage):
+    if not await is_admin(message): return
+    try:
+        diffs = await storage.verify_vote_aggregates()
+        if not diffs:
+            await message.answer("✅ Ovozlar jurnali va jamlanmalar mos.")
+            return
+
+        text = f"⚠️ {len(diffs)} ta nomuvofiqlik (joriy → jurnaldan qayta hisoblangan):\n\n"
+        for d in diffs[:50]:
+            if d['hour'] is None:
+                where = "jami"
+            else:
+                where = datetime.datetime.fromtimestamp(d['hour'] * 3600, TZ).strftime("%Y-%m-%d %H:00")
+            text += f"So'rovnoma {d['survey_id']}, nomzod {d['candidate_id']}, {where}: {d['live']} → {d['rebuilt']}\n"
+        for part in split_text(text):
+            await message.answer(part)
+    except Exception as e:
+        logger.error(f"Error in cmd_verify_votes: {e}")
+        await message.answer("Xatolik.")
+
+async def send_stats(message: Message, storage: Storage, survey_id: int):
+    survey = await storage.get_survey_details(survey_id)
+    if not survey:
+        await message.answer("So'rovnoma topilmadi.")
+        return
+    tally = await tallies.get(survey_id)
+    registered = len(user_index) if user_index.loaded else None
+    text = format_stats(survey, tally, velocity.windows(survey_id), velocity.hourly(survey_id), registered)
+    for part in split_text(text):
+        await message.answer(part)
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, command: CommandObject, storage: Storage):
+    if not await is_admin(message): return
+    try:
+        if command.args and command.args.strip().isdigit():
+            await send_stats(message, storage, int(command.args))
+            return
+
+        surveys = await storage.get_active_surveys()
+        if not surveys:
+            await message.answer("Faol so'rovnomalar yo'q.")
+            return
+        markup = survey_list_markup(surveys, "stats_")
+        await message.answer("📈 Qaysi so'rovnoma statistikasini ko'rmoqchisiz?", reply_markup=markup)
+    except Exception as e:
+        logger.error(f"Error in cmd_stats: {e}")
+        await message.answer("Xatolik.")
+
+@router.callback_query(F.data.startswith("stats_"))
+async def process_stats(callback: CallbackQuery, storage: Storage):
+    # Callback data comes from the client, so the button alone proves nothing
+    if not await is_admin(callback):
+        await callback.answer()
+        return
+    try:
+        await callback.answer()
+        await send_stats(callback.message, storage, int(callback.data.split("_")[1]))
+    except Exception as e:
+        logger.error(f"Error in process_stats: {e}")
+        await callback.message.answer("Xatolik.")
+
+@router.message(Command("slow_traces"))
+async def cmd_slow_traces(message: Message):
+    if not await is_admin(message): return
+    traces = list(tracer.recent)[-10:]
+    if not traces:
+        await message.answer(f"Sekin so'rovlar yo'q (chegara: {tracer.slow * 1000:.0f} ms).")
+        return
+
+    text = f"🐢 Oxirgi {len(traces)} ta sekin so'rov (chegara: {tracer.slow * 1000:.0f} ms):\n\n"
+    text += "\n\n".join(trace.format() for trace in reversed(traces))
+    for part in split_text(text):
+        await message.answer(part)
+
+@router.message(Command("cache_stats"))
+async def cmd_cache_stats(message: Message, storage: Storage):
+    if not await is_admin(message): return
+    if not isinstance(storage, CachedStorage):
+        await message.answer("Kesh o'chirilgan (METADATA_CACHE=0).")
+        return
+
+    text = "📊 Kesh statistikasi (kalit: hit / miss / invalidatsiya)\n\n"
+    for key, stats in sorted(storage.stats().items(), key=lambda item: str(item[0])):
+        name = ":".join(str(part) for part in key)
+        text += f"{name}: {stats['hits']} / {stats['misses']} / {stats['invalidations']}\n"
+    await message.answer(text[:4096])
+
 @router.message(Command("post_results"))
-async def cmd_post_results(message: Message):
+async def cmd_post_results(message: Message, storage: Storage):
     if not await is_admin(message): return
     try:
-        surveys = [s for s in await get_active_surveys() if s['is_closed']]
+        surveys = [s for s in await storage.get_active_surveys() if s['is_closed']]
         if not surveys:
             await message.answer("Natijasini chiqarish uchun yakunlangan so'rovnomalar yo'q.")
             return
 
-        keyboard = []
-        for s in surveys:
-            keyboard.append([InlineKeyboardButton(text=f"📈 {s['title']}", callback_data=f"res_select_{s['id']}")])
-        
-        markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        markup = survey_list_markup(surveys, "res_select_", "📈")
         await message.answer("📊 **Qaysi so'rovnoma natijasini kanal/guruhga chiqarmoqchisiz?**", reply_markup=markup)
     except Exception as e:
         logger.error(f"Error in cmd_post_results: {e}")
         await message.answer("Xatolik.")
 
 @router.callback_query(F.data.startswith("res_select_"))
-async def ask_target_channel_results(callback: CallbackQuery, state: FSMContext):
+async def ask_target_channel_results(callback: CallbackQuery, state: FSMContext, storage: Storage):
     survey_id = int(callback.data.split("_")[2])
-    await state.update_data(post_survey_id=survey_id, is_result_post=True)
-    await callback.message.answer("Natijani qaysi kanal yoki guruhga yubormoqchisiz?\nUsername (@...) yoki ID kiriting.")
+    await state.update_data(post_survey_id=survey_id, is_result_post=True, post_targets={})
     await state.set_state(SurveyPosting.waiting_for_channel)
+    await show_post_targets(callback.message, state, storage)
     await callback.answer()
 
 @router.message(Command("create_survey"))
@@ -327,6 +567,21 @@ async def process_title(message: Message, state: FSMContext):
 @router.message(SurveyCreation.waiting_for_description)
 async def process_description(message: Message, state: FSMContext):
     await state.update_data(description=message.text)
+    await message.answer(DEADLINE_PROMPT + "\nMuddatsiz qoldirish uchun /skip deb yozing.")
+    await state.set_state(SurveyCreation.waiting_for_deadline)
+
+@router.message(SurveyCreation.waiting_for_deadline, Command("skip"))
+async def skip_deadline(message: Message, state: FSMContext):
+    await state.update_data(deadline=None)
+    await message.answer("So'rovnoma uchun rasm yuboring (yoki /skip deb yozing):")
+    await state.set_state(SurveyCreation.waiting_for_image)
+
+@router.message(SurveyCreation.waiting_for_deadline)
+async def process_deadline(message: Message, state: FSMContext):
+    when = await read_deadline(message)
+    if when is None:
+        return
+    await state.update_data(deadline=format_deadline(when))
     await message.answer("So'rovnoma uchun rasm yuboring (yoki /skip deb yozing):")
     await state.set_state(SurveyCreation.waiting_for_image)
 
@@ -344,7 +599,7 @@ async def skip_image(message: Message, state: FSMContext):
     await state.set_state(SurveyCreation.waiting_for_candidates)
 
 @router.message(SurveyCreation.waiting_for_candidates, Command("done"))
-async def finish_candidates(message: Message, state: FSMContext):
+async def finish_candidates(message: Message, state: FSMContext, storage: Storage):
     try:
         data = await state.get_data()
         candidates = data.get("candidates", [])
@@ -352,11 +607,17 @@ async def finish_candidates(message: Message, state: FSMContext):
             await message.answer("Kamida bitta nomzod kiritish kerak! Davom eting.")
             return
 
-        survey_id = await create_survey(data['title'], data['description'], data['image_file_id'])
+        deadline = data.get('deadline')
+        survey_id = await storage.create_survey(data['title'], data['description'], data['image_file_id'], deadline)
         for c in candidates:
-            await add_candidate(survey_id, c)
+            candidate_id = await storage.add_candidate(survey_id, c)
+            tallies.add_candidate(survey_id, candidate_id, c)
+        deadline_scheduler.schedule(survey_id, deadline)
         
-        await message.answer(f"So'rovnoma yaratildi!\nID: {survey_id}\nNomzodlar soni: {len(candidates)}")
+        text = f"So'rovnoma yaratildi!\nID: {survey_id}\nNomzodlar soni: {len(candidates)}"
+        if deadline:
+            text += f"\nTugash muddati: {deadline}"
+        await message.answer(text)
     except Exception as e:
         logger.error(f"Error in finish_candidates: {e}")
         await message.answer("Yaratishda xatolik yuz berdi.")
@@ -374,31 +635,27 @@ async def process_candidate(message: Message, state: FSMContext):
 # --- Survey Channel Linking ---
 
 @router.message(Command("survey_channels"))
-async def cmd_survey_channels(message: Message):
+async def cmd_survey_channels(message: Message, storage: Storage):
     if not await is_admin(message): return
     try:
-        surveys = await get_active_surveys()
+        surveys = await storage.get_active_surveys()
         if not surveys:
             await message.answer("Sozlash uchun faol so'rovnomalar yo'q.")
             return
 
-        keyboard = []
-        for s in surveys:
-            keyboard.append([InlineKeyboardButton(text=f"⚙️ {s['title']}", callback_data=f"sc_list_{s['id']}")])
-        
-        markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        markup = survey_list_markup(surveys, "sc_list_", "⚙️")
         await message.answer("🔗 **Qaysi so'rovnoma uchun kanal/guruhlarni sozlamoqchisiz?**", reply_markup=markup)
     except Exception as e:
         logger.error(f"Error in cmd_survey_channels: {e}")
         await message.answer("Xatolik.")
 
 @router.callback_query(F.data.startswith("sc_list_"))
-async def show_survey_channels_handler(callback: CallbackQuery):
+async def show_survey_channels_handler(callback: CallbackQuery, storage: Storage):
     try:
         survey_id = int(callback.data.split("_")[2])
-        survey = await get_survey_details(survey_id)
-        all_channels = await get_all_channels()
-        linked_ids = await get_survey_linked_channel_ids(survey_id)
+        survey = await storage.get_survey_details(survey_id)
+        all_channels = await storage.get_all_channels()
+        linked_ids = await storage.get_survey_linked_channel_ids(survey_id)
                 
         if not all_channels:
             await callback.answer("Hozircha hech qanday kanal qo'shilmagan (/channels).", show_alert=True)
@@ -423,76 +680,70 @@ async def show_survey_channels_handler(callback: CallbackQuery):
         await callback.answer("Yuklashda xatolik.", show_alert=True)
 
 @router.callback_query(F.data == "back_to_sc_surveys")
-async def back_to_surveys_list(callback: CallbackQuery):
+async def back_to_surveys_list(callback: CallbackQuery, storage: Storage):
     try:
-        surveys = await get_active_surveys()
-        keyboard = []
-        for s in surveys:
-            keyboard.append([InlineKeyboardButton(text=f"⚙️ {s['title']}", callback_data=f"sc_list_{s['id']}")])
-        markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        surveys = await storage.get_active_surveys()
+        markup = survey_list_markup(surveys, "sc_list_", "⚙️")
         await callback.message.edit_text("🔗 **Qaysi so'rovnoma uchun kanallarni sozlamoqchisiz?**", reply_markup=markup)
     except Exception:
         pass
 
 @router.callback_query(F.data.startswith("sc_toggle_"))
-async def toggle_survey_channel_handler(callback: CallbackQuery):
+async def toggle_survey_channel_handler(callback: CallbackQuery, storage: Storage):
     try:
         _, _, survey_id, channel_id = callback.data.split("_")
-        action = await toggle_survey_channel(int(survey_id), int(channel_id))
+        action = await storage.toggle_survey_channel(int(survey_id), int(channel_id))
         await callback.answer(f"Kanal {action}!")
-        await show_survey_channels_handler(callback)
+        await show_survey_channels_handler(callback, storage)
     except Exception as e:
         logger.error(f"Error in toggle_survey_channel: {e}")
         await callback.answer("O'zgartirishda xatolik.", show_alert=True)
 
 @router.message(Command("phone_numbers"))
-async def cmd_phone_numbers(message: Message, state: FSMContext):
+async def cmd_phone_numbers(message: Message, state: FSMContext, storage: Storage):
     if not await is_admin(message): return
     try:
-        surveys = await get_active_surveys()
+        surveys = await storage.get_active_surveys()
         if not surveys:
             await message.answer("Ro'yxatni olish uchun faol so'rovnomalar yo'q.")
             return
 
-        keyboard = []
-        for s in surveys:
-            keyboard.append([InlineKeyboardButton(text=f"📊 {s['title']}", callback_data=f"exp_phone_{s['id']}")])
-        
-        markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        markup = survey_list_markup(surveys, "exp_phone_", "📊")
         await message.answer("Qaysi so'rovnoma qatnashchilarini ro'yxatini olmoqchisiz?", reply_markup=markup)
     except Exception as e:
         logger.error(f"Error in cmd_phone_numbers: {e}")
         await message.answer("Xatolik.")
 
 @router.callback_query(F.data.startswith("exp_phone_"))
-async def process_survey_phone_numbers(callback: CallbackQuery):
-    file_path = None
+async def ask_export_format(callback: CallbackQuery):
+    survey_id = int(callback.data.split("_")[2])
+    keyboard = [
+        [InlineKeyboardButton(text=f"📄 {fmt.upper()}", callback_data=f"exp_fmt_{survey_id}_{fmt}")]
+        for fmt in available_formats()
+    ]
+    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+    await callback.message.answer("Fayl formatini tanlang:", reply_markup=markup)
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("exp_fmt_"))
+async def process_survey_phone_numbers(callback: CallbackQuery, storage: Storage):
     try:
-        survey_id = int(callback.data.split("_")[2])
-        survey = await get_survey_details(survey_id)
-        rows = await get_survey_participants_report(survey_id)
+        _, _, survey_id, fmt = callback.data.split("_")
+        survey_id = int(survey_id)
+        survey = await storage.get_survey_details(survey_id)
+        survey_title = survey['title'] if survey else "Noma'lum"
+
+        await callback.answer("Fayl tayyorlanmoqda...")
+        document, count = await export_participants(survey_id, fmt)
                 
-        if not rows:
-            await callback.answer("Foydalanuvchilar topilmadi.")
+        if not count:
+            await callback.message.answer("Foydalanuvchilar topilmadi.")
             return
             
-        file_path = f"users_data_{survey_id}.txt"
-        survey_title = survey['title'] if survey else "Noma'lum"
-        
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(f"SO'ROVNOMA: {survey_title}\n" + "-" * 80 + "\n")
-            f.write(f"{'№':<4} | {'Telefon':<15} | {'Ism':<25} | {'Tanlangan nomzod':<30}\n" + "-" * 80 + "\n")
-            for i, r in enumerate(rows, 1):
-                f.write(f"{i:<4} | {r['phone_number']:<15} | {str(r['full_name'])[:25]:<25} | {str(r['candidate_name'] or 'Ovoz bermagan')[:30]:<30}\n")
-                
         await callback.message.answer_document(
-            document=FSInputFile(file_path),
-            caption=f"✅ {survey_title}\nJami ro'yxat: {len(rows)} ta"
+            document=document,
+            caption=f"✅ {survey_title}\nJami ro'yxat: {count} ta"
         )
-        await callback.answer()
     except Exception as e:
         logger.error(f"Error in process_survey_phone_numbers: {e}")
         await callback.message.answer("Xabar tayyorlashda xatolik yuz berdi.")
-    finally:
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
@@ -1,34 +1,137 @@
 import asyncio
 import logging
+import secrets
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from config import BOT_TOKEN
-from database import create_tables
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from config import (
+    BOT_TOKEN, BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    WEBAPP_HOST, WEBAPP_PORT, METRICS_HOST, METRICS_PORT
+)
 from handlers import user, admin
+from middlewares.metrics import setup_bot_metrics, setup_metrics
+from middlewares.throttling import ThrottlingMiddleware
+from middlewares.tracing import setup_bot_tracing, setup_tracing
+from services import metrics
+from services.deadlines import deadline_scheduler
+from services.live_updates import live_updater
+from services.logs import setup_logging
+from services.render_cache import render_cache
+from services.subscriptions import subscription_cache
+from services.tally import tallies
+from services.user_index import user_index
+from services.velocity import velocity
+from services.vote_writer import vote_writer
+from storage import create_storage, set_storage
+from storage.base import Storage
+from storage.cached import CachedStorage
 
-async def main():
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler("bot.log", encoding="utf-8")
-        ]
-    )
-    logger = logging.getLogger(__name__)
-    logger.info("Bot starting...")
-    
-    # Initialize DB
-    await create_tables()
-    
-    bot = Bot(token=BOT_TOKEN)
+logger = logging.getLogger(__name__)
+
+def build_dispatcher(storage: Storage, with_metrics: bool = True):
     dp = Dispatcher()
-    
-    # Register routers (we'll implement these next)
+    # Handlers receive the backend as their `storage` argument
+    dp["storage"] = storage
+    if with_metrics:
+        setup_metrics(dp)
+    setup_tracing(dp)
+    dp.callback_query.outer_middleware(ThrottlingMiddleware())
+
+    # Register routers
     dp.include_router(user.router)
     dp.include_router(admin.router)
+    return dp
+
+def build_bot(token: str = BOT_TOKEN, session=None):
+    # Benchmarks and tests pass a fake session and still get the production request middlewares
+    bot = Bot(token=token, session=session)
+    setup_bot_metrics(bot)
+    setup_bot_tracing(bot)
+    return bot
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, secret_token: str):
+    app = web.Application()
+    # handle_in_background: answer Telegram with 200 at once, process the update as a task
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret_token,
+        handle_in_background=True,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    # Telegram echoes this back in X-Telegram-Bot-Api-Secret-Token on every request
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+    async def on_startup(bot: Bot):
+        await bot.set_webhook(
+            url=f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=secret_token,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook set to {WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+    async def on_shutdown(bot: Bot):
+        await bot.delete_webhook()
+        logger.info("Webhook removed")
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    runner = web.AppRunner(build_webhook_app(dp, bot, secret_token))
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host=WEBAPP_HOST, port=WEBAPP_PORT).start()
+        logger.info(f"Serving webhook on {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+async def main():
+    # Configure logging: file and console writes happen on the listener thread
+    log_listener = setup_logging()
+    logging.getLogger().addHandler(metrics.ErrorLogCounter())
+    logger.info("Bot starting...")
+
+    # Initialize storage
+    storage = create_storage()
+    set_storage(storage)
+    await storage.open()
+    metrics_runner = None
+    try:
+        await tallies.load()
+        await tallies.reconcile()
+        await user_index.load()
+        await live_updater.load()
+        await velocity.load()
+        if isinstance(storage, CachedStorage):
+            await storage.warm()
+            metrics.register_cache("metadata", storage.summary)
+        metrics.register_cache("subscriptions", subscription_cache.stats)
+        metrics.register_cache("render", render_cache.stats)
+        if METRICS_PORT:
+            metrics_runner = await metrics.start_metrics_server(METRICS_HOST, METRICS_PORT)
+        await vote_writer.start()
+
+        bot = build_bot()
+        dp = build_dispatcher(storage)
+        await deadline_scheduler.start(bot)
+        await live_updater.start(bot)
 
-    await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await deadline_scheduler.stop()
+        await live_updater.stop()
+        await vote_writer.stop()
+        await storage.close()
+        log_listener.stop()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,39 @@
+import time
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from services.metrics import api_errors, api_seconds, handler_errors, handler_seconds
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware: runs only once a handler matched, so data["handler"] is set."""
+
+    async def __call__(self, handler, event, data):
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, name)
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            api_seconds.observe(time.perf_counter() - started, name)
+
+def setup_metrics(dp):
+    middleware = HandlerMetricsMiddleware()
+    # Inner middlewares on the dispatcher also wrap the handlers of included routers
+    dp.message.middleware(middleware)
+    dp.callback_query.middleware(middleware)
+
+def setup_bot_metrics(bot):
+    bot.session.middleware(RequestMetricsMiddleware())
@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from aiogram import BaseMiddleware
+from config import ADMIN_ID, THROTTLE_RATE, THROTTLE_BURST, THROTTLE_DEDUPE_WINDOW, THROTTLE_MAX_USERS
+from services import metrics
+from services.rate_limit import TokenBucket
+
+class UserState:
+    __slots__ = ("bucket", "last_data", "last_at")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.last_data = None
+        self.last_at = now
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Outer callback_query middleware: per-user token bucket plus duplicate-tap suppression.
+
+    Rejected taps are answered right here, so they never reach filters,
+    handlers, the database or further Bot API calls.
+    """
+
+    def __init__(self, rate: float = THROTTLE_RATE, burst: float = THROTTLE_BURST,
+                 dedupe_window: float = THROTTLE_DEDUPE_WINDOW, max_users: int = THROTTLE_MAX_USERS):
+        self.rate = rate
+        self.burst = burst
+        self.dedupe_window = dedupe_window
+        self.max_users = max_users
+        # Past this a user's bucket is full again and the dedupe window is over
+        self.ttl = max(dedupe_window, burst / rate)
+        self._users = OrderedDict()  # user_id -> UserState, least recently seen first
+
+    def _expire(self, now):
+        users = self._users
+        while users:
+            user_id, state = next(iter(users.items()))
+            if len(users) <= self.max_users and now - state.last_at < self.ttl:
+                break
+            del users[user_id]
+
+    def _state(self, user_id, now):
+        # Expire first: the current user's entry must survive until the tap is recorded on it
+        self._expire(now)
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = UserState(self.rate, self.burst, now)
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return state
+
+    async def __call__(self, handler, event, data):
+        user_id = event.from_user.id
+        if user_id == ADMIN_ID:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        state = self._state(user_id, now)
+        duplicate = state.last_data is not None and event.data == state.last_data and now - state.last_at < self.dedupe_window
+        state.last_at = now
+
+        if duplicate:
+            metrics.throttled.inc("duplicate")
+            await event.answer()
+            return None
+        if not state.bucket.try_acquire():
+            metrics.throttled.inc("rate")
+            await event.answer("Juda tez bosyapsiz, biroz kuting.")
+            return None
+
+        state.last_data = event.data
+        return await handler(event, data)
+
+    def __len__(self):
+        return len(self._users)
@@ -0,0 +1,50 @@
+import time
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from services.tracing import current_trace, record, tracer
+
+def _describe(update):
+    event_type = update.event_type
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if event_type == "message":
+        detail = event.text or (event.contact and "<contact>") or ""
+    elif event_type == "callback_query":
+        detail = event.data or ""
+    else:
+        detail = ""
+    return event_type, user.id if user else None, detail[:64]
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer update middleware: one trace per update, spanning every handler call."""
+
+    async def __call__(self, handler, event, data):
+        event_type, user_id, detail = _describe(event)
+        trace, token = tracer.begin(event.update_id, event_type, user_id, detail)
+        try:
+            return await handler(event, data)
+        finally:
+            tracer.finish(trace, token)
+
+class HandlerNameMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        trace = current_trace()
+        if trace is not None:
+            trace.handler = data["handler"].callback.__name__
+        return await handler(event, data)
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            record("api", method.__api_method__, started, time.perf_counter() - started)
+
+def setup_tracing(dp):
+    dp.update.outer_middleware(TracingMiddleware())
+    dp.message.middleware(HandlerNameMiddleware())
+    dp.callback_query.middleware(HandlerNameMiddleware())
+
+def setup_bot_tracing(bot):
+    bot.session.middleware(TracingRequestMiddleware())
@@ -0,0 +1,178 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Schema migrations, tracked with PRAGMA user_version. Each one runs once, in
+# its own transaction; append new ones to MIGRATIONS and never edit old ones.
+
+async def _base_schema(db):
+    # Everything create_tables used to (re)create on every start. IF NOT EXISTS
+    # keeps this safe on databases that predate versioning.
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS surveys (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            description TEXT,
+            image_file_id TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            is_closed BOOLEAN DEFAULT 0,
+            deadline TEXT
+        )
+    """)
+    
+    # Databases created before is_closed existed
+    async with db.execute("PRAGMA table_info(surveys)") as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    if "is_closed" not in columns:
+        await db.execute("ALTER TABLE surveys ADD COLUMN is_closed BOOLEAN DEFAULT 0")
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS candidates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            survey_id INTEGER,
+            full_name TEXT,
+            votes_count INTEGER DEFAULT 0,
+            FOREIGN KEY(survey_id) REFERENCES surveys(id)
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS votes (
+            user_id INTEGER,
+            survey_id INTEGER,
+            candidate_id INTEGER,
+            PRIMARY KEY (user_id, survey_id),
+            FOREIGN KEY(survey_id) REFERENCES surveys(id),
+            FOREIGN KEY(candidate_id) REFERENCES candidates(id)
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS channels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id TEXT NOT NULL,
+            name TEXT,
+            url TEXT
+        )
+    """)
+    
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS survey_channels (
+            survey_id INTEGER,
+            channel_id INTEGER,
+            PRIMARY KEY (survey_id, channel_id),
+            FOREIGN KEY(survey_id) REFERENCES surveys(id),
+            FOREIGN KEY(channel_id) REFERENCES channels(id)
+        )
+    """)
+    
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS posted_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            survey_id INTEGER,
+            chat_id INTEGER,
+            message_id INTEGER,
+            kind TEXT,
+            posted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(survey_id) REFERENCES surveys(id)
+        )
+    """)
+    
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            phone_number TEXT,
+            username TEXT,
+            full_name TEXT,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+async def _hot_path_indexes(db):
+    # survey_channels(survey_id) and votes(user_id, survey_id) are already
+    # covered by their primary keys.
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS idx_candidates_survey ON candidates(survey_id, votes_count DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_votes_survey_candidate ON votes(survey_id, candidate_id)",
+        "CREATE INDEX IF NOT EXISTS idx_channels_channel_id ON channels(channel_id)",
+        "CREATE INDEX IF NOT EXISTS idx_surveys_active ON surveys(is_active)",
+        "CREATE INDEX IF NOT EXISTS idx_posted_messages_survey ON posted_messages(survey_id)",
+        "CREATE INDEX IF NOT EXISTS idx_posted_messages_message ON posted_messages(chat_id, message_id)",
+    ):
+        await db.execute(statement)
+
+async def _vote_events(db):
+    # Append-only log of accepted votes; votes keeps the one-vote-per-survey
+    # constraint. candidates.votes_count stays the per-candidate aggregate and
+    # vote_hourly is the per-hour one; both are updated in the vote transaction.
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS vote_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            survey_id INTEGER NOT NULL,
+            candidate_id INTEGER NOT NULL,
+            chat_id INTEGER,
+            created_at INTEGER
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS vote_hourly (
+            survey_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            candidate_id INTEGER NOT NULL,
+            votes INTEGER NOT NULL,
+            PRIMARY KEY (survey_id, hour, candidate_id)
+        ) WITHOUT ROWID
+    """)
+    for action in ("UPDATE", "DELETE"):
+        await db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS vote_events_no_{action.lower()} BEFORE {action} ON vote_events
+            BEGIN SELECT RAISE(ABORT, 'vote_events is append-only'); END
+        """)
+    # Votes cast before the log existed: no time or chat is known for them
+    await db.execute("""
+        INSERT INTO vote_events (user_id, survey_id, candidate_id)
+        SELECT user_id, survey_id, candidate_id FROM votes
+    """)
+
+async def _drop_placeholder_deadlines(db):
+    # create_survey used to store "2026-12-31" for every survey; no admin chose
+    # it, and the deadline scheduler would close them all on that day. Deadlines
+    # set since are stored with a time ("%Y-%m-%d %H:%M"), so they never match.
+    await db.execute("UPDATE surveys SET deadline = NULL WHERE deadline = '2026-12-31'")
+
+async def _partial_active_index(db):
+    # An index on the boolean is_active alone splits the table in two and the
+    # planner rarely picks it. Deleted surveys stay in the table with
+    # is_active = 0, so index only the live ones: the active-survey queries
+    # then read just those rows instead of the whole table.
+    await db.execute("DROP INDEX IF EXISTS idx_surveys_active")
+    await db.execute("CREATE INDEX idx_surveys_active ON surveys(id) WHERE is_active = 1")
+
+MIGRATIONS = [
+    (1, "base schema", _base_schema),
+    (2, "hot-path indexes", _hot_path_indexes),
+    (3, "vote event log and hourly aggregates", _vote_events),
+    (4, "drop placeholder survey deadlines", _drop_placeholder_deadlines),
+    (5, "partial index on active surveys", _partial_active_index),
+]
+
+async def get_schema_version(db):
+    async with db.execute("PRAGMA user_version") as cursor:
+        return (await cursor.fetchone())[0]
+
+async def apply_migrations(db):
+    current = await get_schema_version(db)
+    for version, name, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        await db.execute("BEGIN")
+        try:
+            await migrate(db)
+            await db.execute(f"PRAGMA user_version = {version}")
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            logger.error(f"Schema migration {version} ({name}) failed")
+            raise
+        logger.info(f"Applied schema migration {version}: {name}")
+        current = version
+    return current
@@ -0,0 +1,144 @@
+import asyncio
+import contextlib
+import datetime
+import heapq
+import logging
+import time
+from config import ADMIN_ID, DEADLINE_UTC_OFFSET, DEADLINE_POST_RESULTS
+from services.live_updates import live_updater
+from services.posting import start_post_job
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+TZ = datetime.timezone(datetime.timedelta(hours=DEADLINE_UTC_OFFSET))
+STORED_FORMAT = "%Y-%m-%d %H:%M"
+INPUT_FORMATS = ("%Y-%m-%d %H:%M", "%d.%m.%Y %H:%M", "%Y-%m-%d", "%d.%m.%Y")
+
+def parse_deadline(text):
+    """Local time as stored or typed by the admin; a bare date means the end of that day. None if unreadable."""
+    text = (text or "").strip()
+    for fmt in INPUT_FORMATS:
+        try:
+            parsed = datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if "%H" not in fmt:
+            parsed = parsed.replace(hour=23, minute=59)
+        return parsed.replace(tzinfo=TZ)
+    return None
+
+def format_deadline(when: datetime.datetime):
+    return when.astimezone(TZ).strftime(STORED_FORMAT)
+
+class DeadlineScheduler:
+    """Closes surveys when their deadline passes.
+
+    Deadlines sit in a min-heap of (timestamp, survey_id) and the task sleeps
+    until the earliest one, waking early when a deadline is added. Changed or
+    removed deadlines leave stale heap entries behind; they are skipped when
+    they reach the top.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}  # survey_id -> timestamp in force
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.bot = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, survey_id: int, deadline):
+        # deadline: stored text, an aware datetime, or None to cancel
+        when = parse_deadline(deadline) if isinstance(deadline, str) else deadline
+        if when is None:
+            self.discard(survey_id)
+            return
+        timestamp = when.timestamp()
+        self._deadlines[survey_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, survey_id))
+        self._wakeup.set()
+
+    def discard(self, survey_id: int):
+        self._deadlines.pop(survey_id, None)
+
+    def next_deadline(self):
+        self._drop_stale()
+        return self._heap[0] if self._heap else None
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._deadlines.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    async def rebuild(self):
+        deadlines = {}
+        for row in await get_storage().get_survey_deadlines():
+            when = parse_deadline(row['deadline'])
+            if when is None:
+                logger.warning(f"Survey {row['id']} has an unreadable deadline {row['deadline']!r}, ignoring it")
+                continue
+            deadlines[row['id']] = when.timestamp()
+        self._deadlines = deadlines
+        self._heap = [(timestamp, survey_id) for survey_id, timestamp in deadlines.items()]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+        logger.info(f"Scheduled {len(deadlines)} survey deadlines")
+
+    async def start(self, bot):
+        self.bot = bot
+        await self.rebuild()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            self._drop_stale()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                # Woken early by schedule()/rebuild(), or on time: either way look at the heap again
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                continue
+
+            _, survey_id = heapq.heappop(self._heap)
+            del self._deadlines[survey_id]
+            try:
+                await self._expire(survey_id)
+            except Exception as e:
+                logger.error(f"Error closing survey {survey_id} at its deadline: {e}")
+
+    async def _expire(self, survey_id: int):
+        storage = get_storage()
+        survey = await storage.get_survey_details(survey_id)
+        if not survey or survey['is_closed']:
+            return
+        await storage.close_survey(survey_id)
+        live_updater.schedule(survey_id)
+        logger.info(f"Survey {survey_id} closed at its deadline")
+        if self.bot is None:
+            return
+
+        targets = []
+        if DEADLINE_POST_RESULTS:
+            targets = [(c['channel_id'], c['name']) for c in await storage.get_linked_channels(survey_id)]
+        if targets:
+            # The job reports its progress to the admin
+            start_post_job(self.bot, ADMIN_ID, survey_id, targets, is_result=True)
+        elif ADMIN_ID:
+            await self.bot.send_message(ADMIN_ID, f"⏰ \"{survey['title']}\" so'rovnomasi muddati tugadi va yakunlandi.")
+
+deadline_scheduler = DeadlineScheduler()
@@ -0,0 +1,103 @@
+import asyncio
+import csv
+import gzip
+import io
+import tempfile
+from aiogram.types import BufferedInputFile, InputFile
+from config import EXPORT_CHUNK_SIZE, EXPORT_SPOOL_SIZE
+from storage import get_storage
+
+try:
+    import openpyxl
+except ImportError:  # XLSX export is optional
+    openpyxl = None
+
+HEADER = ("№", "Telefon", "Ism", "Tanlangan nomzod")
+
+def available_formats():
+    formats = ["csv", "csv.gz"]
+    if openpyxl is not None:
+        formats.append("xlsx")
+    return formats
+
+class SpooledInputFile(InputFile):
+    """Uploads straight from a (possibly disk-backed) spooled file, chunk by chunk."""
+
+    def __init__(self, spool, filename: str, chunk_size: int = 64 * 1024):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.spool = spool
+
+    async def read(self, bot):
+        try:
+            self.spool.seek(0)
+            while chunk := await asyncio.to_thread(self.spool.read, self.chunk_size):
+                yield chunk
+        finally:
+            self.spool.close()
+
+class _CsvWriter:
+    def __init__(self, spool, compress: bool):
+        self._gzip = gzip.GzipFile(fileobj=spool, mode="wb") if compress else None
+        # utf-8-sig so Excel opens Cyrillic/Uzbek names correctly
+        self._text = io.TextIOWrapper(self._gzip or spool, encoding="utf-8-sig", newline="")
+        self._csv = csv.writer(self._text)
+        self._csv.writerow(HEADER)
+
+    def write_rows(self, rows):
+        self._csv.writerows(rows)
+
+    def close(self):
+        self._text.flush()
+        self._text.detach()
+        if self._gzip is not None:
+            self._gzip.close()
+
+class _XlsxWriter:
+    def __init__(self, spool):
+        self._spool = spool
+        self._book = openpyxl.Workbook(write_only=True)
+        self._sheet = self._book.create_sheet(title="Qatnashchilar")
+        self._sheet.append(HEADER)
+
+    def write_rows(self, rows):
+        for row in rows:
+            self._sheet.append(row)
+
+    def close(self):
+        self._book.save(self._spool)
+
+def _write_chunk(writer, rows, start: int):
+    writer.write_rows(
+        (i, r['phone_number'], r['full_name'], r['candidate_name'] or "Ovoz bermagan")
+        for i, r in enumerate(rows, start)
+    )
+
+async def export_participants(survey_id: int, fmt: str = "csv"):
+    """Stream the participants report into a spooled file; returns (input_file, row_count)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    try:
+        if fmt == "xlsx":
+            if openpyxl is None:
+                raise RuntimeError("XLSX export needs openpyxl")
+            writer = await asyncio.to_thread(_XlsxWriter, spool)
+        else:
+            writer = await asyncio.to_thread(_CsvWriter, spool, fmt == "csv.gz")
+
+        count = 0
+        async for rows in get_storage().iter_survey_participants_report(survey_id, EXPORT_CHUNK_SIZE):
+            # Formatting and disk writes happen off the event loop, one chunk at a time
+            await asyncio.to_thread(_write_chunk, writer, rows, count + 1)
+            count += len(rows)
+        await asyncio.to_thread(writer.close)
+    except BaseException:
+        spool.close()
+        raise
+
+    filename = f"users_data_{survey_id}.{fmt}"
+    # Still under max_size means the spool never rolled over to disk
+    if spool.tell() <= EXPORT_SPOOL_SIZE:
+        spool.seek(0)
+        data = spool.read()
+        spool.close()
+        return BufferedInputFile(data, filename=filename), count
+    return SpooledInputFile(spool, filename=filename), count
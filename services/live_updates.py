@@ -0,0 +1,219 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import OrderedDict
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from config import REFRESH_INTERVAL, REFRESH_MAX_TRACKED, REFRESH_EDIT_RATE, REFRESH_CHAT_RATE
+from services.rate_limit import ChatBuckets, TokenBucket
+from services.render_cache import candidates_markup, survey_details
+from services.results import render_results
+from services.tally import tallies
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+class TrackedMessage:
+    __slots__ = ("survey_id", "kind", "rendered", "last_edit", "retry_at")
+
+    def __init__(self, survey_id: int, kind: str):
+        self.survey_id = survey_id
+        self.kind = kind  # "survey" (live-count keyboard) or "results" (text/caption)
+        self.rendered = None  # what the message shows, as far as we know
+        self.last_edit = 0.0
+        self.retry_at = 0.0
+
+class LiveUpdater:
+    """Keeps posted surveys and results in step with the vote tally.
+
+    Votes only mark their survey dirty. Every `interval` seconds each dirty
+    survey is rendered once and the posts showing something else are edited,
+    least recently updated first. Edits are paced by a global budget and a
+    bucket per chat; posts over either wait for a later pass, so a survey
+    posted to 50 channels is updated over several seconds rather than at once.
+
+    Only posts in posted_messages are tracked. The card a voter tapped in a
+    private chat gets one edit via refresh_card() and is then forgotten; cards
+    wait behind the posts for the edit budget. Posts are never evicted; only
+    queued cards are capped at max_tracked.
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL, max_tracked: int = REFRESH_MAX_TRACKED,
+                 edit_rate: float = REFRESH_EDIT_RATE, chat_rate: float = REFRESH_CHAT_RATE):
+        self.interval = interval
+        self.max_tracked = max_tracked
+        self.budget = TokenBucket(edit_rate, max(1.0, edit_rate))
+        self.per_pass = max(1, int(edit_rate * interval))
+        self.chats = ChatBuckets(chat_rate, 1)
+        self._messages = {}  # (chat_id, message_id) -> TrackedMessage, posts from posted_messages
+        self._by_survey = {}  # survey_id -> {(chat_id, message_id), ...}
+        self._cards = OrderedDict()  # (chat_id, message_id) -> TrackedMessage, each edited once
+        self._dirty = set()
+        self._task = None
+        self.bot = None
+        self.edits = 0
+        self.skipped = 0
+        self.deferred = 0
+
+    def track(self, chat_id: int, message_id: int, survey_id: int, kind: str = "survey", rendered=None):
+        key = (chat_id, message_id)
+        entry = self._messages.get(key)
+        if entry is None:
+            entry = self._messages[key] = TrackedMessage(survey_id, kind)
+            self._by_survey.setdefault(survey_id, set()).add(key)
+        if rendered is not None:
+            entry.rendered = rendered
+
+    def untrack(self, chat_id: int, message_id: int):
+        key = (chat_id, message_id)
+        entry = self._messages.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_survey.get(entry.survey_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_survey[entry.survey_id]
+
+    def tracked(self, survey_id: int):
+        return set(self._by_survey.get(survey_id, ()))
+
+    def refresh_card(self, chat_id: int, message_id: int, survey_id: int):
+        """Edit a voter's own survey card once on the next pass, without tracking it."""
+        key = (chat_id, message_id)
+        if key in self._messages:
+            return  # a post: schedule() covers it
+        self._cards[key] = TrackedMessage(survey_id, "survey")
+        self._cards.move_to_end(key)
+        while len(self._cards) > self.max_tracked:
+            self._cards.popitem(last=False)
+
+    def schedule(self, survey_id: int):
+        if survey_id in self._by_survey:
+            self._dirty.add(survey_id)
+
+    async def load(self):
+        """Track the posts recorded in posted_messages for every active survey."""
+        storage = get_storage()
+        for survey in await storage.get_active_surveys():
+            for row in await storage.get_posted_messages(survey['id']):
+                self.track(row['chat_id'], row['message_id'], survey['id'], row['kind'])
+        logger.info(f"Tracking {len(self._messages)} posted messages for live updates")
+
+    async def start(self, bot):
+        self.bot = bot
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Error updating live posts: {e}")
+
+    async def _render(self, survey_id: int, kind: str):
+        # (content, is_photo) for a post of this kind, or None if it can't be edited in place
+        tally = await tallies.get(survey_id)
+        survey = await get_storage().get_survey_details(survey_id)
+        if kind == "survey":
+            if survey and survey['is_closed']:
+                # Voting is over: the vote buttons give way to the results button
+                return survey_details(survey_id, survey)[1], False
+            return candidates_markup(tally), False
+        if not survey:
+            return None
+        rendered = render_results(survey_id, survey, tally)
+        parts = rendered.captioned if survey['image_file_id'] else rendered.messages
+        if len(parts) != 1:
+            return None  # went out as several messages; only the first is tracked
+        return parts[0], bool(survey['image_file_id'])
+
+    async def run_once(self):
+        dirty, self._dirty = self._dirty, set()
+        renders = {}
+        jobs = []
+        for survey_id in dirty:
+            for key in list(self._by_survey.get(survey_id, ())):
+                entry = self._messages.get(key)
+                if entry is None:
+                    continue  # untracked while rendering
+                if (survey_id, entry.kind) not in renders:
+                    renders[survey_id, entry.kind] = await self._render(survey_id, entry.kind)
+                render = renders[survey_id, entry.kind]
+                if render is None or render[0] == entry.rendered:
+                    self.skipped += 1
+                    continue
+                jobs.append((key, entry, render))
+        jobs.sort(key=lambda job: job[1].last_edit)
+
+        # Voters' cards go after the posts, so they never starve them of budget
+        for key, entry in list(self._cards.items()):
+            if (entry.survey_id, "survey") not in renders:
+                renders[entry.survey_id, "survey"] = await self._render(entry.survey_id, "survey")
+            jobs.append((key, entry, renders[entry.survey_id, "survey"]))
+
+        now = time.monotonic()
+        tasks = []
+        for key, entry, (content, is_photo) in jobs:
+            if len(tasks) >= self.per_pass or entry.retry_at > now or not self.chats.get(key[0]).try_acquire():
+                if key in self._messages:
+                    self._dirty.add(entry.survey_id)
+                self.deferred += 1
+                continue
+            self._cards.pop(key, None)
+            await self.budget.acquire()
+            tasks.append(asyncio.create_task(self._edit(key, entry, content, is_photo)))
+        await asyncio.gather(*tasks)
+
+    def _retry(self, key, entry):
+        if key in self._messages:
+            self._dirty.add(entry.survey_id)
+        else:
+            self._cards.setdefault(key, entry)
+
+    async def _edit(self, key, entry, content, is_photo: bool):
+        chat_id, message_id = key
+        try:
+            if entry.kind == "survey":
+                await self.bot.edit_message_reply_markup(chat_id=chat_id, message_id=message_id, reply_markup=content)
+            elif is_photo:
+                await self.bot.edit_message_caption(chat_id=chat_id, message_id=message_id, caption=content, parse_mode="HTML")
+            else:
+                await self.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=content, parse_mode="HTML")
+        except TelegramRetryAfter as e:
+            logger.warning(f"Flood control on {chat_id}/{message_id}, retrying in {e.retry_after}s")
+            entry.retry_at = time.monotonic() + e.retry_after
+            self._retry(key, entry)
+            return
+        except TelegramBadRequest as e:
+            if "not modified" in e.message:
+                entry.rendered = content
+                return
+            if key not in self._messages:
+                return  # a voter's card, not kept anyway
+            logger.warning(f"Dropping live post {chat_id}/{message_id}: {e.message}")
+            self.untrack(chat_id, message_id)
+            try:
+                await get_storage().delete_posted_message(chat_id, message_id)
+            except Exception as e:
+                logger.error(f"Error forgetting posted message {chat_id}/{message_id}: {e}")
+            return
+        except Exception as e:
+            logger.error(f"Error updating live post {chat_id}/{message_id}: {e}")
+            self._retry(key, entry)
+            return
+
+        entry.rendered = content
+        entry.last_edit = time.monotonic()
+        self.edits += 1
+
+live_updater = LiveUpdater()
@@ -0,0 +1,140 @@
+import copy
+import datetime
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from config import (
+    LOG_FILE, LOG_FORMAT, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_WHEN, LOG_QUEUE_SIZE,
+    LOG_REPEAT_WINDOW, LOG_REPEAT_BURST
+)
+from services.metrics import log_dropped
+from services.tracing import current_trace
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_digits = re.compile(r"\d+")
+_exc_formatter = logging.Formatter()
+
+class UpdateContextFilter(logging.Filter):
+    """Stamps records with the update being handled (runs on the event loop, where the trace is visible)."""
+
+    def filter(self, record):
+        trace = current_trace()
+        record.update_id = trace.update_id if trace else None
+        record.user_id = trace.user_id if trace else None
+        record.handler = trace.handler if trace else None
+        return True
+
+class RepeatFilter(logging.Filter):
+    """Lets `burst` identical WARNING+ records through per `window` seconds and drops the rest.
+
+    Numbers are ignored when comparing, so "Sleep for 1.3 seconds (tryings = 4)"
+    style retry lines count as one message. The next record let through after
+    a dropped run says how many were dropped.
+    """
+
+    def __init__(self, window: float = LOG_REPEAT_WINDOW, burst: int = LOG_REPEAT_BURST, max_keys: int = 1000):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.max_keys = max_keys
+        self._seen = {}  # key -> [window_started, count, dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.name, record.levelno, _digits.sub("#", record.getMessage()))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                dropped = entry[2] if entry else 0
+                if entry is None and len(self._seen) >= self.max_keys:
+                    self._prune(now)
+                self._seen[key] = [now, 1, 0]
+                if dropped:
+                    record.msg = f"{record.getMessage()} ({dropped} identical messages dropped in the last {self.window:.0f}s)"
+                    record.args = None
+                return True
+            entry[1] += 1
+            if entry[1] <= self.burst:
+                return True
+            entry[2] += 1
+        log_dropped.inc("repeat")
+        return False
+
+    def _prune(self, now):
+        for key, entry in list(self._seen.items()):
+            if now - entry[0] >= self.window:
+                del self._seen[key]
+        if len(self._seen) >= self.max_keys:
+            self._seen.clear()
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in ("update_id", "user_id", "handler"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class LoopQueueHandler(QueueHandler):
+    """Hands records to the listener thread; never blocks the event loop."""
+
+    def prepare(self, record):
+        # Same process, so no pickling: render the message and traceback now, while
+        # the objects they refer to are still in the state being logged
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_dropped.inc("queue_full")
+
+def _file_handler(path: str):
+    if LOG_ROTATE_WHEN:
+        return TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    return RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+
+def setup_logging(level=logging.INFO, log_file: str = LOG_FILE, fmt: str = LOG_FORMAT):
+    """Route the root logger through a queue to a background thread; returns the started listener."""
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(_file_handler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = LoopQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(UpdateContextFilter())
+    queue_handler.addFilter(RepeatFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,196 @@
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from aiohttp import web
+from services import tracing
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect plus two additions."""
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+class Gauge:
+    """Read at scrape time: `read()` returns {label values tuple: number}."""
+
+    def __init__(self, name: str, help: str, labelnames, read):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.read = read
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        try:
+            values = self.read()
+        except Exception as e:
+            logger.warning(f"Failed to read gauge {self.name}: {e}")
+            return
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, labelnames, read):
+        return self.register(Gauge(name, help, labelnames, read))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+handler_seconds = registry.histogram("bot_handler_seconds", "Time spent in router handlers", ("handler",))
+handler_errors = registry.counter("bot_handler_errors_total", "Exceptions escaping router handlers", ("handler",))
+db_seconds = registry.histogram("bot_db_query_seconds", "Time spent in database.py functions", ("function",))
+db_errors = registry.counter("bot_db_errors_total", "Exceptions raised by database.py functions", ("function",))
+api_seconds = registry.histogram("bot_api_request_seconds", "Bot API request round-trip time", ("method",))
+api_errors = registry.counter("bot_api_errors_total", "Failed Bot API requests", ("method", "error"))
+votes = registry.counter("bot_votes_total", "Votes by outcome", ("result",))
+vote_batch_size = registry.histogram("bot_vote_batch_size", "Votes committed per VoteWriter transaction", (),
+                                     buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+throttled = registry.counter("bot_throttled_callbacks_total", "Callback taps dropped before the handlers", ("reason",))
+log_errors = registry.counter("bot_log_errors_total", "ERROR log records by logger", ("logger",))
+log_dropped = registry.counter("bot_log_dropped_total", "Log records not written: repeated or queue full", ("reason",))
+
+_caches = {}
+
+def register_cache(name: str, stats):
+    # stats: zero-arg callable returning a TTLCache/RenderCache-style stats() dict
+    _caches[name] = stats
+
+def _cache_stat(key):
+    return lambda: {(name,): stats()[key] for name, stats in _caches.items()}
+
+registry.gauge("bot_cache_hits", "Cache hits since start", ("cache",), _cache_stat("hits"))
+registry.gauge("bot_cache_misses", "Cache misses since start", ("cache",), _cache_stat("misses"))
+registry.gauge("bot_cache_hit_ratio", "Cache hit ratio since start", ("cache",), _cache_stat("hit_rate"))
+
+def instrument_query(fn):
+    """Time a database.py coroutine or async generator into db_seconds and the current trace."""
+    name = fn.__name__
+
+    if inspect.isasyncgenfunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                async for item in fn(*args, **kwargs):
+                    yield item
+            except Exception:
+                db_errors.inc(name)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                db_seconds.observe(elapsed, name)
+                tracing.record("db", name, started, elapsed)
+        return wrapper
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            db_errors.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            db_seconds.observe(elapsed, name)
+            tracing.record("db", name, started, elapsed)
+    return wrapper
+
+class ErrorLogCounter(logging.Handler):
+    """Counts ERROR records; handlers log and swallow their exceptions."""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record):
+        log_errors.inc(record.name)
+
+async def start_metrics_server(host: str, port: int):
+    async def handle_metrics(request):
+        return web.Response(text=registry.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"Metrics served on http://{host}:{port}/metrics")
+    return runner
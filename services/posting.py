@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from aiogram.exceptions import TelegramRetryAfter
+from config import POST_GLOBAL_RATE, POST_CHAT_RATE, POST_CHAT_BURST, POST_MAX_RETRIES, POST_PROGRESS_INTERVAL
+from services.live_updates import live_updater
+from services.rate_limit import TelegramRateLimiter
+from services.render_cache import candidates_markup
+from services.results import render_results
+from services.tally import tallies
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+telegram_limiter = TelegramRateLimiter(POST_GLOBAL_RATE, POST_CHAT_RATE, POST_CHAT_BURST)
+
+# Running jobs are referenced here so they aren't garbage collected mid-flight
+_jobs = set()
+
+async def _call(chat_id, request):
+    # request: zero-arg coroutine factory, so a RetryAfter can re-issue the same call
+    for attempt in range(POST_MAX_RETRIES):
+        await telegram_limiter.acquire(chat_id)
+        try:
+            return await request()
+        except TelegramRetryAfter as e:
+            if attempt == POST_MAX_RETRIES - 1:
+                raise
+            logger.warning(f"Flood control in {chat_id}, retrying in {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+
+async def send_survey_post(bot, chat_id, survey_id: int, survey, is_result: bool):
+    tally = await tallies.get(survey_id)
+    photo = survey['image_file_id']
+
+    if is_result:
+        kind = "results"
+        rendered = render_results(survey_id, survey, tally)
+        if photo:
+            first, *rest = rendered.captioned
+            sent = await _call(chat_id, lambda: bot.send_photo(chat_id=chat_id, photo=photo, caption=first, parse_mode="HTML"))
+        else:
+            first, *rest = rendered.messages
+            sent = await _call(chat_id, lambda: bot.send_message(chat_id=chat_id, text=first, parse_mode="HTML"))
+        for part in rest:
+            await _call(chat_id, lambda part=part: bot.send_message(chat_id=chat_id, text=part, parse_mode="HTML"))
+        live_updater.track(sent.chat.id, sent.message_id, survey_id, kind, first)
+    else:
+        kind = "survey"
+        text = f"{survey['description']}"
+        markup = candidates_markup(tally)
+        if photo:
+            sent = await _call(chat_id, lambda: bot.send_photo(chat_id=chat_id, photo=photo, caption=text, reply_markup=markup, parse_mode="HTML"))
+        else:
+            sent = await _call(chat_id, lambda: bot.send_message(chat_id=chat_id, text=text, reply_markup=markup, parse_mode="HTML"))
+        live_updater.track(sent.chat.id, sent.message_id, survey_id, kind, markup)
+
+    await get_storage().add_posted_message(survey_id, sent.chat.id, sent.message_id, kind)
+    return sent
+
+async def run_post_job(bot, admin_chat_id: int, survey_id: int, targets, is_result: bool):
+    """Post a survey (or its results) to every (chat_id, name) target, reporting progress to the admin."""
+    survey = await get_storage().get_survey_details(survey_id)
+    if not survey:
+        await bot.send_message(admin_chat_id, "Xatolik: So'rovnoma topilmadi.")
+        return
+
+    total = len(targets)
+    sent_count = 0
+    failed = []
+    progress = await bot.send_message(admin_chat_id, f"⏳ Yuborilmoqda: 0/{total}")
+
+    async def post_one(chat_id, name):
+        nonlocal sent_count
+        try:
+            await send_survey_post(bot, chat_id, survey_id, survey, is_result)
+            sent_count += 1
+        except Exception as e:
+            logger.error(f"Error posting survey {survey_id} to {chat_id}: {e}")
+            failed.append((name, e))
+
+    async def report_progress():
+        shown = 0
+        while True:
+            await asyncio.sleep(POST_PROGRESS_INTERVAL)
+            done = sent_count + len(failed)
+            if done != shown:
+                shown = done
+                try:
+                    await progress.edit_text(f"⏳ Yuborilmoqda: {done}/{total}\n✅ {sent_count}  ❌ {len(failed)}")
+                except Exception:
+                    pass
+
+    started = time.monotonic()
+    reporter = asyncio.create_task(report_progress())
+    try:
+        # The rate limiter paces the sends; gather just keeps every chat's bucket busy
+        await asyncio.gather(*(post_one(chat_id, name) for chat_id, name in targets))
+    finally:
+        reporter.cancel()
+
+    what = "Natijalar" if is_result else "So'rovnoma"
+    text = f"✅ {what} {sent_count}/{total} ta chatga yuborildi ({time.monotonic() - started:.0f} s)."
+    if failed:
+        text += "\n\n❌ Xatoliklar:\n" + "\n".join(f"• {name}: {e}" for name, e in failed[:30])
+    try:
+        await progress.edit_text(text)
+    except Exception:
+        await bot.send_message(admin_chat_id, text)
+
+def start_post_job(bot, admin_chat_id: int, survey_id: int, targets, is_result: bool):
+    task = asyncio.create_task(run_post_job(bot, admin_chat_id, survey_id, targets, is_result))
+    _jobs.add(task)
+    task.add_done_callback(_job_done)
+    return task
+
+def _job_done(task):
+    _jobs.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Post job failed: {task.exception()}")
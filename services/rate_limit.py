@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1):
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1):
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    @property
+    def idle(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+class ChatBuckets:
+    """A TokenBucket per chat, created on first use."""
+
+    def __init__(self, rate: float, burst: float, max_idle: int = 1000):
+        self.rate = rate
+        self.burst = burst
+        self.max_idle = max_idle
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def get(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) > self.max_idle:
+                # Full buckets carry no state worth keeping
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.idle}
+            bucket = self._buckets[chat_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+class TelegramRateLimiter:
+    """Global send rate plus a separate bucket per chat (Telegram enforces both)."""
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chats = ChatBuckets(chat_rate, chat_burst)
+
+    async def acquire(self, chat_id):
+        await self.chats.get(chat_id).acquire()
+        await self.global_bucket.acquire()
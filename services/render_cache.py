@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from config import RENDER_CACHE_SIZE
+from keyboards.inline import candidates_keyboard
+
+_MISSING = object()
+
+class RenderCache:
+    """Finished texts and markups keyed by what they show, tagged with a version.
+
+    An entry is reused only while its version matches the caller's (tally
+    version, survey state tuple, ...), so counts or state changing simply make
+    the old entry miss and be rebuilt in place.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get_or_render(self, key, version, render):
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING and entry[0] == version:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = render()
+        self._data[key] = (version, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+render_cache = RenderCache(RENDER_CACHE_SIZE)
+
+def _survey_buttons(surveys, prefix, icon):
+    builder = InlineKeyboardBuilder()
+    for s in surveys:
+        status_icon = icon or ("🏁" if s['is_closed'] else "🗳")
+        builder.button(text=f"{status_icon} {s['title']}", callback_data=f"{prefix}{s['id']}")
+    builder.adjust(1)
+    return builder.as_markup()
+
+def survey_list_markup(surveys, prefix: str = "survey_", icon: str = None):
+    # icon=None shows each survey's open/closed status (the user menu)
+    version = tuple((s['id'], s['title'], s['is_closed']) for s in surveys)
+    return render_cache.get_or_render(("surveys", prefix, icon), version, lambda: _survey_buttons(surveys, prefix, icon))
+
+def candidates_markup(tally):
+    return render_cache.get_or_render(
+        ("candidates", tally.survey_id), tally.version,
+        lambda: candidates_keyboard(tally.survey_id, tally.candidates()),
+    )
+
+def _render_details(survey_id, survey):
+    text = f"{survey['description']}"
+    if not survey['is_closed']:
+        return text, None
+    text = f"🏁 <b>SO'ROVNOMA YAKUNLANGAN</b>\n\n{text}\n\nNatijalarni ko'rish uchun quyidagi tugmani bosing."
+    kb_builder = InlineKeyboardBuilder()
+    kb_builder.button(text="📊 Natijalarni ko'rish", callback_data=f"results_{survey_id}")
+    return text, kb_builder.as_markup()
+
+def survey_details(survey_id: int, survey):
+    """(text, markup) for a survey card; markup is None while the survey is open (use candidates_markup)."""
+    version = (survey['description'], survey['is_closed'])
+    return render_cache.get_or_render(("details", survey_id), version, lambda: _render_details(survey_id, survey))
+
+def _render_subscribe(survey_id, channels):
+    text = "❌ <b>Ovoz berish uchun quyidagi kanallar va guruhlarga obuna bo'lishingiz shart:</b>\n\n"
+    kb_builder = InlineKeyboardBuilder()
+    for ch in channels:
+        kb_builder.button(text=f"➕ {ch['name']}", url=ch['url'])
+        text += f"• {ch['name']}\n"
+    kb_builder.button(text="✅ Obuna bo'ldim", callback_data=f"survey_{survey_id}")
+    kb_builder.adjust(1)
+    return text, kb_builder.as_markup()
+
+def subscribe_prompt(survey_id: int, channels):
+    # Keyed by the exact set of missing channels, so users missing the same ones share an entry
+    version = tuple((ch['name'], ch['url']) for ch in channels)
+    key = ("subscribe", survey_id, tuple(ch['channel_id'] for ch in channels))
+    return render_cache.get_or_render(key, version, lambda: _render_subscribe(survey_id, channels))
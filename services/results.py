@@ -0,0 +1,63 @@
+from typing import NamedTuple
+from services.render_cache import render_cache
+
+# Telegram limits (characters) for a photo caption and a text message
+CAPTION_LIMIT = 1024
+MESSAGE_LIMIT = 4096
+
+MEDALS = ["🥇", "🥈", "🥉"]
+
+class RenderedResults(NamedTuple):
+    text: str
+    messages: tuple  # text split into messages
+    captioned: tuple  # first part fits a photo caption, the rest are messages
+
+# Results of a closed survey never change, so they stay here for good
+_closed = {}
+
+def split_text(text: str, first_limit: int = MESSAGE_LIMIT, limit: int = MESSAGE_LIMIT):
+    """Split on line breaks so each part fits; HTML tags never span lines here."""
+    parts = []
+    current = ""
+    for line in text.split("\n"):
+        max_len = first_limit if not parts else limit
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) <= max_len:
+            current = candidate
+            continue
+        if current:
+            parts.append(current)
+            max_len = limit
+        # A single over-long line (absurd candidate name) gets cut hard
+        while len(line) > max_len:
+            parts.append(line[:max_len])
+            line = line[max_len:]
+            max_len = limit
+        current = line
+    if current or not parts:
+        parts.append(current)
+    return tuple(parts)
+
+def _render(title, tally):
+    text = f"🏁 <b>SO'ROVNOMA NATIJALARI</b>\n\n📌 <b>{title}</b>\n\n"
+    total_votes = tally.total
+
+    for i, c in enumerate(tally.candidates()):
+        icon = MEDALS[i] if i < 3 else "▪️"
+        percent = (c.votes_count / total_votes * 100) if total_votes > 0 else 0
+        text += f"{icon} <b>{c.votes_count} ovoz</b> ({percent:.1f}%) — {c.full_name}\n"
+    text += f"\n🗳 Jami ovozlar: {total_votes}"
+    return RenderedResults(text, split_text(text), split_text(text, first_limit=CAPTION_LIMIT))
+
+def render_results(survey_id: int, survey, tally):
+    title = survey['title'] if survey else "Natijalar"
+    if survey and survey['is_closed']:
+        rendered = _closed.get(survey_id)
+        if rendered is None:
+            rendered = _closed[survey_id] = _render(title, tally)
+        return rendered
+    return render_cache.get_or_render(("results", survey_id), tally.version, lambda: _render(title, tally))
+
+def forget(survey_id: int):
+    # For when a closed survey's counts are corrected (/reconcile)
+    _closed.pop(survey_id, None)
@@ -0,0 +1,37 @@
+import asyncio
+import logging
+from config import SUB_CACHE_SIZE, SUB_CACHE_TTL_POSITIVE, SUB_CACHE_TTL_NEGATIVE
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBED_STATUSES = ("creator", "administrator", "member")
+
+# (user_id, channel_id) -> bool
+subscription_cache = TTLCache(maxsize=SUB_CACHE_SIZE, ttl=SUB_CACHE_TTL_POSITIVE)
+
+async def _is_subscribed(bot, user_id: int, channel_id: str):
+    key = (user_id, channel_id)
+    cached = subscription_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        member = await bot.get_chat_member(chat_id=channel_id, user_id=user_id)
+    except Exception as e:
+        # Not cached: a broken channel setup must not lock users out for the TTL
+        logger.warning(f"Could not check subscription for user {user_id} in {channel_id}: {e}")
+        return True
+
+    subscribed = member.status in SUBSCRIBED_STATUSES
+    # Keep negatives short so "✅ Obuna bo'ldim" right after joining goes through
+    ttl = SUB_CACHE_TTL_POSITIVE if subscribed else SUB_CACHE_TTL_NEGATIVE
+    subscription_cache.set(key, subscribed, ttl=ttl)
+    return subscribed
+
+async def get_missing_subscriptions(bot, user_id: int, channels):
+    """Return the channels (rows with channel_id/name/url) the user has not joined."""
+    if not channels:
+        return []
+    results = await asyncio.gather(*(_is_subscribed(bot, user_id, ch['channel_id']) for ch in channels))
+    return [ch for ch, subscribed in zip(channels, results) if not subscribed]
@@ -0,0 +1,139 @@
+import itertools
+import logging
+from typing import NamedTuple
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Versions are unique across all tallies, so a reloaded tally never reuses a
+# version that cached renders were tagged with
+_versions = itertools.count(1)
+
+class CandidateCount(NamedTuple):
+    id: int
+    full_name: str
+    votes_count: int
+
+class SurveyTally:
+    """Vote counts of one survey, kept sorted by votes (desc) then candidate id."""
+
+    def __init__(self, survey_id: int):
+        self.survey_id = survey_id
+        self.counts = {}
+        self.names = {}
+        self.order = []
+        self.total = 0
+        self.version = next(_versions)
+
+    def _key(self, candidate_id):
+        return (-self.counts[candidate_id], candidate_id)
+
+    def add_candidate(self, candidate_id: int, full_name: str, votes_count: int = 0):
+        if candidate_id in self.counts:
+            return
+        self.counts[candidate_id] = votes_count
+        self.names[candidate_id] = full_name
+        self.total += votes_count
+        self.order.append(candidate_id)
+        self._reposition(len(self.order) - 1)
+        self.version = next(_versions)
+
+    def increment(self, candidate_id: int, amount: int = 1):
+        if candidate_id not in self.counts:
+            return False
+        self.counts[candidate_id] += amount
+        self.total += amount
+        # A +1 moves a candidate up by zero or one place in practice
+        self._reposition(self.order.index(candidate_id))
+        self.version = next(_versions)
+        return True
+
+    def _reposition(self, i):
+        order = self.order
+        key = self._key(order[i])
+        while i > 0 and self._key(order[i - 1]) > key:
+            order[i - 1], order[i] = order[i], order[i - 1]
+            i -= 1
+        while i < len(order) - 1 and self._key(order[i + 1]) < key:
+            order[i + 1], order[i] = order[i], order[i + 1]
+            i += 1
+
+    def candidates(self):
+        return [CandidateCount(c_id, self.names[c_id], self.counts[c_id]) for c_id in self.order]
+
+class TallyRegistry:
+    def __init__(self):
+        self._tallies = {}
+
+    def _build(self, rows):
+        tallies = {}
+        for row in rows:
+            tally = tallies.get(row['survey_id'])
+            if tally is None:
+                tally = tallies[row['survey_id']] = SurveyTally(row['survey_id'])
+            tally.add_candidate(row['id'], row['full_name'], row['votes_count'])
+        return tallies
+
+    async def load(self):
+        self._tallies = self._build(await get_storage().get_tally_rows())
+        logger.info(f"Loaded vote tallies for {len(self._tallies)} surveys")
+
+    async def get(self, survey_id: int):
+        tally = self._tallies.get(survey_id)
+        if tally is None:
+            tally = self._build(await get_storage().get_tally_rows(survey_id)).get(survey_id)
+            if tally is None:
+                # No candidates (or no such survey): not kept, so unknown ids can't pile up
+                return SurveyTally(survey_id)
+            self._tallies[survey_id] = tally
+        return tally
+
+    async def candidates(self, survey_id: int):
+        return (await self.get(survey_id)).candidates()
+
+    def add_candidate(self, survey_id: int, candidate_id: int, full_name: str):
+        tally = self._tallies.get(survey_id)
+        if tally is None:
+            tally = self._tallies[survey_id] = SurveyTally(survey_id)
+        tally.add_candidate(candidate_id, full_name)
+
+    def apply_counts(self, counts):
+        # counts: {(survey_id, candidate_id): votes_count} read back inside the
+        # vote transaction; unloaded surveys pick them up when first loaded.
+        # Votes only ever raise a count, so a batch finishing out of order can't
+        # roll a newer value back.
+        for (survey_id, candidate_id), count in counts.items():
+            tally = self._tallies.get(survey_id)
+            if tally is not None and count > tally.counts.get(candidate_id, count):
+                tally.increment(candidate_id, count - tally.counts[candidate_id])
+
+    async def reconcile(self, fix: bool = True):
+        """Compare counts with COUNT(*) over votes, in memory and in candidates.votes_count.
+
+        Votes apply the counts read back from votes_count, so fixing memory
+        alone would not stick: with fix, votes_count is rewritten and the
+        tallies are reloaded from it. Returns the mismatches.
+        """
+        storage = get_storage()
+        actual = {}
+        for row in await storage.get_vote_counts():
+            actual[(row['survey_id'], row['candidate_id'])] = row['votes']
+
+        mismatches = {}
+        for survey_id, tally in self._tallies.items():
+            for candidate_id, count in tally.counts.items():
+                expected = actual.get((survey_id, candidate_id), 0)
+                if count != expected:
+                    mismatches[(survey_id, candidate_id)] = (survey_id, candidate_id, count, expected)
+                    logger.warning(f"Tally mismatch survey={survey_id} candidate={candidate_id}: memory={count} votes={expected}")
+
+        if fix:
+            for row in await storage.repair_vote_counts():
+                key = (row['survey_id'], row['candidate_id'])
+                logger.warning(f"votes_count mismatch survey={key[0]} candidate={key[1]}: stored={row['votes_count']} votes={row['votes']}")
+                mismatches.setdefault(key, (*key, row['votes_count'], row['votes']))
+            if mismatches:
+                await self.load()
+        return list(mismatches.values())
+
+tallies = TallyRegistry()
@@ -0,0 +1,92 @@
+import datetime
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import NamedTuple
+from config import TRACE_SLOW_MS, TRACE_BUFFER_SIZE, TRACE_MAX_SPANS
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("current_trace", default=None)
+
+class Span(NamedTuple):
+    kind: str  # "db", "api", "app"
+    name: str
+    offset: float  # seconds since the update arrived
+    duration: float
+
+class Trace:
+    __slots__ = ("update_id", "event", "user_id", "detail", "handler", "received_at",
+                 "started", "duration", "spans", "dropped", "finished")
+
+    def __init__(self, update_id: int, event: str, user_id, detail: str):
+        self.update_id = update_id
+        self.event = event
+        self.user_id = user_id
+        self.detail = detail
+        self.handler = None
+        self.received_at = datetime.datetime.now()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.dropped = 0
+        self.finished = False
+
+    def add(self, kind: str, name: str, started: float, duration: float):
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append(Span(kind, name, started - self.started, duration))
+
+    def format(self):
+        lines = [
+            f"update {self.update_id} {self.event} user={self.user_id} handler={self.handler or '-'} "
+            f"{self.duration * 1000:.0f}ms at {self.received_at:%H:%M:%S} {self.detail}".rstrip()
+        ]
+        for span in self.spans:
+            lines.append(f"  +{span.offset * 1000:7.1f}ms {span.duration * 1000:7.1f}ms  {span.kind:3} {span.name}")
+        accounted = sum(s.duration for s in self.spans)
+        lines.append(f"  outside spans: {max(0.0, self.duration - accounted) * 1000:.1f}ms")
+        if self.dropped:
+            lines.append(f"  ({self.dropped} more spans not recorded)")
+        return "\n".join(lines)
+
+class Tracer:
+    """Per-update traces; slow ones are logged in full and kept in a ring buffer."""
+
+    def __init__(self, slow_ms: float = TRACE_SLOW_MS, buffer_size: int = TRACE_BUFFER_SIZE):
+        self.slow = slow_ms / 1000
+        self.recent = deque(maxlen=buffer_size)
+
+    def begin(self, update_id: int, event: str, user_id=None, detail: str = ""):
+        trace = Trace(update_id, event, user_id, detail)
+        return trace, _current.set(trace)
+
+    def finish(self, trace: Trace, token):
+        _current.reset(token)
+        trace.duration = time.perf_counter() - trace.started
+        # Tasks spawned during the update inherit the context; their spans come too late
+        trace.finished = True
+        if trace.duration >= self.slow:
+            self.recent.append(trace)
+            logger.warning(f"Slow update:\n{trace.format()}")
+
+tracer = Tracer()
+
+def current_trace():
+    return _current.get()
+
+def record(kind: str, name: str, started: float, duration: float):
+    trace = _current.get()
+    if trace is not None and not trace.finished:
+        trace.add(kind, name, started, duration)
+
+@asynccontextmanager
+async def span(kind: str, name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, name, started, time.perf_counter() - started)
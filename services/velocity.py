@@ -0,0 +1,130 @@
+import logging
+import time
+from array import array
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 3600
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
+
+class RingCounter:
+    """Counts per time slot for the last len(counts) slots of `width` seconds.
+
+    Each slot remembers which period it holds, so a slot left over from an
+    earlier lap of the ring reads as zero and is reset on the next add.
+    """
+
+    __slots__ = ("width", "counts", "stamps")
+
+    def __init__(self, slots: int, width: int):
+        self.width = width
+        self.counts = array('I', [0]) * slots
+        self.stamps = array('q', [-1]) * slots
+
+    def add(self, when: float, amount: int = 1):
+        period = int(when // self.width)
+        i = period % len(self.counts)
+        if self.stamps[i] < period:
+            self.stamps[i] = period
+            self.counts[i] = 0
+        elif self.stamps[i] > period:
+            return  # older than the ring covers
+        self.counts[i] += amount
+
+    def series(self, now: float, span: int = None):
+        """Counts of the last `span` periods, oldest first, the current one last."""
+        size = len(self.counts)
+        current = int(now // self.width)
+        out = []
+        for period in range(current - (span or size) + 1, current + 1):
+            i = period % size
+            out.append(self.counts[i] if self.stamps[i] == period else 0)
+        return out
+
+    def sum(self, now: float, span: int):
+        return sum(self.series(now, span))
+
+class CandidateRate:
+    __slots__ = ("minutes", "hours")
+
+    def __init__(self):
+        self.minutes = RingCounter(60, MINUTE)
+        self.hours = RingCounter(24, HOUR)
+
+    def add(self, when: float, amount: int = 1):
+        self.minutes.add(when, amount)
+        self.hours.add(when, amount)
+
+class VoteVelocity:
+    """Recent votes per candidate, counted in memory as votes are accepted.
+
+    Per candidate a 60-slot ring of minutes (for the 5 min and 1 h windows)
+    and a 24-slot ring of hours (24 h window), about 1 KB each, so reading a
+    survey's stats costs O(candidates) however many votes it has. The 24 h
+    window is whole clock hours, the current one included. At startup the hour
+    rings are seeded from vote_hourly; the minute rings start empty.
+    """
+
+    def __init__(self):
+        self._surveys = {}  # survey_id -> {candidate_id: CandidateRate}
+
+    def _rate(self, survey_id: int, candidate_id: int):
+        candidates = self._surveys.setdefault(survey_id, {})
+        rate = candidates.get(candidate_id)
+        if rate is None:
+            rate = candidates[candidate_id] = CandidateRate()
+        return rate
+
+    def record(self, survey_id: int, candidate_id: int, when: float = None):
+        self._rate(survey_id, candidate_id).add(time.time() if when is None else when)
+
+    def forget(self, survey_id: int):
+        self._surveys.pop(survey_id, None)
+
+    def windows(self, survey_id: int, now: float = None):
+        """{candidate_id: (last 5 min, last hour, last 24 h)} for candidates with recent votes."""
+        now = time.time() if now is None else now
+        return {
+            candidate_id: (rate.minutes.sum(now, 5), rate.minutes.sum(now, 60), rate.hours.sum(now, 24))
+            for candidate_id, rate in self._surveys.get(survey_id, {}).items()
+        }
+
+    def hourly(self, survey_id: int, now: float = None):
+        """Votes per hour over the last 24 hours, all candidates together, oldest first."""
+        now = time.time() if now is None else now
+        totals = [0] * 24
+        for rate in self._surveys.get(survey_id, {}).values():
+            for i, count in enumerate(rate.hours.series(now)):
+                totals[i] += count
+        return totals
+
+    async def load(self):
+        storage = get_storage()
+        since = int(time.time()) - 23 * HOUR
+        for survey in await storage.get_active_surveys():
+            for row in await storage.get_vote_timeline(survey['id'], since):
+                # Only the hour is known, so these don't count towards the minute windows
+                self._rate(survey['id'], row['candidate_id']).hours.add(row['hour'] * HOUR, row['votes'])
+        logger.info(f"Loaded vote velocity for {len(self._surveys)} surveys")
+
+def sparkline(values):
+    top = max(values, default=0)
+    if not top:
+        return SPARK_BLOCKS[0] * len(values)
+    return "".join(SPARK_BLOCKS[(len(SPARK_BLOCKS) - 1) * v // top] for v in values)
+
+def format_stats(survey, tally, windows, hourly, registered: int = None):
+    text = f"📈 {survey['title']} — statistika\n\n"
+    text += f"Ovoz berganlar: {tally.total}"
+    if registered:
+        text += f" ({tally.total / registered:.1%} ro'yxatdan o'tgan {registered} tadan)"
+    text += f"\nOxirgi 24 soat: {sparkline(hourly)} ({sum(hourly)} ta ovoz)\n\n"
+    text += "Nomzod: jami | 5 daq | 1 soat | 24 soat\n"
+    for candidate in tally.candidates():
+        last5, last_hour, last_day = windows.get(candidate.id, (0, 0, 0))
+        text += f"• {candidate.full_name}: {candidate.votes_count} | +{last5} | +{last_hour} | +{last_day}\n"
+    return text
+
+velocity = VoteVelocity()
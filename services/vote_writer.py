@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from config import VOTE_BATCH_WINDOW_MS, VOTE_BATCH_MAX
+from services import metrics, tracing
+from services.tally import tallies
+from services.velocity import velocity
+from storage import get_storage
+from storage.base import Vote, VoteResult
+
+logger = logging.getLogger(__name__)
+
+class VoteWriter:
+    """Collects votes for a few milliseconds and commits them in one transaction.
+
+    Callers await submit() and get back a VoteResult; a failed batch raises.
+    """
+
+    def __init__(self, window_ms: float = VOTE_BATCH_WINDOW_MS, max_batch: int = VOTE_BATCH_MAX, apply_batch=None):
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.apply_batch = apply_batch
+        self._queue = None
+        self._full = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="vote-writer")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        # Sentinel: flush whatever is queued, then exit
+        self._queue.put_nowait(None)
+        await task
+
+    async def submit(self, user_id: int, survey_id: int, candidate_id: int, chat_id: int = None):
+        vote = Vote(user_id, survey_id, candidate_id, chat_id)
+        if self._task is None:
+            results = await self._apply([vote])
+            return results[0]
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((vote, future))
+        if self._queue.qsize() >= self.max_batch:
+            self._full.set()
+        # The commit runs in the writer task, outside the update's trace
+        async with tracing.span("app", "vote_writer.submit"):
+            return await future
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+
+            if self.window > 0 and self._queue.qsize() + 1 < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+
+            stopping = False
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    # Sentinel is always last: stop() detaches the writer before enqueuing it
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _apply(self, votes):
+        apply_batch = self.apply_batch or get_storage().register_votes
+        batch = await apply_batch(votes)
+        tallies.apply_counts(batch.counts)
+        metrics.vote_batch_size.observe(len(votes))
+        for vote, result in zip(votes, batch.results):
+            metrics.votes.inc(result.value)
+            if result is VoteResult.ACCEPTED:
+                velocity.record(vote.survey_id, vote.candidate_id)
+        return batch.results
+
+    async def _flush(self, batch):
+        try:
+            results = await self._apply([vote for vote, _ in batch])
+        except Exception as e:
+            logger.error(f"Error writing vote batch of {len(batch)}: {e}")
+            metrics.votes.inc("error", amount=len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+vote_writer = VoteWriter()
@@ -3,9 +3,13 @@ from aiogram.fsm.state import State, StatesGroup
 class SurveyCreation(StatesGroup):
     waiting_for_title = State()
     waiting_for_description = State()
+    waiting_for_deadline = State()
     waiting_for_image = State()
     waiting_for_candidates = State()
 
+class SurveyDeadline(StatesGroup):
+    waiting_for_deadline = State()
+
 class ChannelManagement(StatesGroup):
     waiting_for_forward = State()
 
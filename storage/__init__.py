@@ -0,0 +1,30 @@
+from config import STORAGE_BACKEND, METADATA_CACHE
+from storage.base import Storage
+
+_storage = None
+
+def create_storage(backend: str = STORAGE_BACKEND, cached: bool = METADATA_CACHE) -> Storage:
+    if backend == "sqlite":
+        from storage.sqlite import SqliteStorage
+        storage = SqliteStorage()
+    elif backend == "memory":
+        from storage.memory import MemoryStorage
+        storage = MemoryStorage()
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r}")
+    if cached:
+        from storage.cached import CachedStorage
+        storage = CachedStorage(storage)
+    return storage
+
+def set_storage(storage: Storage):
+    global _storage
+    _storage = storage
+
+def get_storage() -> Storage:
+    # Handlers get the backend injected by the dispatcher; background services
+    # (tally, vote writer, posting, export) look it up here.
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
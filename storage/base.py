@@ -0,0 +1,143 @@
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import NamedTuple
+
+class VoteResult(str, Enum):
+    ACCEPTED = "accepted"
+    DUPLICATE = "duplicate"  # the user already voted in this survey
+    CLOSED = "closed"  # survey finished or deleted
+    INVALID = "invalid"  # candidate is not part of the survey
+
+class Vote(NamedTuple):
+    user_id: int
+    survey_id: int
+    candidate_id: int
+    chat_id: int = None  # chat the vote button was pressed in, when known
+
+class VoteBatch(NamedTuple):
+    results: list  # one VoteResult per submitted vote
+    counts: dict  # (survey_id, candidate_id) -> votes_count after the batch, for candidates that gained votes
+
+class Storage(ABC):
+    """Everything the bot persists. Rows support row['column'] access."""
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # --- Users ---
+
+    @abstractmethod
+    async def get_user_by_id(self, user_id: int): ...
+
+    @abstractmethod
+    async def add_or_update_user(self, user_id: int, phone: str, username: str, full_name: str): ...
+
+    @abstractmethod
+    def iter_user_ids(self, chunk_size: int = 50000):
+        """Async iterator over lists of registered user ids, ascending."""
+
+    # --- Surveys ---
+
+    @abstractmethod
+    async def get_active_surveys(self): ...
+
+    @abstractmethod
+    async def get_survey_details(self, survey_id: int): ...
+
+    @abstractmethod
+    async def create_survey(self, title, description, image_file_id, deadline=None): ...
+
+    @abstractmethod
+    async def set_survey_deadline(self, survey_id: int, deadline): ...
+
+    @abstractmethod
+    async def get_survey_deadlines(self): ...
+
+    @abstractmethod
+    async def close_survey(self, survey_id: int): ...
+
+    @abstractmethod
+    async def delete_survey(self, survey_id: int): ...
+
+    # --- Candidates ---
+
+    @abstractmethod
+    async def get_survey_candidates(self, survey_id: int): ...
+
+    @abstractmethod
+    async def add_candidate(self, survey_id: int, full_name: str): ...
+
+    @abstractmethod
+    async def get_tally_rows(self, survey_id: int = None): ...
+
+    # --- Votes ---
+
+    @abstractmethod
+    async def has_user_voted(self, user_id: int, survey_id: int): ...
+
+    @abstractmethod
+    async def register_vote(self, user_id: int, survey_id: int, candidate_id: int, chat_id: int = None) -> VoteResult: ...
+
+    @abstractmethod
+    async def register_votes(self, votes) -> VoteBatch:
+        """votes: Vote tuples (plain 3-tuples work too)."""
+
+    @abstractmethod
+    async def get_vote_counts(self): ...
+
+    @abstractmethod
+    async def repair_vote_counts(self):
+        """Set votes_count to COUNT(*) over votes; returns (survey_id, candidate_id, votes_count, votes) rows that were off."""
+
+    @abstractmethod
+    async def get_vote_timeline(self, survey_id: int, since: int = None):
+        """Rows of (hour, candidate_id, votes), hour = unix time // 3600, oldest first."""
+
+    @abstractmethod
+    async def verify_vote_aggregates(self):
+        """Rebuild the aggregates from the vote log; rows of (kind, survey_id, hour, candidate_id, live, rebuilt) that differ."""
+
+    # --- Channels ---
+
+    @abstractmethod
+    async def get_all_channels(self): ...
+
+    @abstractmethod
+    async def add_channel(self, channel_id: str, name: str, url: str): ...
+
+    @abstractmethod
+    async def channel_exists(self, channel_id: str): ...
+
+    @abstractmethod
+    async def delete_channel(self, c_id: int): ...
+
+    @abstractmethod
+    async def get_linked_channels(self, survey_id: int): ...
+
+    @abstractmethod
+    async def toggle_survey_channel(self, survey_id: int, channel_id: int): ...
+
+    @abstractmethod
+    async def get_survey_linked_channel_ids(self, survey_id: int): ...
+
+    # --- Posted messages ---
+
+    @abstractmethod
+    async def add_posted_message(self, survey_id: int, chat_id: int, message_id: int, kind: str): ...
+
+    @abstractmethod
+    async def get_posted_messages(self, survey_id: int): ...
+
+    @abstractmethod
+    async def delete_posted_message(self, chat_id: int, message_id: int): ...
+
+    # --- Reports ---
+
+    @abstractmethod
+    async def get_survey_participants_report(self, survey_id: int): ...
+
+    @abstractmethod
+    def iter_survey_participants_report(self, survey_id: int, chunk_size: int = 1000): ...
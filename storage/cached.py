@@ -0,0 +1,225 @@
+import logging
+import time
+from config import METADATA_CACHE_TTL
+from storage.base import Storage, VoteResult
+
+logger = logging.getLogger(__name__)
+
+# Per-key counters beyond this are dropped for keys that aren't cached
+MAX_KEY_STATS = 10000
+
+class KeyStats:
+    __slots__ = ("hits", "misses", "invalidations")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+class CachedStorage(Storage):
+    """Read-through cache for survey metadata over another Storage.
+
+    Caches the reads hit on every menu press and survey callback; the admin
+    writes that can change them invalidate exactly the affected keys. Entries
+    also expire after METADATA_CACHE_TTL as a guard against out-of-band edits
+    (e.g. seed_db.py run against a live database).
+    """
+
+    def __init__(self, inner: Storage, ttl: float = METADATA_CACHE_TTL, max_key_stats: int = MAX_KEY_STATS):
+        self.inner = inner
+        self.ttl = ttl
+        self.max_key_stats = max_key_stats
+        self._entries = {}  # key -> (value, expires_at)
+        self._generations = {}  # key -> bumped on every invalidation
+        self._loading = {}  # key -> loads in flight
+        self._stats = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _key_stats(self, key):
+        stats = self._stats.get(key)
+        if stats is None:
+            if len(self._stats) >= self.max_key_stats:
+                # Lookups of unknown ids (callback data comes from the client) are never cached
+                self._stats = {k: s for k, s in self._stats.items() if k in self._entries}
+            stats = self._stats[key] = KeyStats()
+        return stats
+
+    async def _read(self, key, load):
+        entry = self._entries.get(key)
+        stats = self._key_stats(key)
+        if entry is not None and entry[1] > time.monotonic():
+            stats.hits += 1
+            self.hits += 1
+            return entry[0]
+
+        stats.misses += 1
+        self.misses += 1
+        generation = self._generations.get(key, 0)
+        self._loading[key] = self._loading.get(key, 0) + 1
+        try:
+            value = await load()
+        finally:
+            self._loading[key] -= 1
+            if not self._loading[key]:
+                del self._loading[key]
+        # A write that landed while we were loading makes this value stale;
+        # None (no such survey) isn't kept
+        if value is not None and self._generations.get(key, 0) == generation:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+        return value
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if self._entries.pop(key, None) is not None:
+                self._key_stats(key).invalidations += 1
+
+    def _invalidate_kind(self, kind):
+        # Loads still in flight are covered too, so they don't cache a stale value
+        self.invalidate(*[key for key in {*self._entries, *self._loading} if key[0] == kind])
+
+    def stats(self):
+        return {key: stats.as_dict() for key, stats in self._stats.items()}
+
+    def summary(self):
+        total = self.hits + self.misses
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    async def warm(self):
+        surveys = await self.get_active_surveys()
+        for s in surveys:
+            await self.get_survey_details(s['id'])
+            await self.get_linked_channels(s['id'])
+            await self.get_survey_candidates(s['id'])
+        logger.info(f"Metadata cache warmed for {len(surveys)} surveys")
+
+    async def open(self):
+        await self.inner.open()
+
+    async def close(self):
+        await self.inner.close()
+
+    # --- Cached reads ---
+
+    async def get_active_surveys(self):
+        return await self._read(("active_surveys",), self.inner.get_active_surveys)
+
+    async def get_survey_details(self, survey_id: int):
+        return await self._read(("survey", survey_id), lambda: self.inner.get_survey_details(survey_id))
+
+    async def get_linked_channels(self, survey_id: int):
+        return await self._read(("linked_channels", survey_id), lambda: self.inner.get_linked_channels(survey_id))
+
+    async def get_survey_candidates(self, survey_id: int):
+        return await self._read(("candidates", survey_id), lambda: self.inner.get_survey_candidates(survey_id))
+
+    # --- Writes that invalidate ---
+
+    async def create_survey(self, title, description, image_file_id, deadline=None):
+        survey_id = await self.inner.create_survey(title, description, image_file_id, deadline)
+        self.invalidate(("active_surveys",), ("survey", survey_id))
+        return survey_id
+
+    async def close_survey(self, survey_id: int):
+        await self.inner.close_survey(survey_id)
+        self.invalidate(("active_surveys",), ("survey", survey_id))
+
+    async def delete_survey(self, survey_id: int):
+        await self.inner.delete_survey(survey_id)
+        self.invalidate(("active_surveys",), ("survey", survey_id))
+
+    async def add_candidate(self, survey_id: int, full_name: str):
+        candidate_id = await self.inner.add_candidate(survey_id, full_name)
+        self.invalidate(("candidates", survey_id))
+        return candidate_id
+
+    async def toggle_survey_channel(self, survey_id: int, channel_id: int):
+        action = await self.inner.toggle_survey_channel(survey_id, channel_id)
+        self.invalidate(("linked_channels", survey_id))
+        return action
+
+    async def delete_channel(self, c_id: int):
+        await self.inner.delete_channel(c_id)
+        # Cached rows carry the Telegram chat id, not c_id: drop every survey's list
+        self._invalidate_kind("linked_channels")
+
+    async def register_vote(self, user_id: int, survey_id: int, candidate_id: int, chat_id: int = None):
+        result = await self.inner.register_vote(user_id, survey_id, candidate_id, chat_id)
+        if result is VoteResult.ACCEPTED:
+            self.invalidate(("candidates", survey_id))
+        return result
+
+    async def register_votes(self, votes):
+        batch = await self.inner.register_votes(votes)
+        self.invalidate(*{("candidates", survey_id) for survey_id, _ in batch.counts})
+        return batch
+
+    # --- Pass-through ---
+
+    async def get_user_by_id(self, user_id: int):
+        return await self.inner.get_user_by_id(user_id)
+
+    async def add_or_update_user(self, user_id: int, phone: str, username: str, full_name: str):
+        return await self.inner.add_or_update_user(user_id, phone, username, full_name)
+
+    def iter_user_ids(self, chunk_size: int = 50000):
+        return self.inner.iter_user_ids(chunk_size)
+
+    async def set_survey_deadline(self, survey_id: int, deadline):
+        return await self.inner.set_survey_deadline(survey_id, deadline)
+
+    async def get_survey_deadlines(self):
+        return await self.inner.get_survey_deadlines()
+
+    async def get_tally_rows(self, survey_id: int = None):
+        return await self.inner.get_tally_rows(survey_id)
+
+    async def has_user_voted(self, user_id: int, survey_id: int):
+        return await self.inner.has_user_voted(user_id, survey_id)
+
+    async def get_vote_counts(self):
+        return await self.inner.get_vote_counts()
+
+    async def repair_vote_counts(self):
+        drifted = await self.inner.repair_vote_counts()
+        if drifted:
+            self.invalidate(*{("candidates", row['survey_id']) for row in drifted})
+        return drifted
+
+    async def get_vote_timeline(self, survey_id: int, since: int = None):
+        return await self.inner.get_vote_timeline(survey_id, since)
+
+    async def verify_vote_aggregates(self):
+        return await self.inner.verify_vote_aggregates()
+
+    async def get_all_channels(self):
+        return await self.inner.get_all_channels()
+
+    async def add_channel(self, channel_id: str, name: str, url: str):
+        return await self.inner.add_channel(channel_id, name, url)
+
+    async def channel_exists(self, channel_id: str):
+        return await self.inner.channel_exists(channel_id)
+
+    async def get_survey_linked_channel_ids(self, survey_id: int):
+        return await self.inner.get_survey_linked_channel_ids(survey_id)
+
+    async def add_posted_message(self, survey_id: int, chat_id: int, message_id: int, kind: str):
+        return await self.inner.add_posted_message(survey_id, chat_id, message_id, kind)
+
+    async def get_posted_messages(self, survey_id: int):
+        return await self.inner.get_posted_messages(survey_id)
+
+    async def delete_posted_message(self, chat_id: int, message_id: int):
+        return await self.inner.delete_posted_message(chat_id, message_id)
+
+    async def get_survey_participants_report(self, survey_id: int):
+        return await self.inner.get_survey_participants_report(survey_id)
+
+    def iter_survey_participants_report(self, survey_id: int, chunk_size: int = 1000):
+        return self.inner.iter_survey_participants_report(survey_id, chunk_size)
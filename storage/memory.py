@@ -0,0 +1,260 @@
+import datetime
+import itertools
+import time
+from storage.base import Storage, Vote, VoteBatch, VoteResult
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+class MemoryStorage(Storage):
+    """Pure in-memory backend (nothing survives a restart).
+
+    Mirrors the SQLite semantics closely enough to run the handlers against it,
+    so handler overhead can be measured without any I/O.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.surveys = {}
+        self.candidates = {}
+        self.votes = {}  # (user_id, survey_id) -> candidate_id
+        self.vote_events = []  # Vote-like dicts with created_at, append-only
+        self.vote_hourly = {}  # (survey_id, hour, candidate_id) -> votes
+        self.channels = {}
+        self.survey_channels = set()  # (survey_id, channel db id)
+        self.posted_messages = []
+        self._survey_ids = itertools.count(1)
+        self._candidate_ids = itertools.count(1)
+        self._channel_ids = itertools.count(1)
+
+    # --- Users ---
+
+    async def get_user_by_id(self, user_id: int):
+        user = self.users.get(user_id)
+        return dict(user) if user else None
+
+    async def add_or_update_user(self, user_id: int, phone: str, username: str, full_name: str):
+        self.users[user_id] = {
+            "user_id": user_id, "phone_number": phone, "username": username,
+            "full_name": full_name, "joined_at": _now(),
+        }
+
+    async def iter_user_ids(self, chunk_size: int = 50000):
+        user_ids = sorted(self.users)
+        for i in range(0, len(user_ids), chunk_size):
+            yield user_ids[i:i + chunk_size]
+
+    # --- Surveys ---
+
+    async def get_active_surveys(self):
+        return [
+            {"id": s["id"], "title": s["title"], "is_closed": s["is_closed"]}
+            for s in self.surveys.values() if s["is_active"]
+        ]
+
+    async def get_survey_details(self, survey_id: int):
+        s = self.surveys.get(survey_id)
+        if not s:
+            return None
+        return {k: s[k] for k in ("title", "description", "image_file_id", "is_closed")}
+
+    async def create_survey(self, title, description, image_file_id, deadline=None):
+        survey_id = next(self._survey_ids)
+        self.surveys[survey_id] = {
+            "id": survey_id, "title": title, "description": description, "image_file_id": image_file_id,
+            "is_active": 1, "is_closed": 0, "deadline": deadline,
+        }
+        return survey_id
+
+    async def set_survey_deadline(self, survey_id: int, deadline):
+        if survey_id in self.surveys:
+            self.surveys[survey_id]["deadline"] = deadline
+
+    async def get_survey_deadlines(self):
+        return [
+            {"id": s["id"], "deadline": s["deadline"]} for s in self.surveys.values()
+            if s["is_active"] and not s["is_closed"] and s["deadline"] is not None
+        ]
+
+    async def close_survey(self, survey_id: int):
+        if survey_id in self.surveys:
+            self.surveys[survey_id]["is_closed"] = 1
+
+    async def delete_survey(self, survey_id: int):
+        if survey_id in self.surveys:
+            self.surveys[survey_id]["is_active"] = 0
+
+    # --- Candidates ---
+
+    async def get_survey_candidates(self, survey_id: int):
+        rows = [c for c in self.candidates.values() if c["survey_id"] == survey_id]
+        rows.sort(key=lambda c: -c["votes_count"])
+        return [{"id": c["id"], "full_name": c["full_name"], "votes_count": c["votes_count"]} for c in rows]
+
+    async def add_candidate(self, survey_id: int, full_name: str):
+        candidate_id = next(self._candidate_ids)
+        self.candidates[candidate_id] = {"id": candidate_id, "survey_id": survey_id, "full_name": full_name, "votes_count": 0}
+        return candidate_id
+
+    async def get_tally_rows(self, survey_id: int = None):
+        return [
+            dict(c) for c in self.candidates.values()
+            if survey_id is None or c["survey_id"] == survey_id
+        ]
+
+    # --- Votes ---
+
+    async def has_user_voted(self, user_id: int, survey_id: int):
+        return (user_id, survey_id) in self.votes
+
+    async def register_vote(self, user_id: int, survey_id: int, candidate_id: int, chat_id: int = None):
+        return (await self.register_votes([Vote(user_id, survey_id, candidate_id, chat_id)])).results[0]
+
+    async def register_votes(self, votes):
+        now = int(time.time())
+        results = []
+        touched = set()
+        for user_id, survey_id, candidate_id, chat_id in (Vote(*vote) for vote in votes):
+            key = (user_id, survey_id)
+            candidate = self.candidates.get(candidate_id)
+            survey = self.surveys.get(survey_id)
+            if key in self.votes:
+                results.append(VoteResult.DUPLICATE)
+            elif candidate is None or candidate["survey_id"] != survey_id:
+                results.append(VoteResult.INVALID)
+            elif not survey["is_active"] or survey["is_closed"]:
+                results.append(VoteResult.CLOSED)
+            else:
+                self.votes[key] = candidate_id
+                candidate["votes_count"] += 1
+                self.vote_events.append({
+                    "user_id": user_id, "survey_id": survey_id, "candidate_id": candidate_id,
+                    "chat_id": chat_id, "created_at": now,
+                })
+                hourly = (survey_id, now // 3600, candidate_id)
+                self.vote_hourly[hourly] = self.vote_hourly.get(hourly, 0) + 1
+                touched.add(candidate_id)
+                results.append(VoteResult.ACCEPTED)
+        counts = {(self.candidates[c]["survey_id"], c): self.candidates[c]["votes_count"] for c in touched}
+        return VoteBatch(results, counts)
+
+    async def get_vote_counts(self):
+        counts = {}
+        for (_, survey_id), candidate_id in self.votes.items():
+            counts[(survey_id, candidate_id)] = counts.get((survey_id, candidate_id), 0) + 1
+        return [
+            {"survey_id": survey_id, "candidate_id": candidate_id, "votes": votes}
+            for (survey_id, candidate_id), votes in counts.items()
+        ]
+
+    async def repair_vote_counts(self):
+        counts = {}
+        for candidate_id in self.votes.values():
+            counts[candidate_id] = counts.get(candidate_id, 0) + 1
+        drifted = []
+        for c in self.candidates.values():
+            votes = counts.get(c["id"], 0)
+            if c["votes_count"] != votes:
+                drifted.append({"survey_id": c["survey_id"], "candidate_id": c["id"], "votes_count": c["votes_count"], "votes": votes})
+                c["votes_count"] = votes
+        return drifted
+
+    async def get_vote_timeline(self, survey_id: int, since: int = None):
+        since_hour = (since or 0) // 3600
+        return [
+            {"hour": hour, "candidate_id": candidate_id, "votes": votes}
+            for (s_id, hour, candidate_id), votes in sorted(self.vote_hourly.items(), key=lambda item: item[0][1])
+            if s_id == survey_id and hour >= since_hour
+        ]
+
+    async def verify_vote_aggregates(self):
+        per_candidate, per_hour = {}, {}
+        for e in self.vote_events:
+            per_candidate[e["candidate_id"]] = per_candidate.get(e["candidate_id"], 0) + 1
+            if e["created_at"] is not None:
+                key = (e["survey_id"], e["created_at"] // 3600, e["candidate_id"])
+                per_hour[key] = per_hour.get(key, 0) + 1
+
+        diffs = []
+        for c in self.candidates.values():
+            rebuilt = per_candidate.get(c["id"], 0)
+            if c["votes_count"] != rebuilt:
+                diffs.append({"kind": "candidate", "survey_id": c["survey_id"], "hour": None,
+                              "candidate_id": c["id"], "live": c["votes_count"], "rebuilt": rebuilt})
+        for key in per_hour.keys() | self.vote_hourly.keys():
+            live, rebuilt = self.vote_hourly.get(key, 0), per_hour.get(key, 0)
+            if live != rebuilt:
+                diffs.append({"kind": "hourly", "survey_id": key[0], "hour": key[1],
+                              "candidate_id": key[2], "live": live, "rebuilt": rebuilt})
+        return diffs
+
+    # --- Channels ---
+
+    async def get_all_channels(self):
+        return [dict(c) for c in self.channels.values()]
+
+    async def add_channel(self, channel_id: str, name: str, url: str):
+        c_id = next(self._channel_ids)
+        self.channels[c_id] = {"id": c_id, "channel_id": str(channel_id), "name": name, "url": url}
+
+    async def channel_exists(self, channel_id: str):
+        return any(c["channel_id"] == str(channel_id) for c in self.channels.values())
+
+    async def delete_channel(self, c_id: int):
+        self.channels.pop(c_id, None)
+
+    async def get_linked_channels(self, survey_id: int):
+        return [
+            {"channel_id": c["channel_id"], "name": c["name"], "url": c["url"]}
+            for (s_id, c_id) in self.survey_channels if s_id == survey_id
+            for c in (self.channels.get(c_id),) if c
+        ]
+
+    async def toggle_survey_channel(self, survey_id: int, channel_id: int):
+        key = (survey_id, channel_id)
+        if key in self.survey_channels:
+            self.survey_channels.discard(key)
+            return "removed"
+        self.survey_channels.add(key)
+        return "added"
+
+    async def get_survey_linked_channel_ids(self, survey_id: int):
+        return {c_id for s_id, c_id in self.survey_channels if s_id == survey_id}
+
+    # --- Posted messages ---
+
+    async def add_posted_message(self, survey_id: int, chat_id: int, message_id: int, kind: str):
+        self.posted_messages.append({
+            "survey_id": survey_id, "chat_id": chat_id, "message_id": message_id,
+            "kind": kind, "posted_at": _now(),
+        })
+
+    async def get_posted_messages(self, survey_id: int):
+        return [dict(p) for p in self.posted_messages if p["survey_id"] == survey_id]
+
+    async def delete_posted_message(self, chat_id: int, message_id: int):
+        self.posted_messages = [
+            p for p in self.posted_messages
+            if (p["chat_id"], p["message_id"]) != (chat_id, message_id)
+        ]
+
+    # --- Reports ---
+
+    async def get_survey_participants_report(self, survey_id: int):
+        rows = []
+        for user in self.users.values():
+            candidate_id = self.votes.get((user["user_id"], survey_id))
+            candidate = self.candidates.get(candidate_id)
+            rows.append((candidate_id, {
+                "phone_number": user["phone_number"],
+                "full_name": user["full_name"],
+                "candidate_name": candidate["full_name"] if candidate else None,
+            }))
+        # Same order as the SQL report: voters by candidate, then non-voters; by name within
+        rows.sort(key=lambda r: (r[0] is None, r[0] or 0, r[1]["full_name"] is not None, r[1]["full_name"] or ""))
+        return [row for _, row in rows]
+
+    async def iter_survey_participants_report(self, survey_id: int, chunk_size: int = 1000):
+        rows = await self.get_survey_participants_report(survey_id)
+        for i in range(0, len(rows), chunk_size):
+            yield rows[i:i + chunk_size]
@@ -0,0 +1,112 @@
+import database
+from config import DB_NAME
+from storage.base import Storage
+
+class SqliteStorage(Storage):
+    """The database.py functions behind the Storage interface."""
+
+    def __init__(self, path: str = DB_NAME):
+        self.path = path
+
+    async def open(self):
+        await database.init_db(self.path)
+        await database.create_tables()
+
+    async def close(self):
+        await database.close_db()
+
+    async def get_user_by_id(self, user_id: int):
+        return await database.get_user_by_id(user_id)
+
+    async def add_or_update_user(self, user_id: int, phone: str, username: str, full_name: str):
+        return await database.add_or_update_user(user_id, phone, username, full_name)
+
+    def iter_user_ids(self, chunk_size: int = 50000):
+        return database.iter_user_ids(chunk_size)
+
+    async def get_active_surveys(self):
+        return await database.get_active_surveys()
+
+    async def get_survey_details(self, survey_id: int):
+        return await database.get_survey_details(survey_id)
+
+    async def create_survey(self, title, description, image_file_id, deadline=None):
+        return await database.create_survey(title, description, image_file_id, deadline)
+
+    async def set_survey_deadline(self, survey_id: int, deadline):
+        return await database.set_survey_deadline(survey_id, deadline)
+
+    async def get_survey_deadlines(self):
+        return await database.get_survey_deadlines()
+
+    async def close_survey(self, survey_id: int):
+        return await database.close_survey(survey_id)
+
+    async def delete_survey(self, survey_id: int):
+        return await database.delete_survey(survey_id)
+
+    async def get_survey_candidates(self, survey_id: int):
+        return await database.get_survey_candidates(survey_id)
+
+    async def add_candidate(self, survey_id: int, full_name: str):
+        return await database.add_candidate(survey_id, full_name)
+
+    async def get_tally_rows(self, survey_id: int = None):
+        return await database.get_tally_rows(survey_id)
+
+    async def has_user_voted(self, user_id: int, survey_id: int):
+        return await database.has_user_voted(user_id, survey_id)
+
+    async def register_vote(self, user_id: int, survey_id: int, candidate_id: int, chat_id: int = None):
+        return await database.register_vote(user_id, survey_id, candidate_id, chat_id)
+
+    async def register_votes(self, votes):
+        return await database.register_votes(votes)
+
+    async def get_vote_counts(self):
+        return await database.get_vote_counts()
+
+    async def repair_vote_counts(self):
+        return await database.repair_vote_counts()
+
+    async def get_vote_timeline(self, survey_id: int, since: int = None):
+        return await database.get_vote_timeline(survey_id, since)
+
+    async def verify_vote_aggregates(self):
+        return await database.verify_vote_aggregates()
+
+    async def get_all_channels(self):
+        return await database.get_all_channels()
+
+    async def add_channel(self, channel_id: str, name: str, url: str):
+        return await database.add_channel(channel_id, name, url)
+
+    async def channel_exists(self, channel_id: str):
+        return await database.channel_exists(channel_id)
+
+    async def delete_channel(self, c_id: int):
+        return await database.delete_channel(c_id)
+
+    async def get_linked_channels(self, survey_id: int):
+        return await database.get_linked_channels(survey_id)
+
+    async def toggle_survey_channel(self, survey_id: int, channel_id: int):
+        return await database.toggle_survey_channel(survey_id, channel_id)
+
+    async def get_survey_linked_channel_ids(self, survey_id: int):
+        return await database.get_survey_linked_channel_ids(survey_id)
+
+    async def add_posted_message(self, survey_id: int, chat_id: int, message_id: int, kind: str):
+        return await database.add_posted_message(survey_id, chat_id, message_id, kind)
+
+    async def get_posted_messages(self, survey_id: int):
+        return await database.get_posted_messages(survey_id)
+
+    async def delete_posted_message(self, chat_id: int, message_id: int):
+        return await database.delete_posted_message(chat_id, message_id)
+
+    async def get_survey_participants_report(self, survey_id: int):
+        return await database.get_survey_participants_report(survey_id)
+
+    def iter_survey_participants_report(self, survey_id: int, chunk_size: int = 1000):
+        return database.iter_survey_participants_report(survey_id, chunk_size)
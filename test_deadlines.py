@@ -0,0 +1,70 @@
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+import aiosqlite
+import migrations
+from checks import Checks
+from services.deadlines import DeadlineScheduler, TZ, format_deadline, parse_deadline
+from storage import set_storage
+from storage.memory import MemoryStorage
+
+def soon(seconds):
+    return datetime.datetime.fromtimestamp(time.time() + seconds, TZ)
+
+async def test():
+    check = Checks()
+
+    check("dates parse as local time", parse_deadline("31.12.2026 21:00") == parse_deadline("2026-12-31 21:00")
+          and parse_deadline("2026-12-31 21:00").utcoffset() == TZ.utcoffset(None))
+    check("a bare date means the end of that day", format_deadline(parse_deadline("2026-12-31")) == "2026-12-31 23:59")
+    check("garbage is rejected", parse_deadline("ertaga") is None)
+
+    storage = MemoryStorage()
+    set_storage(storage)
+    overdue = await storage.create_survey("Eski", "", None, "2025-01-25 21:00")
+    later = await storage.create_survey("Keyin", "", None, "2099-01-01 00:00")
+    undated = await storage.create_survey("Muddatsiz", "", None)
+    closed = lambda survey_id: storage.surveys[survey_id]["is_closed"] == 1
+
+    scheduler = DeadlineScheduler()
+    await scheduler.start(bot=None)
+    await asyncio.sleep(0.05)
+    check("overdue surveys close at startup", closed(overdue) and not closed(later) and not closed(undated))
+    check("the next deadline is the earliest one", scheduler.next_deadline()[1] == later)
+
+    fresh = await storage.create_survey("Yangi", "", None)
+    scheduler.schedule(fresh, soon(0.2))
+    scheduler.schedule(later, soon(0.1))  # edited: the old 2099 entry goes stale
+    await asyncio.sleep(0.15)
+    check("an edited deadline fires at its new time", closed(later) and not closed(fresh))
+    await asyncio.sleep(0.15)
+    check("a deadline added while sleeping wakes the scheduler", closed(fresh))
+
+    scheduler.schedule(undated, soon(0.1))
+    scheduler.discard(undated)
+    await asyncio.sleep(0.2)
+    check("discarded deadlines don't fire", not closed(undated) and scheduler.next_deadline() is None)
+    await scheduler.stop()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        async with aiosqlite.connect(os.path.join(tmp, "legacy.db")) as db:
+            migrations.MIGRATIONS, all_migrations = migrations.MIGRATIONS[:3], migrations.MIGRATIONS
+            try:
+                await migrations.apply_migrations(db)
+            finally:
+                migrations.MIGRATIONS = all_migrations
+            await db.executemany("INSERT INTO surveys (title, deadline) VALUES (?, ?)",
+                                 [("Eski", "2026-12-31"), ("Tanlangan", "2026-12-31 21:00")])
+            await db.commit()
+            await migrations.apply_migrations(db)
+            async with db.execute("SELECT deadline FROM surveys ORDER BY id") as cursor:
+                deadlines = [row[0] for row in await cursor.fetchall()]
+    check("the old placeholder deadline is dropped, chosen ones are kept", deadlines == [None, "2026-12-31 21:00"])
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
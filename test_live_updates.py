@@ -0,0 +1,115 @@
+import asyncio
+import sys
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageReplyMarkup
+from checks import Checks
+from services.live_updates import LiveUpdater
+from services.render_cache import candidates_markup
+from services.tally import tallies
+from storage import set_storage
+from storage.memory import MemoryStorage
+
+class FakeBot:
+    def __init__(self):
+        self.edits = []
+        self.gone = set()
+
+    async def edit_message_reply_markup(self, chat_id, message_id, reply_markup):
+        if (chat_id, message_id) in self.gone:
+            raise TelegramBadRequest(EditMessageReplyMarkup(chat_id=chat_id, message_id=message_id),
+                                     "Bad Request: message to edit not found")
+        self.edits.append(("markup", chat_id, message_id))
+
+    async def edit_message_text(self, chat_id, message_id, text, parse_mode=None):
+        self.edits.append(("text", chat_id, message_id))
+
+async def test():
+    check = Checks()
+
+    storage = MemoryStorage()
+    set_storage(storage)
+    survey_id = await storage.create_survey("Jonli", "desc", None)
+    candidate_id = await storage.add_candidate(survey_id, "Ali")
+    await storage.add_posted_message(survey_id, -100, 1, "survey")
+    await tallies.load()
+    markup = candidates_markup(await tallies.get(survey_id))
+
+    bot = FakeBot()
+    updater = LiveUpdater(interval=1, edit_rate=3, chat_rate=1000)
+    updater.bot = bot
+    await updater.load()
+    for chat_id in range(-105, -100):
+        updater.track(chat_id, 1, survey_id, "survey", markup)
+    updater.track(-200, 7, survey_id, "results", None)
+    check("posted_messages are tracked at startup", (-100, 1) in updater.tracked(survey_id))
+
+    updater.schedule(survey_id)
+    await updater.run_once()
+    check("only posts not known to be current are edited",
+          sorted(bot.edits) == [("markup", -100, 1), ("text", -200, 7)])
+
+    tallies.apply_counts({(survey_id, candidate_id): 1})
+    updater.schedule(survey_id)
+    bot.edits.clear()
+    await updater.run_once()
+    check("a pass stays within the edit budget", len(bot.edits) == 3 and updater.deferred == 4)
+    await updater.run_once()
+    await updater.run_once()
+    edited = {(chat_id, message_id) for _, chat_id, message_id in bot.edits}
+    check("deferred posts are edited on later passes", len(edited) == 7 and len(bot.edits) == 7)
+    check("results posts are edited as text", ("text", -200, 7) in bot.edits)
+
+    bot.edits.clear()
+    await updater.run_once()
+    check("nothing left to do once every post is current", bot.edits == [])
+
+    bot.gone.add((-100, 1))
+    tallies.apply_counts({(survey_id, candidate_id): 2})
+    updater.schedule(survey_id)
+    for _ in range(3):
+        await updater.run_once()
+    check("deleted posts are dropped", (-100, 1) not in updater.tracked(survey_id)
+          and await storage.get_posted_messages(survey_id) == [])
+
+    cards = LiveUpdater(interval=1, edit_rate=1000, chat_rate=1000)
+    cards.bot = bot = FakeBot()
+    for user_id in range(1, 51):
+        cards.refresh_card(user_id, 1, survey_id)
+        cards.schedule(survey_id)
+    await cards.run_once()
+    await cards.run_once()
+    check("voters' cards get one edit each and aren't tracked",
+          len(bot.edits) == 50 and cards.tracked(survey_id) == set())
+
+    capped = LiveUpdater(interval=1, max_tracked=2, edit_rate=1000, chat_rate=1000)
+    capped.bot = bot = FakeBot()
+    capped.track(-400, 1, survey_id, "survey", None)
+    for user_id in range(1, 6):
+        capped.refresh_card(user_id, 1, survey_id)
+    capped.schedule(survey_id)
+    await capped.run_once()
+    check("posts are never evicted by voters' cards",
+          capped.tracked(survey_id) == {(-400, 1)} and bot.edits[0] == ("markup", -400, 1) and len(bot.edits) == 3)
+
+    closing = LiveUpdater(interval=1, edit_rate=1000, chat_rate=1000)
+    closing.bot = bot = FakeBot()
+    closing.track(-500, 1, survey_id, "survey", markup)
+    await storage.close_survey(survey_id)
+    closing.schedule(survey_id)
+    await closing.run_once()
+    shown = closing._messages[(-500, 1)].rendered
+    check("closing a survey swaps the vote buttons for the results button",
+          bot.edits == [("markup", -500, 1)] and shown.inline_keyboard[0][0].callback_data == f"results_{survey_id}")
+
+    slow = LiveUpdater(interval=1, edit_rate=100, chat_rate=0.01)
+    slow.bot = bot = FakeBot()
+    slow.track(-300, 1, survey_id, "survey", markup)
+    slow.track(-300, 2, survey_id, "survey", markup)
+    slow.schedule(survey_id)
+    await slow.run_once()
+    check("each chat has its own budget", len(bot.edits) == 1 and slow.deferred == 1)
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
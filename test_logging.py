@@ -0,0 +1,58 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+from checks import Checks
+from services.logs import setup_logging
+from services.tracing import tracer
+
+def quiet(listener):
+    # Keep the test output readable: silence the console handler, keep the file one
+    for handler in listener.handlers:
+        if not isinstance(handler, logging.FileHandler):
+            handler.setLevel(logging.CRITICAL + 1)
+    return listener
+
+async def test():
+    check = Checks()
+
+    path = os.path.join(tempfile.mkdtemp(), "bot.log")
+    listener = quiet(setup_logging(log_file=path, fmt="json"))
+    log = logging.getLogger("test")
+
+    trace, token = tracer.begin(42, "message", 7, "/start")
+    trace.handler = "cmd_start"
+    log.info("inside update")
+    tracer.finish(trace, token)
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        log.exception("failed")
+    for attempt in range(50):
+        log.error(f"Failed to fetch updates (tryings = {attempt})")
+    listener.stop()
+
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    first = lines[0]
+    check("records are JSON with update context",
+          first["message"] == "inside update" and first["update_id"] == 42 and first["user_id"] == 7
+          and first["handler"] == "cmd_start")
+    check("tracebacks are kept", "ZeroDivisionError" in lines[1]["exc"] and "update_id" not in lines[1])
+    storm = [line for line in lines if line["message"].startswith("Failed to fetch")]
+    check("repeated errors are rate-limited", len(storm) == 5)
+
+    path = os.path.join(tempfile.mkdtemp(), "bot.log")
+    listener = quiet(setup_logging(log_file=path, fmt="text"))
+    listener.handlers[1].maxBytes = 2000
+    for i in range(200):
+        log.info(f"line {i} " + "x" * 50)
+    listener.stop()
+    check("files rotate by size", os.path.exists(path + ".1") and os.path.getsize(path) <= 2000)
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
@@ -0,0 +1,85 @@
+import asyncio
+import sys
+from checks import Checks
+from services.tally import tallies
+from storage import set_storage
+from storage.cached import CachedStorage
+from storage.memory import MemoryStorage
+
+async def test():
+    check = Checks()
+
+    inner = MemoryStorage()
+    storage = CachedStorage(inner)
+    s1 = await storage.create_survey("Birinchi", "desc", None)
+    s2 = await storage.create_survey("Ikkinchi", "desc", None)
+    await storage.add_candidate(s1, "Ali")
+    await storage.add_channel("-1001", "Kanal", "https://t.me/kanal")
+    channel = (await storage.get_all_channels())[0]
+    await storage.toggle_survey_channel(s1, channel["id"])
+
+    await storage.warm()
+    stats = storage.stats()
+    check("warm-up loads every active survey", all(("survey", s) in stats for s in (s1, s2)))
+
+    await storage.get_active_surveys()
+    await storage.get_survey_details(s1)
+    stats = storage.stats()
+    check("menu reads are served from memory",
+          stats[("active_surveys",)]["hits"] == 1 and stats[("survey", s1)]["hits"] == 1)
+
+    await storage.close_survey(s1)
+    check("close_survey refreshes details", (await storage.get_survey_details(s1))["is_closed"] == 1)
+    check("close_survey leaves other surveys cached", ("survey", s2) in storage._entries)
+
+    await storage.delete_survey(s2)
+    check("delete_survey refreshes the active list", [s["id"] for s in await storage.get_active_surveys()] == [s1])
+
+    await storage.add_candidate(s1, "Vali")
+    check("add_candidate refreshes candidates", len(await storage.get_survey_candidates(s1)) == 2)
+
+    s3 = await storage.create_survey("Ochiq", "desc", None)
+    c3 = await storage.add_candidate(s3, "Ali")
+    await storage.get_survey_candidates(s3)
+    await storage.register_votes([(1, s3, c3)])
+    check("accepted votes refresh candidate counts",
+          {c["id"]: c["votes_count"] for c in await storage.get_survey_candidates(s3)}[c3] == 1)
+
+    await storage.get_linked_channels(s1)
+    await storage.delete_channel(channel["id"])
+    check("delete_channel refreshes linked channels", await storage.get_linked_channels(s1) == [])
+
+    # A write landing while a read is in flight must not leave the old value cached
+    load_started, release = asyncio.Event(), asyncio.Event()
+    original = inner.get_active_surveys
+
+    async def slow_active_surveys():
+        rows = await original()
+        load_started.set()
+        await release.wait()
+        return rows
+
+    storage.invalidate(("active_surveys",))
+    inner.get_active_surveys = slow_active_surveys
+    reader = asyncio.create_task(storage.get_active_surveys())
+    await load_started.wait()
+    await storage.create_survey("Uchinchi", "desc", None)
+    release.set()
+    await reader
+    inner.get_active_surveys = original
+    check("stale in-flight read is not cached", len(await storage.get_active_surveys()) == 3)
+
+    # Survey ids in callback data come from the client
+    storage.max_key_stats = 50
+    set_storage(storage)
+    for survey_id in range(1000, 1200):
+        await storage.get_survey_details(survey_id)
+        await tallies.get(survey_id)
+    check("unknown surveys leave nothing behind",
+          ("survey", 1000) not in storage._entries and len(storage.stats()) <= 50
+          and 1000 not in tallies._tallies and storage.summary()["misses"] >= 200)
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
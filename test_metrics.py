@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import tempfile
+from aiohttp.test_utils import TestClient, TestServer
+from aiogram import Bot
+from checks import Checks
+from fake_telegram import FakeSession
+from middlewares.metrics import RequestMetricsMiddleware
+from services import metrics
+
+async def test():
+    check = Checks()
+
+    histogram = metrics.Histogram("test_seconds", "test", ("kind",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, "a\"b")
+    lines = list(histogram.collect())
+    check("buckets are cumulative with +Inf",
+          'test_seconds_bucket{kind="a\\"b",le="0.1"} 1' in lines
+          and 'test_seconds_bucket{kind="a\\"b",le="1.0"} 2' in lines
+          and 'test_seconds_bucket{kind="a\\"b",le="+Inf"} 3' in lines)
+    check("sum and count are exported", 'test_seconds_sum{kind="a\\"b"} 5.55' in lines
+          and 'test_seconds_count{kind="a\\"b"} 3' in lines)
+
+    import database
+    with tempfile.TemporaryDirectory() as tmp:
+        await database.init_db(os.path.join(tmp, "metrics.db"))
+        try:
+            await database.create_tables()
+            await database.get_active_surveys()
+            async for _ in database.iter_survey_participants_report(1):
+                pass
+        finally:
+            await database.close_db()
+    check("database functions are timed",
+          ("get_active_surveys",) in metrics.db_seconds.values
+          and ("iter_survey_participants_report",) in metrics.db_seconds.values)
+
+    session = FakeSession()
+    session.middleware(RequestMetricsMiddleware())
+    bot = Bot(token="42:TEST", session=session)
+    await bot.send_message(1, "salom")
+    check("Bot API calls are timed", ("sendMessage",) in metrics.api_seconds.values)
+
+    metrics.register_cache("test", lambda: {"hits": 3, "misses": 1, "hit_rate": 0.75})
+    runner = await metrics.start_metrics_server("127.0.0.1", 0)
+    try:
+        server = TestServer(runner.app)
+        async with TestClient(server) as client:
+            resp = await client.get("/metrics")
+            body = await resp.text()
+        check("endpoint serves Prometheus text", resp.status == 200
+              and resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+              and "# TYPE bot_db_query_seconds histogram" in body
+              and 'bot_cache_hit_ratio{cache="test"} 0.75' in body)
+    finally:
+        await runner.cleanup()
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
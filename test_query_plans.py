@@ -0,0 +1,135 @@
+import asyncio
+import inspect
+import os
+import sys
+import tempfile
+import database
+
+# Queries that read a whole table on purpose. Anything else doing a SCAN fails.
+ALLOWED_SCANS = {
+    "get_all_channels": {"channels"},
+    "iter_user_ids": {"users"},  # startup load of the registered-user index
+    "get_tally_rows": {"candidates"},  # startup load of every survey
+    "get_vote_counts": {"votes"},  # reconcile aggregates every vote
+    "repair_vote_counts": {"c"},  # reconcile checks every candidate
+    "verify_vote_aggregates": {"vote_events", "c", "r", "h"},  # rebuilds the aggregates from the whole log
+    "get_survey_participants_report": {"u"},  # report lists every user
+    "iter_survey_participants_report": {"u"},
+}
+
+NOT_QUERIES = {"init_db", "close_db", "create_tables", "get_db", "get_writer"}
+
+async def exercise(survey_id, candidate_id, channel_db_id):
+    # One call per database.py function; keys must match the function names
+    async def collect(gen):
+        return [row async for rows in gen for row in rows]
+
+    return {
+        "get_user_by_id": lambda: database.get_user_by_id(1),
+        "add_or_update_user": lambda: database.add_or_update_user(2, "+998", "u", "User"),
+        "iter_user_ids": lambda: collect(database.iter_user_ids()),
+        "get_active_surveys": lambda: database.get_active_surveys(),
+        "get_survey_details": lambda: database.get_survey_details(survey_id),
+        "get_survey_candidates": lambda: database.get_survey_candidates(survey_id),
+        "has_user_voted": lambda: database.has_user_voted(1, survey_id),
+        "register_vote": lambda: database.register_vote(3, survey_id, candidate_id, -1001),
+        # Accepted, duplicate and invalid-candidate votes, so the rejection query is planned too
+        "register_votes": lambda: database.register_votes([(4, survey_id, candidate_id), (4, survey_id, candidate_id), (5, survey_id, 999)]),
+        "get_tally_rows": lambda: database.get_tally_rows(),
+        "get_vote_counts": lambda: database.get_vote_counts(),
+        "repair_vote_counts": lambda: database.repair_vote_counts(),
+        "get_vote_timeline": lambda: database.get_vote_timeline(survey_id, since=0),
+        "verify_vote_aggregates": lambda: database.verify_vote_aggregates(),
+        "get_linked_channels": lambda: database.get_linked_channels(survey_id),
+        "delete_survey": lambda: database.delete_survey(survey_id + 1),
+        "get_all_channels": lambda: database.get_all_channels(),
+        "add_channel": lambda: database.add_channel("-1003", "Other", "http://t.me/other"),
+        "channel_exists": lambda: database.channel_exists("-1001"),
+        "delete_channel": lambda: database.delete_channel(channel_db_id + 100),
+        "close_survey": lambda: database.close_survey(survey_id + 1),
+        "create_survey": lambda: database.create_survey("Other", "Desc", None),
+        "set_survey_deadline": lambda: database.set_survey_deadline(survey_id, "2030-01-01 12:00"),
+        "get_survey_deadlines": lambda: database.get_survey_deadlines(),
+        "add_candidate": lambda: database.add_candidate(survey_id, "Other"),
+        "toggle_survey_channel": lambda: database.toggle_survey_channel(survey_id, channel_db_id),
+        "get_survey_linked_channel_ids": lambda: database.get_survey_linked_channel_ids(survey_id),
+        "add_posted_message": lambda: database.add_posted_message(survey_id, -1001, 10, "survey"),
+        "get_posted_messages": lambda: database.get_posted_messages(survey_id),
+        "delete_posted_message": lambda: database.delete_posted_message(-1001, 10),
+        "get_survey_participants_report": lambda: database.get_survey_participants_report(survey_id),
+        "iter_survey_participants_report": lambda: collect(database.iter_survey_participants_report(survey_id)),
+    }
+
+def database_functions():
+    return {
+        name for name, fn in inspect.getmembers(database)
+        if (inspect.iscoroutinefunction(fn) or inspect.isasyncgenfunction(fn))
+        and fn.__module__ == database.__name__
+        and not name.startswith("_") and name not in NOT_QUERIES
+    }
+
+async def query_plan(db, sql):
+    async with db.execute(f"EXPLAIN QUERY PLAN {sql}") as cursor:
+        return [row[3] for row in await cursor.fetchall()]
+
+async def test():
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plans.db")
+        pool = await database.init_db(path, readers=1)
+        try:
+            await database.create_tables()
+            survey_id = await database.create_survey("Survey", "Desc", None)
+            candidate_id = await database.add_candidate(survey_id, "Candidate")
+            await database.create_survey("Second", "Desc", None)
+            await database.add_channel("-1001", "Channel", "http://t.me/ch")
+            channel_db_id = (await database.get_all_channels())[0]['id']
+            await database.add_or_update_user(1, "+998", "u", "User")
+
+            statements = []
+            for db in pool._connections:
+                await db.set_trace_callback(statements.append)
+
+            calls = await exercise(survey_id, candidate_id, channel_db_id)
+            missing = database_functions() - set(calls)
+            for name in sorted(missing):
+                failures.append(f"{name}: not covered by test_query_plans.py")
+
+            plan_db = pool._connections[0]
+            # A partial index only holds the rows its WHERE matches, so scanning it isn't a full table scan
+            async with plan_db.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'") as cursor:
+                partial = {row[0] for row in await cursor.fetchall()}
+            for name, call in calls.items():
+                statements.clear()
+                await call()
+                for sql in list(statements):
+                    verb = sql.lstrip().split(None, 1)[0].upper()
+                    if verb not in ("SELECT", "UPDATE", "DELETE", "INSERT"):
+                        continue
+                    for detail in await query_plan(plan_db, sql):
+                        # SCAN CONSTANT ROW is a FROM-less SELECT, not a table scan
+                        if not detail.startswith("SCAN ") or detail == "SCAN CONSTANT ROW":
+                            continue
+                        if detail.split()[-1] in partial:
+                            continue
+                        table = detail.split()[1]
+                        if table in ALLOWED_SCANS.get(name, ()):
+                            continue
+                        failures.append(f"{name}: {detail}\n    {' '.join(sql.split())}")
+
+            for db in pool._connections:
+                await db.set_trace_callback(None)
+        finally:
+            await database.close_db()
+
+    if failures:
+        print("[FAIL] Full table scans found:")
+        for failure in failures:
+            print(f"  {failure}")
+        return False
+    print("[PASS] No unexpected full table scans")
+    return True
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
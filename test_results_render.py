@@ -0,0 +1,38 @@
+import sys
+from checks import Checks
+from services.results import CAPTION_LIMIT, MESSAGE_LIMIT, render_results, split_text
+from services.tally import SurveyTally
+
+def test():
+    check = Checks()
+
+    tally = SurveyTally(1)
+    for i in range(300):
+        tally.add_candidate(i, f"Nomzod {i}", votes_count=i)
+    open_survey = {"title": "Sinov", "is_closed": 0}
+
+    rendered = render_results(1, open_survey, tally)
+    check("long results are split for messages", len(rendered.messages) > 1)
+    check("every message fits the limit", all(len(p) <= MESSAGE_LIMIT for p in rendered.messages))
+    check("first part fits a photo caption", len(rendered.captioned[0]) <= CAPTION_LIMIT)
+    check("split keeps every line", "\n".join(rendered.messages) == rendered.text)
+    check("header and total are present",
+          rendered.messages[0].startswith("🏁") and rendered.messages[-1].endswith(f"Jami ovozlar: {tally.total}"))
+    check("top candidate gets the gold medal", "🥇 <b>299 ovoz</b>" in rendered.text)
+
+    check("open survey reuses the render per tally version", render_results(1, open_survey, tally) is rendered)
+    tally.increment(5)
+    check("new tally version re-renders", render_results(1, open_survey, tally) is not rendered)
+
+    closed = render_results(2, {"title": "Yopiq", "is_closed": 1}, tally)
+    tally.increment(5)
+    check("closed survey results are memoized for good",
+          render_results(2, {"title": "Yopiq", "is_closed": 1}, tally) is closed)
+
+    check("short text is a single part", split_text("a\nb") == ("a\nb",))
+    check("over-long line is cut hard", [len(p) for p in split_text("x" * 2500, first_limit=1024)] == [1024, 1476])
+    return check.ok
+
+if __name__ == "__main__":
+    if not test():
+        sys.exit(1)
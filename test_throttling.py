@@ -0,0 +1,57 @@
+import asyncio
+import sys
+from aiogram import Bot
+from aiogram.types import CallbackQuery
+from checks import Checks
+from fake_telegram import FakeSession
+from middlewares.throttling import ThrottlingMiddleware
+
+async def test():
+    check = Checks()
+
+    session = FakeSession()
+    bot = Bot(token="42:TEST", session=session)
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.data)
+
+    def tap(user_id, data):
+        return CallbackQuery.model_validate({
+            "id": "1", "chat_instance": "1", "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "U"},
+        }, context={"bot": bot})
+
+    middleware = ThrottlingMiddleware(rate=1, burst=3, dedupe_window=0.2, max_users=2)
+    for _ in range(5):
+        await middleware(handler, tap(1, "vote_1_1"), {})
+    check("identical taps inside the window reach the handler once", handled == ["vote_1_1"])
+    check("suppressed taps are still answered", len(session.api_calls("answerCallbackQuery")) == 4)
+
+    handled.clear()
+    for i in range(6):
+        await middleware(handler, tap(2, f"survey_{i}"), {})
+    check("token bucket lets the burst through and throttles the rest", len(handled) == 3)
+    alerts = [m.text for m in session.api_calls("answerCallbackQuery") if m.text]
+    check("throttled taps get a notice", len(alerts) == 3)
+
+    await middleware(handler, tap(3, "survey_1"), {})
+    check("state is bounded by max_users", len(middleware) == 2)
+
+    await asyncio.sleep(0.25)
+    handled.clear()
+    await middleware(handler, tap(3, "survey_1"), {})
+    check("same data passes again after the window", handled == ["survey_1"])
+
+    idle = ThrottlingMiddleware(rate=15, burst=3, dedupe_window=0.2, max_users=10)
+    handled.clear()
+    await idle(handler, tap(4, "vote_1_1"), {})
+    await asyncio.sleep(0.25)  # every tracked user, this one included, is past the ttl
+    await idle(handler, tap(4, "vote_1_2"), {})
+    await idle(handler, tap(4, "vote_1_2"), {})
+    check("a double tap after an idle spell is still caught", handled == ["vote_1_1", "vote_1_2"])
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from aiogram.types import Update
+from checks import Checks
+from fake_telegram import FakeSession
+from main import build_bot, build_dispatcher
+from services.tracing import tracer
+from storage import set_storage
+from storage.sqlite import SqliteStorage
+
+USER = {"id": 777, "is_bot": False, "first_name": "Vali"}
+
+async def test():
+    check = Checks()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SqliteStorage(os.path.join(tmp, "tracing.db"))
+        set_storage(storage)
+        await storage.open()
+        try:
+            bot = build_bot("42:TEST", FakeSession(latency=0.02))
+            dp = build_dispatcher(storage)
+            tracer.slow = 0.01
+
+            update = Update.model_validate({
+                "update_id": 1,
+                "message": {"message_id": 1, "date": int(time.time()), "chat": {"id": 777, "type": "private"},
+                            "from": USER, "text": "/start"},
+            }, context={"bot": bot})
+            await dp.feed_update(bot, update)
+
+            trace = tracer.recent[-1] if tracer.recent else None
+            check("slow update lands in the ring buffer", trace is not None and trace.update_id == 1)
+            check("trace names the handler", trace is not None and trace.handler == "cmd_start")
+            spans = [(s.kind, s.name) for s in trace.spans] if trace else []
+            check("DB call is a span", ("db", "get_user_by_id") in spans)
+            check("Bot API call is a span", ("api", "sendMessage") in spans)
+            check("breakdown lists every span", trace is not None and "sendMessage" in trace.format())
+
+            tracer.slow = 10
+            before = len(tracer.recent)
+            await dp.feed_update(bot, update.model_copy(update={"update_id": 2}))
+            check("fast updates are not kept", len(tracer.recent) == before)
+        finally:
+            await storage.close()
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
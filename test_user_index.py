@@ -0,0 +1,39 @@
+import asyncio
+import random
+import sys
+from checks import Checks
+from services import user_index as user_index_module
+from services.user_index import UserIndex
+from storage import set_storage
+from storage.memory import MemoryStorage
+
+async def test():
+    check = Checks()
+
+    storage = MemoryStorage()
+    set_storage(storage)
+    registered = random.Random(1).sample(range(1, 10**12), 20000)
+    for user_id in registered:
+        await storage.add_or_update_user(user_id, "+998", "u", "User")
+
+    index = UserIndex()
+    index.add(7)  # registered while the load was running
+    await index.load()
+    check("load reads every user", len(index) == 20001 and index.loaded)
+    check("registered users are found", all(user_id in index for user_id in registered[:1000]))
+    check("unknown users are not", not any(user_id in index for user_id in (0, -5, 10**12, 10**15)))
+    check("registrations during load survive it", 7 in index)
+
+    for user_id in range(1, user_index_module.MERGE_THRESHOLD + 10):
+        index.add(user_id)
+    check("new registrations merge into the sorted array",
+          len(index._pending) < user_index_module.MERGE_THRESHOLD and list(index._ids) == sorted(set(index._ids)))
+    check("merged users are found", 1 in index and user_index_module.MERGE_THRESHOLD in index)
+
+    index.add(registered[0])
+    check("re-registering does not duplicate", len(index) == 20001 + user_index_module.MERGE_THRESHOLD + 8)
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
@@ -0,0 +1,73 @@
+import asyncio
+import sys
+from aiogram import Bot
+from aiogram.types import CallbackQuery
+from checks import Checks
+from config import ADMIN_ID
+from fake_telegram import FakeSession
+from handlers.admin import process_stats
+from services.tally import tallies
+from services.velocity import HOUR, VoteVelocity, format_stats, sparkline, velocity as live_velocity
+from services.vote_writer import VoteWriter
+from storage import set_storage
+from storage.memory import MemoryStorage
+
+async def test():
+    check = Checks()
+
+    now = 1_800_000_000  # a whole hour
+    velocity = VoteVelocity()
+    velocity.record(1, 10, now - 30)
+    velocity.record(1, 10, now - 200)
+    velocity.record(1, 10, now - 600)
+    velocity.record(1, 11, now - 2 * HOUR)
+    velocity.record(1, 11, now - 25 * HOUR)  # older than any window
+    check("votes fall into the 5 min, 1 h and 24 h windows",
+          velocity.windows(1, now) == {10: (2, 3, 3), 11: (0, 0, 1)})
+    hourly = velocity.hourly(1, now)
+    check("hourly series ends with the current hour", hourly[-1] == 0 and hourly[-2] == 3 and hourly[-3] == 1)
+    check("slots from an earlier lap of the ring read as zero",
+          velocity.windows(1, now + 2 * HOUR) == {10: (0, 0, 3), 11: (0, 0, 1)}
+          and velocity.windows(1, now + 30 * HOUR) == {10: (0, 0, 0), 11: (0, 0, 0)})
+    check("sparkline scales to the busiest hour", sparkline([0, 1, 4]) == "▁▂█" and sparkline([0, 0]) == "▁▁")
+
+    storage = MemoryStorage()
+    set_storage(storage)
+    survey_id = await storage.create_survey("Tezlik", "", None)
+    ali = await storage.add_candidate(survey_id, "Ali")
+    vali = await storage.add_candidate(survey_id, "Vali")
+    await storage.register_vote(1, survey_id, vali)
+    await storage.register_votes([(2, survey_id, ali)])
+    await tallies.load()
+
+    await live_velocity.load()
+    windows = live_velocity.windows(survey_id)
+    check("startup seeds only the 24 h window from the hourly aggregate",
+          windows == {ali: (0, 0, 1), vali: (0, 0, 1)})
+
+    writer = VoteWriter(window_ms=0)
+    await writer.submit(3, survey_id, ali)
+    await writer.submit(3, survey_id, vali)  # duplicate, not counted
+    check("accepted votes are recorded as they are written", live_velocity.windows(survey_id)[ali] == (1, 1, 2)
+          and live_velocity.windows(survey_id)[vali] == (0, 0, 1))
+
+    text = format_stats(await storage.get_survey_details(survey_id), await tallies.get(survey_id),
+                        live_velocity.windows(survey_id), live_velocity.hourly(survey_id), registered=10)
+    check("stats show voters, participation and each candidate",
+          "Ovoz berganlar: 3 (30.0%" in text and "• Ali: 2 | +1 | +1 | +2" in text and "• Vali: 1 | +0 | +0 | +1" in text)
+
+    session = FakeSession()
+    bot = Bot(token="42:TEST", session=session)
+    tap = CallbackQuery.model_validate({
+        "id": "1", "chat_instance": "1", "data": f"stats_{survey_id}",
+        "from": {"id": ADMIN_ID + 1, "is_bot": False, "first_name": "U"},
+        "message": {"message_id": 1, "date": 0, "chat": {"id": ADMIN_ID + 1, "type": "private"}, "text": "..."},
+    }, context={"bot": bot})
+    await process_stats(tap, storage)
+    check("stats buttons are ignored for anyone but the admin",
+          [m.__api_method__ for m in session.calls] == ["answerCallbackQuery"])
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import database
+from checks import Checks
+from services.tally import tallies
+from services.vote_writer import VoteWriter
+from storage import set_storage
+from storage.base import VoteResult
+from storage.sqlite import SqliteStorage
+
+USERS = 200
+ATTEMPTS = 5  # every user races this many votes, some batched, some committed one by one
+
+async def test():
+    check = Checks()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SqliteStorage(os.path.join(tmp, "votes.db"))
+        set_storage(storage)
+        await storage.open()
+        writer = VoteWriter(window_ms=2, max_batch=64)
+        direct = VoteWriter()  # never started: each submit is its own transaction
+        await writer.start()
+        try:
+            survey_id = await storage.create_survey("Poyga", "", None)
+            other_id = await storage.create_survey("Boshqa", "", None)
+            candidates = [await storage.add_candidate(survey_id, f"Nomzod {i}") for i in range(4)]
+            foreign = await storage.add_candidate(other_id, "Begona")
+            await tallies.load()
+
+            rng = random.Random(7)
+            attempts = []
+            for user_id in range(1, USERS + 1):
+                for n in range(ATTEMPTS):
+                    submit = writer.submit if n % 2 else direct.submit
+                    attempts.append((user_id, submit(user_id, survey_id, rng.choice(candidates))))
+            rng.shuffle(attempts)
+            results = await asyncio.gather(*(call for _, call in attempts))
+
+            accepted = [user for (user, _), r in zip(attempts, results) if r is VoteResult.ACCEPTED]
+            check("every user is accepted exactly once", sorted(accepted) == list(range(1, USERS + 1)))
+            check("every other attempt is a duplicate, not a failure",
+                  results.count(VoteResult.DUPLICATE) == USERS * (ATTEMPTS - 1))
+
+            rows = await database.get_survey_candidates(survey_id)
+            stored = sum(r['votes_count'] for r in rows)
+            counted = sum(r['votes'] for r in await database.get_vote_counts() if r['survey_id'] == survey_id)
+            check("votes_count matches the vote rows (no double counts)", stored == counted == USERS)
+            tally = await tallies.get(survey_id)
+            check("in-memory tally matches the database",
+                  tally.total == USERS and all(tally.counts[r['id']] == r['votes_count'] for r in rows))
+
+            check("candidate from another survey is rejected as invalid",
+                  await writer.submit(USERS + 1, survey_id, foreign) is VoteResult.INVALID)
+            await storage.close_survey(survey_id)
+            check("vote on a closed survey is rejected as closed",
+                  await writer.submit(USERS + 1, survey_id, candidates[0]) is VoteResult.CLOSED)
+            check("rejected votes leave no rows",
+                  not await database.has_user_voted(USERS + 1, survey_id)
+                  and sum(r['votes_count'] for r in await database.get_survey_candidates(survey_id)) == USERS)
+
+            drift_id = await storage.create_survey("Drift", "", None)
+            low, high = await storage.add_candidate(drift_id, "Past"), await storage.add_candidate(drift_id, "Baland")
+            for user_id in range(1, 9):
+                await writer.submit(user_id, drift_id, low if user_id <= 5 else high)
+            async with database.get_writer() as db:
+                await db.execute("UPDATE candidates SET votes_count = 2 WHERE id = ?", (low,))
+                await db.execute("UPDATE candidates SET votes_count = 10 WHERE id = ?", (high,))
+                await db.commit()
+            await tallies.load()
+            check("reconcile reports drifted votes_count", len(await tallies.reconcile()) == 2)
+            await writer.submit(100, drift_id, low)
+            await writer.submit(101, drift_id, high)
+            tally = await tallies.get(drift_id)
+            stored = {r['id']: r['votes_count'] for r in await database.get_survey_candidates(drift_id)}
+            check("votes after reconcile count from the repaired votes_count",
+                  tally.counts[low] == stored[low] == 6 and tally.counts[high] == stored[high] == 4)
+        finally:
+            await writer.stop()
+            await storage.close()
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import aiosqlite
+import database
+import migrations
+from checks import Checks
+from storage.base import Vote
+
+async def test():
+    check = Checks()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A database from before the vote log, with one vote already cast
+        path = os.path.join(tmp, "events.db")
+        async with aiosqlite.connect(path) as db:
+            migrations.MIGRATIONS, all_migrations = migrations.MIGRATIONS[:2], migrations.MIGRATIONS
+            try:
+                await migrations.apply_migrations(db)
+            finally:
+                migrations.MIGRATIONS = all_migrations
+            await db.execute("INSERT INTO surveys (id, title, is_active, is_closed) VALUES (1, 'S', 1, 0)")
+            await db.executemany("INSERT INTO candidates (id, survey_id, full_name, votes_count) VALUES (?, 1, ?, ?)",
+                                 [(1, "Ali", 1), (2, "Vali", 0)])
+            await db.execute("INSERT INTO votes (user_id, survey_id, candidate_id) VALUES (100, 1, 1)")
+            await db.commit()
+
+        await database.init_db(path, readers=1)
+        try:
+            await database.create_tables()
+            check("old votes are backfilled into the log", await database.verify_vote_aggregates() == [])
+
+            batch = await database.register_votes([
+                Vote(101, 1, 1, -1001), Vote(102, 1, 2, -1001), (103, 1, 2), Vote(101, 1, 2, -1001),
+            ])
+            check("only accepted votes are logged", sum(1 for r in batch.results if r.value == "accepted") == 3)
+            async with database.get_writer() as db:
+                async with db.execute("SELECT user_id, chat_id, created_at FROM vote_events ORDER BY id") as cursor:
+                    events = [tuple(row) for row in await cursor.fetchall()]
+            check("events carry the source chat and time",
+                  [e[:2] for e in events] == [(100, None), (101, -1001), (102, -1001), (103, None)]
+                  and events[0][2] is None and abs(events[1][2] - time.time()) < 5)
+
+            timeline = await database.get_vote_timeline(1, since=int(time.time()) - 3600)
+            check("the hourly aggregate holds the new votes",
+                  {row['candidate_id']: row['votes'] for row in timeline} == {1: 1, 2: 2})
+            check("aggregates match the log", await database.verify_vote_aggregates() == [])
+
+            try:
+                async with database.get_writer() as db:
+                    await db.execute("DELETE FROM vote_events")
+                check("the log is append-only", False)
+            except sqlite3.IntegrityError:
+                check("the log is append-only", True)
+
+            async with database.get_writer() as db:
+                await db.execute("UPDATE candidates SET votes_count = votes_count + 5 WHERE id = 2")
+                await db.execute("UPDATE vote_hourly SET votes = 7 WHERE candidate_id = 1")
+                await db.commit()
+            diffs = {(row['kind'], row['candidate_id']): (row['live'], row['rebuilt'])
+                     for row in await database.verify_vote_aggregates()}
+            check("drifted aggregates are reported", diffs == {("candidate", 2): (7, 2), ("hourly", 1): (7, 1)})
+        finally:
+            await database.close_db()
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from aiohttp.test_utils import TestClient, TestServer
+from checks import Checks
+from config import WEBHOOK_PATH
+from fake_telegram import FakeSession
+from main import build_bot, build_dispatcher, build_webhook_app
+from storage import set_storage
+from storage.sqlite import SqliteStorage
+
+SECRET = "test-secret"
+USER = {"id": 555, "is_bot": False, "first_name": "Ali"}
+CHAT = {"id": 555, "type": "private"}
+
+def message_update(update_id, **fields):
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": int(time.time()), "chat": CHAT, "from": USER, **fields},
+    }
+
+async def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+async def test():
+    check = Checks()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SqliteStorage(os.path.join(tmp, "webhook.db"))
+        set_storage(storage)
+        await storage.open()
+        try:
+            session = FakeSession()
+            bot = build_bot("42:TEST", session)
+            app = build_webhook_app(build_dispatcher(storage), bot, SECRET)
+
+            async with TestClient(TestServer(app)) as client:
+                headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+                sent = lambda: session.api_calls("sendMessage")
+
+                resp = await client.post(WEBHOOK_PATH, json=message_update(1, text="/start"),
+                                         headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+                check("wrong secret token is rejected", resp.status == 401)
+                resp = await client.post(WEBHOOK_PATH, json=message_update(1, text="/start"))
+                check("missing secret token is rejected", resp.status == 401)
+
+                started = time.monotonic()
+                resp = await client.post(WEBHOOK_PATH, json=message_update(2, text="/start"), headers=headers)
+                check("update is acknowledged with 200", resp.status == 200)
+                check("acknowledged before handling finishes", time.monotonic() - started < 1)
+                check("/start from a new user asks for the phone number",
+                      await wait_for(lambda: len(sent()) == 1) and "telefon raqamingizni" in sent()[0].text)
+
+                contact = {"phone_number": "+998901234567", "first_name": "Ali", "user_id": USER["id"]}
+                await client.post(WEBHOOK_PATH, json=message_update(3, contact=contact), headers=headers)
+                check("contact registers the user",
+                      await wait_for(lambda: len(sent()) == 2) and "ro'yxatdan o'tdingiz" in sent()[1].text)
+
+                # Burst of concurrent updates, all processed as background tasks
+                responses = await asyncio.gather(*(
+                    client.post(WEBHOOK_PATH, json=message_update(10 + i, text="/start"), headers=headers)
+                    for i in range(20)
+                ))
+                check("burst of updates all acknowledged", all(r.status == 200 for r in responses))
+                check("burst of updates all handled", await wait_for(lambda: len(sent()) == 22))
+                check("registered user gets the main menu", "xush kelibsiz" in sent()[-1].text)
+        finally:
+            await storage.close()
+    return check.ok
+
+if __name__ == "__main__":
+    if not asyncio.run(test()):
+        sys.exit(1)